@@ -0,0 +1,90 @@
+import numpy as np
+
+class IVFIndex:
+    """Inverted-file ANN index over unit vectors: spherical k-means centroids plus per-list row ids.
+
+    The index stores only row ids; vectors stay in the caller's (memory-mapped)
+    matrix. nprobe trades recall for latency: probing every list is exact search.
+    """
+    def __init__(self, n_lists=None, nprobe=8, n_iter=20, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.order = None
+        self.offsets = None
+
+    @property
+    def count(self):
+        return 0 if self.order is None else len(self.order)
+
+    @staticmethod
+    def _assign(vectors, centroids, block_size=65536):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), block_size):
+            block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+            assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def build(self, vectors):
+        """Trains centroids on (a sample of) vectors and buckets every row into its nearest list."""
+        n = len(vectors)
+        if n == 0:
+            raise ValueError("Cannot build an IVF index over an empty collection")
+        n_lists = min(self.n_lists or max(1, int(4 * np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(n, 256 * n_lists)
+        sample_ids = np.sort(rng.choice(n, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_ids], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, size=n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            assignments = self._assign(sample, centroids)
+            counts = np.bincount(assignments, minlength=n_lists)
+            sums = np.zeros_like(centroids)
+            order = np.argsort(assignments, kind="stable")
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            non_empty = counts > 0
+            sums[non_empty] = np.add.reduceat(sample[order], starts[non_empty], axis=0)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        assignments = self._assign(vectors, centroids)
+        self.centroids = centroids.astype(np.float32)
+        self.order = np.argsort(assignments, kind="stable").astype(np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists)))).astype(np.int64)
+        self.n_lists = n_lists
+        return self
+
+    def search(self, vectors, query, k, nprobe=None):
+        """Returns (row_ids, scores) of the k best cosine matches among the probed lists, best first."""
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+        query = np.asarray(query, dtype=np.float32)
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probe])
+        if len(candidates) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates.sort()
+        scores = np.asarray(vectors[candidates], dtype=np.float32) @ query
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return candidates[top], scores[top]
+
+    def save(self, path):
+        np.savez(path, centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path, nprobe=8):
+        data = np.load(path)
+        index = cls(n_lists=len(data["centroids"]), nprobe=nprobe)
+        index.centroids = data["centroids"]
+        index.order = data["order"]
+        index.offsets = data["offsets"]
+        return index
@@ -1,11 +1,12 @@
 import streamlit as st
 import os
-import json
 import logging
 import time
 from dotenv import load_dotenv
-from query_processor import QueryProcessor
-from document_processor import WeaviateManager
+from query_log import QueryLog
+import resources
+from metrics import QUERY_METRICS
+from chunk_metadata import BOOK_CODES
  
 class WeaviateQuerySystem:
     def __init__(self):
@@ -13,10 +14,13 @@ class WeaviateQuerySystem:
         self.cluster_url = os.getenv("WEAVIATE_RESTURL")
         self.api_key = os.getenv("WEAVIATE_ADMIN")
         self.collection_name = os.getenv("WEAVIATE_COLLECTION", "DocumentChunks")
-        self.log_file = "query_log.json"
+        self.query_log = QueryLog("query_log.jsonl", legacy_file="query_log.json")
         
         self.setup_logging()
         self.logger.info("Frontend page loaded.")
+        migrated = self.query_log.migrate_legacy()
+        if migrated:
+            self.logger.info(f"Migrated {migrated} entries from query_log.json to query_log.jsonl")
         self.connect_to_weaviate()
     
     def setup_logging(self):
@@ -36,50 +40,48 @@ class WeaviateQuerySystem:
         try:
             self.logger.info("Attempting to connect to Weaviate...")
  
-            self.weaviate_manager = WeaviateManager()  
-            self.query_processor = QueryProcessor(self.weaviate_manager.client)  
+            self.vector_store = resources.get_vector_store()
+            self.query_processor = resources.get_query_processor()
+            resources.get_metrics_server()
             
             self.logger.info("Successfully connected to Weaviate!")
         except Exception as e:
             self.logger.error(f"Failed to connect to Weaviate: {e}")
             st.error("Error connecting to Weaviate. Please check your configuration.")
  
-    def log_query(self, query, result, context, duration):
-        """Logs queries and responses to a JSON file."""
+    def log_query(self, query, result, context, duration, time_to_first_token=None, timings=None):
+        """Appends the query and response to the JSONL query log."""
         log_entry = {
             "query": query,
             "result": result,
             "context": context,
             "time_taken": f"{duration:.2f} seconds"
         }
+        if time_to_first_token is not None:
+            log_entry["time_to_first_token"] = f"{time_to_first_token:.2f} seconds"
+        if timings is not None:
+            log_entry["timings"] = timings
  
-        logs = []
-        if os.path.exists(self.log_file):
-            try:
-                with open(self.log_file, "r") as f:
-                    logs = json.load(f)
-            except json.JSONDecodeError:
-                self.logger.warning("Log file is corrupted. Creating a new one.")
- 
-        logs.append(log_entry)
- 
-        with open(self.log_file, "w") as f:
-            json.dump(logs, f, indent=4)
+        self.query_log.append(log_entry)
         
         self.logger.info(f"Logged query: '{query}' | Time taken: {duration:.2f} sec")
  
-    def load_previous_queries(self):
-        """Loads previous queries from the log file."""
-        if os.path.exists(self.log_file):
-            try:
-                with open(self.log_file, "r") as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                self.logger.warning("Failed to load previous queries due to JSON decode error.")
-                return []
-        return []
- 
-    def process_query(self, query):
+    def log_stage_timings(self, timings):
+        """Logs this query's per-stage breakdown and, every METRICS_LOG_EVERY queries, the running percentiles."""
+        if timings:
+            stages = " | ".join(f"{name}: {seconds * 1000:.0f} ms" for name, seconds in timings["stages"].items())
+            self.logger.info(f"Stage timings: {stages} | prompt tokens: {timings['prompt_tokens']} | response tokens: {timings['response_tokens']}")
+        log_every = int(os.getenv("METRICS_LOG_EVERY", 20))
+        total = QUERY_METRICS.summary().get("total")
+        if log_every > 0 and total and total["count"] % log_every == 0:
+            for line in QUERY_METRICS.summary_lines():
+                self.logger.info(f"Latency percentiles - {line}")
+ 
+    def load_previous_queries(self, limit=5):
+        """Loads the most recent queries from the log file."""
+        return self.query_log.tail(limit)
+ 
+    def process_query(self, query, book=None):
         """Processes the user query and fetches the result from Weaviate."""
         if not query:
             st.warning("Please enter a query!")
@@ -92,26 +94,39 @@ class WeaviateQuerySystem:
             self.logger.info(f"Received query: '{query}'")
  
             self.logger.info("Creating embedding for the query...")
-            result = self.query_processor.process_query(query)
- 
-            self.logger.info("Retrieving relevant document chunks from Weaviate...")
-            context = result.get("context", "No relevant documents found.")
-            
-            self.logger.info("Generating answer using Ollama...")
-            response = result.get("response", "No answer available.")
+            context = "No relevant documents found."
+            response = ""
+            time_to_first_token = None
+            answer_placeholder = None
+            timings = None
+            filters = {"book": book} if book else None
+            for event in self.query_processor.process_query_stream(query, filters=filters):
+                if event["type"] == "context":
+                    self.logger.info("Retrieved relevant document chunks, generating answer using Ollama...")
+                    context = event["context"]
+                    st.subheader("Answer:")
+                    answer_placeholder = st.empty()
+                elif event["type"] == "token":
+                    response += event["token"]
+                    answer_placeholder.markdown(response)
+                elif event["type"] == "done":
+                    response = event["response"] or "No answer available."
+                    answer_placeholder.markdown(response)
+                    time_to_first_token = event["time_to_first_token"]
+                    timings = event["timings"]
+                elif event["type"] == "error":
+                    raise RuntimeError(event["error"])
  
             end_time = time.time()
             duration = end_time - start_time
  
-            self.logger.info("Query processed successfully!")
- 
-            st.subheader("Answer:")
-            st.write(response)
+            self.logger.info(f"Query processed successfully! Time to first token: {time_to_first_token:.2f} sec | Total: {duration:.2f} sec")
+            self.log_stage_timings(timings)
  
             with st.expander("Show Retrieved Context"):
                 st.write(context)
  
-            self.log_query(query, response, context, duration)
+            self.log_query(query, response, context, duration, time_to_first_token, timings)
  
         except Exception as e:
             self.logger.error(f"Error processing query: {e}")
@@ -120,17 +135,16 @@ class WeaviateQuerySystem:
     def display_query_history(self):
         """Displays the previous queries in the sidebar."""
         st.sidebar.title("Query History")
-        previous_queries = self.load_previous_queries()
-        for entry in previous_queries[-5:]:  
+        previous_queries = self.load_previous_queries(5)
+        for entry in previous_queries:
             with st.sidebar.expander(entry["query"]):
                 st.write("Answer:", entry["result"])
                 st.write("Context:", entry["context"])
  
     def close_connection(self):
-        """Closes the Weaviate connection if it exists."""
-        if hasattr(self, "weaviate_manager") and self.weaviate_manager:
-            self.weaviate_manager.close_connection()
-            self.logger.info("Weaviate connection closed.")
+        """Closes the shared Weaviate connection; only needed when the process shuts down."""
+        resources.close_resources()
+        self.logger.info("Weaviate connection closed.")
  
 def main():
     """Main function to run the Streamlit app."""
@@ -138,12 +152,12 @@ def main():
  
     st.title("📚 History NCERT Query System")
     query = st.text_input("Enter your query:", "")
+    book = st.selectbox("Search in:", ("All books",) + BOOK_CODES)
  
     if st.button("Search"):
-        system.process_query(query)
+        system.process_query(query, None if book == "All books" else book)
  
     system.display_query_history()
-    system.close_connection()
  
 if __name__ == "__main__":
     main()
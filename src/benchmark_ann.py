@@ -0,0 +1,57 @@
+import argparse
+import time
+import numpy as np
+from ann_index import IVFIndex
+from vector_store import LocalVectorStore
+
+def exact_top_k(matrix, query, k):
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def synthetic_corpus(n, dim, n_clusters, seed=0):
+    """Clustered unit vectors, roughly shaped like sentence embeddings of a textbook corpus."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim))
+    vectors = centers[rng.integers(n_clusters, size=n)] + 0.6 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def run_benchmark(matrix, queries, k, nprobes, n_lists=None):
+    start_time = time.perf_counter()
+    index = IVFIndex(n_lists=n_lists).build(matrix)
+    print(f"Built IVF index: {len(matrix)} vectors, {index.n_lists} lists in {time.perf_counter() - start_time:.2f}s\n")
+
+    start_time = time.perf_counter()
+    truth = [set(exact_top_k(matrix, q, k)) for q in queries]
+    exact_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+    print(f"{'mode':<12}{'recall@' + str(k):>10}{'ms/query':>12}")
+    print(f"{'exact':<12}{1.0:>10.3f}{exact_ms:>12.3f}")
+
+    for nprobe in nprobes:
+        start_time = time.perf_counter()
+        found = [index.search(matrix, q, k, nprobe)[0] for q in queries]
+        ivf_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+        recall = np.mean([len(truth[i].intersection(ids)) / k for i, ids in enumerate(found)])
+        print(f"{'ivf/' + str(nprobe):<12}{recall:>10.3f}{ivf_ms:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs. latency of the IVF index against exact search.")
+    parser.add_argument("--collection", help="Benchmark an existing local collection instead of synthetic data")
+    parser.add_argument("--size", type=int, default=200000, help="Synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    if args.collection:
+        matrix, _ = LocalVectorStore().load(args.collection)
+        matrix = np.asarray(matrix)
+    else:
+        matrix = synthetic_corpus(args.size, args.dim, n_clusters=max(1, args.size // 500))
+    rng = np.random.default_rng(1)
+    queries = matrix[rng.choice(len(matrix), size=min(args.queries, len(matrix)), replace=False)]
+    queries = queries + 0.05 * rng.normal(size=queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    run_benchmark(matrix, queries, args.k, args.nprobe, args.n_lists)
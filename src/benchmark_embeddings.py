@@ -0,0 +1,86 @@
+import time
+import argparse
+import numpy as np
+from document_processor import EmbeddingModel
+
+SAMPLE_SENTENCES = [
+    "The Harappan civilisation flourished along the Indus river and its tributaries.",
+    "Ashoka gave up war after the Kalinga campaign and spread the message of dhamma.",
+    "The Mughal emperor Akbar introduced the mansabdari system of administration.",
+    "Peasants in colonial Bengal revolted against the cultivation of indigo.",
+    "The Constituent Assembly debated the rights of minorities for nearly three years.",
+    "Vijayanagara was a city and an empire founded in the fourteenth century.",
+]
+
+def load_texts(args):
+    if args.pdf_directory:
+        from main import PDFProcessor
+        processor = PDFProcessor(args.pdf_directory)
+        texts = [chunk["text"] for _, chunks in processor.iter_files(processor.list_pdfs()) if chunks for chunk in chunks]
+        return texts[:args.count]
+    if args.text_file:
+        with open(args.text_file, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()][:args.count]
+    return [SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)] + f" ({i})" for i in range(args.count)]
+
+def throughput(model, texts, batch_size):
+    """Returns (embeddings, texts/sec for one batched pass, median ms per single-text query)."""
+    model.embed_batch(texts[:batch_size], batch_size)
+    start_time = time.perf_counter()
+    embeddings = model.embed_batch(texts, batch_size)
+    rate = len(texts) / (time.perf_counter() - start_time)
+    latencies = []
+    for text in texts[:50]:
+        start_time = time.perf_counter()
+        model.get_embedding(text)
+        latencies.append(time.perf_counter() - start_time)
+    return embeddings, rate, float(np.median(latencies)) * 1000
+
+def cosine_rows(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+def top_k_agreement(reference, candidate, k=3, queries=100):
+    """Fraction of each text's top-k neighbours (by the reference embeddings) that the candidate embeddings also find."""
+    def neighbours(matrix, rows):
+        matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+        scores = matrix[rows] @ matrix.T
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return np.argsort(-scores, axis=1)[:, :k]
+    rows = np.arange(min(queries, len(reference)))
+    expected, found = neighbours(reference, rows), neighbours(candidate, rows)
+    return float(np.mean([len(set(e).intersection(f)) / k for e, f in zip(expected, found)]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parity and throughput of the ONNX / int8 embedding backends against PyTorch.")
+    parser.add_argument("--backends", nargs="+", default=["torch", "onnx", "onnx-int8"])
+    parser.add_argument("--pdf-directory", help="Embed real chunks from these PDFs instead of sample sentences")
+    parser.add_argument("--text-file", help="Embed one text per line from this file")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="Parity threshold on the mean cosine vs. torch")
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    print(f"Embedding {len(texts)} texts, batch size {args.batch_size}\n")
+    print(f"{'backend':<12}{'texts/sec':>12}{'query ms':>10}{'mean cos':>10}{'min cos':>10}{'top3 agree':>12}")
+    reference = None
+    failed = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        model = EmbeddingModel(backend=backend)
+        start_time = time.perf_counter()
+        model.model
+        load_time = time.perf_counter() - start_time
+        embeddings, rate, query_ms = throughput(model, texts, args.batch_size)
+        if reference is None:
+            reference = embeddings
+            print(f"{backend:<12}{rate:>12.1f}{query_ms:>10.2f}{'1.0000':>10}{'1.0000':>10}{'1.000':>12}   (load {load_time:.1f}s)")
+            continue
+        cosines = cosine_rows(reference, embeddings)
+        agreement = top_k_agreement(reference, embeddings)
+        print(f"{backend:<12}{rate:>12.1f}{query_ms:>10.2f}{cosines.mean():>10.4f}{cosines.min():>10.4f}{agreement:>12.3f}   (load {load_time:.1f}s)")
+        if cosines.mean() < args.min_cosine:
+            failed.append(backend)
+    if failed:
+        raise SystemExit(f"Parity check failed for {', '.join(failed)}: mean cosine below {args.min_cosine}")
@@ -0,0 +1,60 @@
+import os
+import time
+import argparse
+import numpy as np
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from document_processor import EmbeddingModel
+from vector_store import create_vector_store
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q)) * 1000
+
+def run_benchmark(queries, vector_store, keyword_index, embeddings, collection_name, limit, candidates, rrf_k):
+    vector_times, hybrid_times, keyword_times = [], [], []
+    overlap, keyword_only = [], 0
+    for query, embedding in zip(queries, embeddings):
+        start_time = time.perf_counter()
+        vector_results = vector_store.query(embedding, limit, collection_name)
+        vector_times.append(time.perf_counter() - start_time)
+
+        start_time = time.perf_counter()
+        candidate_results = vector_store.query(embedding, max(limit, candidates), collection_name)
+        keyword_start = time.perf_counter()
+        keyword_results = keyword_index.search(query, max(limit, candidates))
+        keyword_times.append(time.perf_counter() - keyword_start)
+        fused = reciprocal_rank_fusion([candidate_results, keyword_results], limit, rrf_k)
+        hybrid_times.append(time.perf_counter() - start_time)
+
+        vector_ids = {result["uuid"] for result in vector_results}
+        candidate_ids = {result["uuid"] for result in candidate_results}
+        overlap.append(len(vector_ids.intersection(result["uuid"] for result in fused)) / max(len(vector_ids), 1))
+        keyword_only += sum(result["uuid"] not in candidate_ids for result in fused)
+
+    print(f"{len(queries)} queries, top-{limit}, {candidates} candidates per retriever, {len(keyword_index)} chunks\n")
+    print(f"{'mode':<14}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, samples in (("vector", vector_times), ("bm25 only", keyword_times), ("hybrid (rrf)", hybrid_times)):
+        print(f"{name:<14}{percentile_ms(samples, 50):>10.2f}{percentile_ms(samples, 95):>10.2f}")
+    print(f"\nHybrid top-{limit} shares {np.mean(overlap):.0%} of the vector-only top-{limit}; "
+          f"{keyword_only} results came from BM25 alone.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency and result overlap of hybrid BM25 + vector retrieval vs. vector-only.")
+    parser.add_argument("--queries", default="queries.txt", help="One query per line")
+    parser.add_argument("--collection", default=os.getenv("WEAVIATE_COLLECTION", "DocumentChunks"))
+    parser.add_argument("--limit", type=int, default=int(os.getenv("LIMIT", 3)))
+    parser.add_argument("--candidates", type=int, default=int(os.getenv("HYBRID_CANDIDATES", 20)))
+    parser.add_argument("--rrf-k", type=int, default=int(os.getenv("RRF_K", 60)))
+    parser.add_argument("--max-queries", type=int, default=200)
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()][:args.max_queries]
+    keyword_index = BM25Index.load(os.path.join(os.getenv("BM25_INDEX_DIR", "bm25_index"), args.collection))
+    if not len(keyword_index):
+        raise SystemExit(f"No BM25 index for '{args.collection}'; run main.py first.")
+    embeddings = EmbeddingModel().embed_batch(queries)
+    vector_store = create_vector_store()
+    try:
+        run_benchmark(queries, vector_store, keyword_index, embeddings, args.collection, args.limit, args.candidates, args.rrf_k)
+    finally:
+        vector_store.close_connection()
@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+IMPORT_SNIPPET = "import time; start_time = time.perf_counter(); import {module}; print(time.perf_counter() - start_time)"
+
+def import_time(module, repeat):
+    """Median cold import time of module, each run in a fresh interpreter so nothing is already cached."""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def timed(function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start_time
+
+def first_query_times(query, with_llm):
+    """Times constructing QueryProcessor and answering the same query cold, then warm, in this process."""
+    from query_processor import QueryProcessor
+    processor, construct = timed(QueryProcessor)
+    print(f"{'QueryProcessor()':<28}{construct * 1000:>10.0f} ms")
+    try:
+        for label in ("first", "second"):
+            embedding, embed = timed(processor.embedding_model.get_embedding, query)
+            results, search = timed(processor.vector_store.query, embedding, 3, processor.collection_name)
+            print(f"{label + ' embed':<28}{embed * 1000:>10.0f} ms")
+            print(f"{label + ' search':<28}{search * 1000:>10.0f} ms  ({len(results)} results)")
+            if with_llm:
+                processor.query_cache = None
+                _, answer = timed(processor.process_query, query)
+                print(f"{label + ' process_query':<28}{answer * 1000:>10.0f} ms")
+    finally:
+        processor.vector_store.close_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start cost of the query entry points: import time and first-query latency.")
+    parser.add_argument("--modules", nargs="+", default=["query_processor", "resources", "query_1000", "main", "document_processor"])
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module import measurement")
+    parser.add_argument("--query", default="Who was Ashoka?")
+    parser.add_argument("--skip-query", action="store_true", help="Only measure imports (no vector store or model needed)")
+    parser.add_argument("--with-llm", action="store_true", help="Also time a full process_query including Ollama")
+    args = parser.parse_args()
+
+    print(f"{'import':<28}{'median':>10}")
+    for module in args.modules:
+        print(f"{module:<28}{import_time(module, args.repeat) * 1000:>10.0f} ms")
+    if not args.skip_query:
+        print()
+        first_query_times(args.query, args.with_llm)
@@ -0,0 +1,153 @@
+import os
+import re
+import json
+import numpy as np
+from chunk_metadata import METADATA_FIELDS, normalize_filters, matches, filter_key
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from had has have he her his how in is it its of on or "
+    "she that the their they this to was were what when where which who whom why will with".split()
+)
+
+def tokenize(text):
+    """Lowercased alphanumeric tokens without stopwords; no stemming, so names and years match exactly."""
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+def reciprocal_rank_fusion(result_lists, limit, k=60):
+    """Merges ranked result lists by sum of 1 / (k + rank), keyed on "uuid"; the first list's fields win."""
+    scores, merged = {}, {}
+    for results in result_lists:
+        for rank, result in enumerate(results, start=1):
+            key = result["uuid"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            merged.setdefault(key, result)
+    ranked = sorted(scores, key=lambda key: -scores[key])[:limit]
+    return [dict(merged[key], rrf_score=scores[key]) for key in ranked]
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, stored as CSR postings in NumPy arrays.
+
+    indptr[t]:indptr[t + 1] slices the doc_ids and term_freqs of term t. IDF and
+    document lengths are precomputed, and so is each posting's full BM25 weight,
+    so a query is one scatter-add per query term plus an argpartition.
+    """
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = []
+        self.vocabulary = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.int32)
+        self.term_freqs = np.empty(0, dtype=np.int32)
+        self.idf = np.empty(0, dtype=np.float32)
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.weights = np.empty(0, dtype=np.float32)
+        self._filter_masks = {}
+
+    def __len__(self):
+        return len(self.docs)
+
+    def build(self, docs):
+        """docs: dicts with "uuid", "text", "source" and optional chunk metadata. Replaces the current contents."""
+        self.docs = [
+            dict({field: doc[field] for field in METADATA_FIELDS if doc.get(field) is not None},
+                 uuid=str(doc["uuid"]), text=doc["text"], source=doc.get("source", "unknown"))
+            for doc in docs
+        ]
+        self._filter_masks = {}
+        vocabulary = {}
+        term_ids, doc_ids, doc_lengths = [], [], []
+        for doc_id, doc in enumerate(self.docs):
+            tokens = tokenize(doc["text"])
+            doc_lengths.append(len(tokens))
+            for token in tokens:
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+            doc_ids.extend([doc_id] * len(tokens))
+        self.vocabulary = vocabulary
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        pairs, term_freqs = np.unique(term_ids * max(len(self.docs), 1) + doc_ids, return_counts=True)
+        pair_terms = pairs // max(len(self.docs), 1)
+        self.doc_ids = (pairs % max(len(self.docs), 1)).astype(np.int32)
+        self.term_freqs = term_freqs.astype(np.int32)
+        document_freqs = np.bincount(pair_terms, minlength=len(vocabulary))
+        self.indptr = np.concatenate(([0], np.cumsum(document_freqs))).astype(np.int64)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+        n = len(self.docs)
+        self.idf = np.log(1 + (n - document_freqs + 0.5) / (document_freqs + 0.5)).astype(np.float32)
+        self._compute_weights(pair_terms)
+        return self
+
+    def _compute_weights(self, pair_terms=None):
+        if pair_terms is None:
+            pair_terms = np.repeat(np.arange(len(self.vocabulary)), np.diff(self.indptr))
+        average_length = max(float(self.doc_lengths.mean()), 1e-9) if len(self.doc_lengths) else 1.0
+        tf = self.term_freqs.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[self.doc_ids] / average_length)
+        self.weights = (self.idf[pair_terms] * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+    def update(self, added_docs=(), removed_uuids=()):
+        """Drops removed_uuids, adds added_docs (replacing same-uuid docs) and rebuilds the arrays."""
+        added_docs = list(added_docs)
+        dropped = set(removed_uuids) | {str(doc["uuid"]) for doc in added_docs}
+        return self.build([doc for doc in self.docs if doc["uuid"] not in dropped] + added_docs)
+
+    def filter_mask(self, filters):
+        """Boolean mask of the docs matching normalized filters, cached per distinct filter."""
+        key = filter_key(filters)
+        if key not in self._filter_masks:
+            self._filter_masks[key] = np.fromiter((matches(doc, filters) for doc in self.docs), dtype=bool, count=len(self.docs))
+        return self._filter_masks[key]
+
+    def search(self, query, limit=3, filters=None):
+        """Returns up to limit docs with a positive BM25 score, best first, each with a "bm25_score"."""
+        term_ids = {self.vocabulary[token] for token in tokenize(query) if token in self.vocabulary}
+        if not term_ids or not self.docs:
+            return []
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term_id in term_ids:
+            start, stop = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.doc_ids[start:stop]] += self.weights[start:stop]
+        filters = normalize_filters(filters)
+        if filters:
+            scores[~self.filter_mask(filters)] = 0.0
+        candidates = np.flatnonzero(scores)
+        k = min(limit, len(candidates))
+        if k == 0:
+            return []
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [dict(self.docs[i], bm25_score=float(scores[i])) for i in top]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        np.savez(os.path.join(directory, "postings.tmp.npz"), indptr=self.indptr, doc_ids=self.doc_ids,
+                 term_freqs=self.term_freqs, idf=self.idf, doc_lengths=self.doc_lengths,
+                 params=np.array([self.k1, self.b]))
+        with open(os.path.join(directory, "vocabulary.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(self.vocabulary, f)
+        with open(os.path.join(directory, "docs.jsonl.tmp"), "w", encoding="utf-8") as f:
+            for doc in self.docs:
+                f.write(json.dumps(doc) + "\n")
+        os.replace(os.path.join(directory, "postings.tmp.npz"), os.path.join(directory, "postings.npz"))
+        os.replace(os.path.join(directory, "vocabulary.json.tmp"), os.path.join(directory, "vocabulary.json"))
+        os.replace(os.path.join(directory, "docs.jsonl.tmp"), os.path.join(directory, "docs.jsonl"))
+
+    @classmethod
+    def load(cls, directory):
+        """Loads a saved index, or returns an empty one if directory has none."""
+        postings_path = os.path.join(directory, "postings.npz")
+        if not os.path.exists(postings_path):
+            return cls()
+        data = np.load(postings_path)
+        index = cls(k1=float(data["params"][0]), b=float(data["params"][1]))
+        index.indptr, index.doc_ids, index.term_freqs = data["indptr"], data["doc_ids"], data["term_freqs"]
+        index.idf, index.doc_lengths = data["idf"], data["doc_lengths"]
+        with open(os.path.join(directory, "vocabulary.json"), "r", encoding="utf-8") as f:
+            index.vocabulary = json.load(f)
+        with open(os.path.join(directory, "docs.jsonl"), "r", encoding="utf-8") as f:
+            index.docs = [json.loads(line) for line in f]
+        index._compute_weights()
+        return index
@@ -0,0 +1,85 @@
+import os
+import re
+import json
+from bisect import bisect_right
+
+NCERT_FILE_RE = re.compile(r"^([a-z]{4}\d)(\d{2})?")
+METADATA_FIELDS = ("book", "chapter", "page_start", "page_end", "char_start", "char_end")
+FILTER_FIELDS = ("source", "book", "chapter")
+BOOK_CODES = ("fees1", "gess1", "hess2", "iess3", "jess3")
+
+def parse_source(filename):
+    """Book code and chapter from an NCERT file name: fees101.pdf -> ("fees1", 1); front matter (fees1ps.pdf) is chapter 0."""
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    match = NCERT_FILE_RE.match(stem)
+    if not match:
+        return stem, 0
+    return match.group(1), int(match.group(2) or 0)
+
+def locate_chunks(pages, text_chunks):
+    """Character offsets and 1-based page range of each chunk within "\\n".join(pages).
+
+    The splitter returns chunks in document order, each starting after the previous
+    one's start, so each is searched for from there; a chunk that cannot be found
+    (the splitter stripped or rejoined it) is placed where the search left off.
+    """
+    page_starts, offset = [], 0
+    for page in pages:
+        page_starts.append(offset)
+        offset += len(page) + 1
+    text = "\n".join(pages)
+    located, search_from = [], 0
+    for chunk in text_chunks:
+        start = text.find(chunk, search_from)
+        if start == -1:
+            start = min(search_from, max(len(text) - 1, 0))
+        end = min(start + len(chunk), len(text))
+        located.append({
+            "page_start": bisect_right(page_starts, start),
+            "page_end": bisect_right(page_starts, max(end - 1, start)),
+            "char_start": start,
+            "char_end": end,
+        })
+        search_from = start + 1
+    return located
+
+def normalize_filters(filters):
+    """Validates {field: value or list of values} and returns {field: tuple of allowed values}, or None if empty."""
+    if not filters:
+        return None
+    normalized = {}
+    for field, values in filters.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter on '{field}', expected one of {FILTER_FIELDS}")
+        if values is None:
+            continue
+        normalized[field] = tuple(values) if isinstance(values, (list, tuple, set)) else (values,)
+    return normalized or None
+
+def field_value(chunk, field):
+    """A chunk's value for field; book and chapter fall back to the file name for chunks ingested without them."""
+    value = chunk.get(field)
+    if value is None and field in ("book", "chapter"):
+        book, chapter = parse_source(chunk.get("source", ""))
+        value = book if field == "book" else chapter
+    return value
+
+def matches(chunk, filters):
+    return all(field_value(chunk, field) in values for field, values in filters.items())
+
+def filter_key(filters):
+    """A stable string for normalized filters, used to keep scoped cache entries apart."""
+    if not filters:
+        return ""
+    return json.dumps({field: sorted(values) for field, values in filters.items()}, sort_keys=True)
+
+def parse_filter_env(value):
+    """SEARCH_FILTER such as "book=hess2,iess3;chapter=3" -> {"book": ["hess2", "iess3"], "chapter": [3]}."""
+    filters = {}
+    for part in (value or "").split(";"):
+        if not part.strip():
+            continue
+        field, _, values = part.partition("=")
+        field = field.strip()
+        filters[field] = [int(v) if field == "chapter" else v.strip() for v in values.split(",") if v.strip()]
+    return normalize_filters(filters)
@@ -0,0 +1,123 @@
+import os
+import re
+
+WORD_RE = re.compile(r"\w+")
+
+def estimate_tokens(text):
+    """Rough LLM token count (about four characters per token for English)."""
+    return (len(text) + 3) // 4
+
+def overlap_length(first, second, min_overlap, max_overlap):
+    """Length of the longest suffix of first that is also a prefix of second, or 0 if shorter than min_overlap."""
+    if len(second) < min_overlap:
+        return 0
+    head = second[:min_overlap]
+    start = max(0, len(first) - max_overlap)
+    position = first.find(head, start)
+    while position != -1:
+        length = len(first) - position
+        if second.startswith(first[position:]):
+            return length
+        position = first.find(head, position + 1)
+    return 0
+
+def shingles(text, size=3):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+class ContextAssembler:
+    """Turns retrieved chunks into the prompt context.
+
+    1. Chunks from the same source whose text overlaps (the splitter repeats up to
+       chunk_overlap characters between neighbours) are stitched into one passage,
+       and chunks contained in another are dropped.
+    2. Passages are picked in MMR order: relevance (retrieval rank) traded against
+       word-shingle similarity to passages already picked; near-duplicates above
+       dedup_threshold are dropped outright.
+    3. Picked passages are packed into token_budget estimated tokens; the first
+       passage is cut at a sentence boundary if it alone exceeds the budget.
+    """
+    def __init__(self, token_budget=None, dedup_threshold=None, mmr_lambda=None, min_overlap=20, max_overlap=400):
+        self.token_budget = token_budget if token_budget is not None else int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+        self.dedup_threshold = dedup_threshold if dedup_threshold is not None else float(os.getenv("CONTEXT_DEDUP_THRESHOLD", 0.8))
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else float(os.getenv("MMR_LAMBDA", 0.7))
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+
+    def merge_overlapping(self, results):
+        """Stitches same-source chunks that overlap; each passage keeps the best rank of the chunks it absorbed."""
+        passages = [{"text": result["text"].strip(), "source": result.get("source"), "rank": rank}
+                    for rank, result in enumerate(results)]
+        merged = True
+        while merged:
+            merged = False
+            for i, first in enumerate(passages):
+                for j, second in enumerate(passages):
+                    if i == j or first["source"] != second["source"]:
+                        continue
+                    if second["text"] in first["text"]:
+                        text = first["text"]
+                    else:
+                        length = overlap_length(first["text"], second["text"], self.min_overlap, self.max_overlap)
+                        if not length:
+                            continue
+                        text = first["text"] + second["text"][length:]
+                    passages[i] = {"text": text, "source": first["source"], "rank": min(first["rank"], second["rank"])}
+                    del passages[j]
+                    merged = True
+                    break
+                if merged:
+                    break
+        return sorted(passages, key=lambda passage: passage["rank"])
+
+    def select(self, passages):
+        """MMR ordering over passages already sorted by rank, dropping near-duplicates."""
+        candidates = [dict(passage, shingles=shingles(passage["text"])) for passage in passages]
+        selected = []
+        while candidates:
+            best, best_score = None, None
+            for candidate in candidates:
+                relevance = 1.0 / (1 + candidate["rank"])
+                redundancy = max((jaccard(candidate["shingles"], chosen["shingles"]) for chosen in selected), default=0.0)
+                score = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = candidate, score
+            candidates.remove(best)
+            if any(jaccard(best["shingles"], chosen["shingles"]) >= self.dedup_threshold for chosen in selected):
+                continue
+            selected.append(best)
+        return selected
+
+    def truncate(self, text, budget):
+        limit = budget * 4
+        if len(text) <= limit:
+            return text
+        cut = text[:limit]
+        boundary = max(cut.rfind(". "), cut.rfind(".\n"))
+        return cut[:boundary + 1] if boundary > limit // 2 else cut.rsplit(" ", 1)[0]
+
+    def pack(self, passages):
+        """Keeps passages, in order, while their estimated tokens fit the budget (0 means no budget)."""
+        if self.token_budget <= 0:
+            return [passage["text"] for passage in passages]
+        packed, used = [], 0
+        for passage in passages:
+            tokens = estimate_tokens(passage["text"])
+            if used + tokens <= self.token_budget:
+                packed.append(passage["text"])
+                used += tokens
+            elif not packed:
+                packed.append(self.truncate(passage["text"], self.token_budget))
+                used = self.token_budget
+        return packed
+
+    def build_context(self, results):
+        """The "\\n\\n"-joined context for the prompt from ranked retrieval results."""
+        return "\n\n".join(self.pack(self.select(self.merge_overlapping(results))))
@@ -1,21 +1,28 @@
-import weaviate
-from weaviate.classes.config import Property, DataType
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
+from vector_store import VectorStore, batched
+from chunk_metadata import METADATA_FIELDS, normalize_filters
  
 load_dotenv()  
  
-class WeaviateManager:
-    def __init__(self):
+class WeaviateManager(VectorStore):
+    def __init__(self, client=None):
         self.cluster_url = os.getenv("WEAVIATE_RESTURL")
         self.api_key = os.getenv("WEAVIATE_ADMIN")
+        if client is not None:
+            self.client = client
+            return
         if not self.cluster_url or not self.api_key:
             raise ValueError("ERROR: Missing Weaviate credentials. Check your .env file!")
             
         self.client = self.connect_to_weaviate()
     
     def connect_to_weaviate(self):
+        import weaviate
         try:
             client = weaviate.connect_to_wcs(
                 cluster_url=self.cluster_url,
@@ -27,54 +34,216 @@ class WeaviateManager:
             print(f"Error connecting to Weaviate: {e}")
             raise
     
-    def setup_collection(self, collection_name="DocumentChunks"):
+    def is_healthy(self):
+        try:
+            return bool(self.client) and self.client.is_ready()
+        except Exception as e:
+            print(f"Weaviate health check failed: {e}")
+            return False
+    
+    def reconnect(self):
+        """Replaces the client in place so holders of this manager keep working."""
+        try:
+            if self.client:
+                self.client.close()
+        except Exception as e:
+            print(f"Error closing stale Weaviate connection: {e}")
+        self.client = self.connect_to_weaviate()
+    
+    def setup_collection(self, collection_name="DocumentChunks", recreate=True):
+        """Creates the collection, dropping any existing one unless recreate is False. Returns True if it was created."""
+        from weaviate.classes.config import Configure, Property, DataType, Tokenization
         try:
             if self.client.collections.exists(collection_name):
+                if not recreate:
+                    print(f"Collection '{collection_name}' already exists, keeping it.")
+                    return False
                 self.client.collections.delete(collection_name)
                 
             self.client.collections.create(
                 name=collection_name,
-                vectorizer_config=weaviate.classes.config.Configure.Vectorizer.none(),
+                vectorizer_config=Configure.Vectorizer.none(),
                 properties=[
                     Property(name="text", data_type=DataType.TEXT),
                     Property(name="source", data_type=DataType.TEXT),
+                    Property(name="book", data_type=DataType.TEXT, tokenization=Tokenization.FIELD),
+                    Property(name="chapter", data_type=DataType.INT),
+                    Property(name="page_start", data_type=DataType.INT),
+                    Property(name="page_end", data_type=DataType.INT),
+                    Property(name="char_start", data_type=DataType.INT),
+                    Property(name="char_end", data_type=DataType.INT),
                 ]
             )
             print(f"Collection '{collection_name}' created successfully!")
+            return True
         except Exception as e:
             print(f"Error setting up collection: {e}")
             raise
     
-    def insert_documents(self, chunks, embedding_model, collection_name="DocumentChunks"):
+    def insert_embedded(self, embedded_batches, collection_name="DocumentChunks"):
+        """Uploads (chunks, vectors) batches as they arrive and returns the number of chunks inserted."""
         try:
             documents_collection = self.client.collections.get(collection_name)
+            total = 0
+            start_time = time.perf_counter()
             with documents_collection.batch.dynamic() as batch:
-                for chunk in chunks:
-                    vector = embedding_model.get_embedding(chunk["text"])  
-                
-                    batch.add_object(
-                        properties={
-                            "text": chunk["text"],  
-                            "source": chunk.get("source", "unknown"),  
-                        },
-                        vector=vector
-                    )
-            print("Documents inserted successfully!")
+                for chunk_batch, vectors in embedded_batches:
+                    for chunk, vector in zip(chunk_batch, vectors):
+                        properties = {
+                            "text": chunk["text"],
+                            "source": chunk.get("source", "unknown"),
+                        }
+                        properties.update((field, chunk[field]) for field in METADATA_FIELDS if chunk.get(field) is not None)
+                        batch.add_object(
+                            properties=properties,
+                            vector=vector.tolist(),
+                            uuid=chunk.get("uuid")
+                        )
+                    total += len(chunk_batch)
+            elapsed = time.perf_counter() - start_time
+            rate = total / elapsed if elapsed > 0 else 0.0
+            print(f"Documents inserted successfully! {total} chunks in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
+            return total
         except Exception as e:
             print(f"Error inserting documents: {e}")
             raise
- 
- 
+    
+    def delete_documents(self, uuids, collection_name="DocumentChunks"):
+        if not uuids:
+            return
+        from weaviate.classes.query import Filter
+        try:
+            documents_collection = self.client.collections.get(collection_name)
+            for uuid_batch in batched(uuids, 1000):
+                documents_collection.data.delete_many(where=Filter.by_id().contains_any(uuid_batch))
+            print(f"Deleted {len(uuids)} chunks from '{collection_name}'.")
+        except Exception as e:
+            print(f"Error deleting documents: {e}")
+            raise
+    
+    def build_filter(self, filters):
+        """Translates {field: values} into a Weaviate filter; Weaviate applies it before the vector search."""
+        from weaviate.classes.query import Filter
+        filters = normalize_filters(filters)
+        if not filters:
+            return None
+        conditions = [
+            Filter.any_of([Filter.by_property(field).equal(value) for value in values]) if len(values) > 1
+            else Filter.by_property(field).equal(values[0])
+            for field, values in filters.items()
+        ]
+        return Filter.all_of(conditions) if len(conditions) > 1 else conditions[0]
+    
+    def query(self, vector, limit=3, collection_name="DocumentChunks", filters=None):
+        from weaviate.classes.query import MetadataQuery
+        documents_collection = self.client.collections.get(collection_name)
+        response = documents_collection.query.near_vector(
+            near_vector=np.asarray(vector, dtype=np.float32).tolist(), limit=limit,
+            filters=self.build_filter(filters), return_metadata=MetadataQuery(distance=True)
+        )
+        results = []
+        for obj in response.objects:
+            result = {
+                "uuid": str(obj.uuid),
+                "text": obj.properties["text"],
+                "source": obj.properties.get("source", "unknown"),
+                "distance": obj.metadata.distance,
+            }
+            result.update((field, obj.properties[field]) for field in METADATA_FIELDS if obj.properties.get(field) is not None)
+            results.append(result)
+        return results
+    
+    def query_batch(self, vectors, limit=3, collection_name="DocumentChunks", filters=None, max_workers=8):
+        """Issues the near_vector requests concurrently and returns the result lists in input order."""
+        if len(vectors) <= 1:
+            return [self.query(vector, limit, collection_name, filters) for vector in vectors]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(vectors))) as executor:
+            return list(executor.map(lambda vector: self.query(vector, limit, collection_name, filters), vectors))
     
     def close_connection(self):
         if hasattr(self, 'client') and self.client:
             self.client.close()
             print("Weaviate connection closed.")
  
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+ 
 class EmbeddingModel:
-    def __init__(self, model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")):
-        self.model = SentenceTransformer(model_name)
+    """SentenceTransformer wrapper; the model itself is loaded on first use, not at construction.
+    
+    backend (EMBEDDING_BACKEND) selects PyTorch, ONNX Runtime, or ONNX Runtime with a
+    dynamically int8-quantized export. The quantized model is exported once into
+    ONNX_MODEL_DIR and reused afterwards.
+    """
+    def __init__(self, model_name=None, cache=None, backend=None):
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        self.backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+        if self.backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown EMBEDDING_BACKEND '{self.backend}', expected one of {EMBEDDING_BACKENDS}")
+        self.cache = cache
+        self._model = None
+        self._model_lock = threading.Lock()
+    
+    @property
+    def cache_name(self):
+        """Embedding cache namespace; quantized vectors differ slightly, so each backend gets its own."""
+        return self.model_name if self.backend == "torch" else f"{self.model_name}-{self.backend}"
+    
+    @property
+    def model(self):
+        """The loaded model; concurrent first calls wait for a single load instead of each building their own."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.load_model()
+        return self._model
+    
+    def load_model(self):
+        from sentence_transformers import SentenceTransformer
+        if self.backend == "torch":
+            return SentenceTransformer(self.model_name)
+        if self.backend == "onnx":
+            return SentenceTransformer(self.model_name, backend="onnx")
+        model_dir, file_name = self.export_quantized()
+        return SentenceTransformer(model_dir, backend="onnx", model_kwargs={"file_name": file_name})
+    
+    def export_quantized(self):
+        """Exports and int8-quantizes the ONNX model on first use; returns (model directory, ONNX file name)."""
+        config = os.getenv("EMBEDDING_QUANTIZATION", "avx2")
+        model_dir = os.path.join(os.getenv("ONNX_MODEL_DIR", "onnx_models"), self.model_name.replace("/", "_"))
+        file_name = f"onnx/model_qint8_{config}.onnx"
+        if not os.path.exists(os.path.join(model_dir, file_name)):
+            from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+            print(f"Exporting {self.model_name} to int8 ONNX ({config}) in {model_dir}...")
+            onnx_model = SentenceTransformer(self.model_name, backend="onnx")
+            onnx_model.save(model_dir)
+            export_dynamic_quantized_onnx_model(onnx_model, config, model_dir)
+        return model_dir, file_name
     
     def get_embedding(self, text):
+        if self.cache is not None:
+            return self.embed_batch([text])[0].tolist()
         return self.model.encode(text).tolist()
- 
\ No newline at end of file
+    
+    def embed_batch(self, texts, batch_size=64):
+        """Encodes texts in one call and returns a contiguous (n, dim) float32 matrix."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if self.cache is None:
+            return self._encode(texts, batch_size)
+        
+        rows, missing = self.cache.lookup(texts)
+        embeddings = np.empty((len(texts), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for i, row in enumerate(rows):
+            if row is not None:
+                embeddings[i] = row
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = self._encode(missing_texts, batch_size)
+            embeddings[missing] = encoded
+            self.cache.store(missing_texts, encoded)
+        return embeddings
+    
+    def _encode(self, texts, batch_size):
+        embeddings = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
@@ -0,0 +1,144 @@
+import os
+import re
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+class EmbeddingCache:
+    """Persistent, size-bounded LRU cache of embeddings keyed by (model name, text hash).
+
+    Vectors live in a memory-mapped float32 matrix; the index file maps each key
+    to its row and keeps the keys in least-recently-used order. A second memory-mapped
+    file holds a digest of the key stored in each row, written with the vector and
+    checked on lookup, so an index saved before a crash can never hand out a row that
+    was since overwritten by an eviction. Rows are handed out from a high-water mark and
+    a free list of rows released by such stale entries, then by evicting the LRU key.
+    """
+    def __init__(self, model_name, cache_dir="embedding_cache", max_entries=200000):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.directory = os.path.join(cache_dir, slug)
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.matrix_path = os.path.join(self.directory, "embeddings.f32")
+        self.slot_keys_path = os.path.join(self.directory, "slot_keys.bin")
+        self.hits = 0
+        self.misses = 0
+        self.dim = None
+        self.matrix = None
+        self.slot_keys = None
+        self.entries = OrderedDict()
+        self.next_slot = 0
+        self.free_slots = []
+        self.load()
+
+    def key(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{digest}"
+
+    @staticmethod
+    def slot_digest(key):
+        return hashlib.sha256(key.encode("utf-8")).digest()
+
+    def load(self):
+        paths = (self.index_path, self.matrix_path, self.slot_keys_path)
+        if not all(os.path.exists(path) for path in paths):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Embedding cache index is unreadable, starting empty: {e}")
+            return
+        if index.get("capacity") != self.max_entries:
+            print("Embedding cache capacity changed, starting empty.")
+            return
+        self.dim = index["dim"]
+        self.matrix = self._open_matrix("r+")
+        self.slot_keys = self._open_slot_keys("r+")
+        self.entries = OrderedDict((key, slot) for key, slot in index["entries"])
+        self.next_slot = index.get("next_slot", max(self.entries.values(), default=-1) + 1)
+        self.free_slots = sorted(set(range(self.next_slot)) - set(self.entries.values()), reverse=True)
+
+    def _open_matrix(self, mode):
+        return np.memmap(self.matrix_path, dtype=np.float32, mode=mode, shape=(self.max_entries, self.dim))
+
+    def _open_slot_keys(self, mode):
+        # uint8 rows rather than "S32": numpy strips trailing NUL bytes from fixed-width bytes.
+        return np.memmap(self.slot_keys_path, dtype=np.uint8, mode=mode, shape=(self.max_entries, 32))
+
+    def lookup(self, texts):
+        """Returns (rows, missing) where rows[i] is a cached vector or None and missing lists uncached indices."""
+        rows, missing = [], []
+        for i, text in enumerate(texts):
+            key = self.key(text)
+            slot = self.entries.get(key)
+            if slot is not None and self.slot_keys[slot].tobytes() != self.slot_digest(key):
+                del self.entries[key]
+                self.free_slots.append(slot)
+                slot = None
+            if slot is None:
+                rows.append(None)
+                missing.append(i)
+                self.misses += 1
+            else:
+                self.entries.move_to_end(key)
+                rows.append(self.matrix[slot])
+                self.hits += 1
+        return rows, missing
+
+    def store(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        if self.matrix is None:
+            self.dim = vectors.shape[1]
+            os.makedirs(self.directory, exist_ok=True)
+            self.matrix = self._open_matrix("w+")
+            self.slot_keys = self._open_slot_keys("w+")
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cache dimension {self.dim}")
+
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                continue
+            if self.free_slots:
+                slot = self.free_slots.pop()
+            elif self.next_slot < self.max_entries:
+                slot = self.next_slot
+                self.next_slot += 1
+            else:
+                _, slot = self.entries.popitem(last=False)
+            self.slot_keys[slot] = 0
+            self.matrix[slot] = vector
+            self.slot_keys[slot] = np.frombuffer(self.slot_digest(key), dtype=np.uint8)
+            self.entries[key] = slot
+
+    def save(self):
+        if self.matrix is None:
+            return
+        self.matrix.flush()
+        self.slot_keys.flush()
+        index = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "capacity": self.max_entries,
+            "next_slot": self.next_slot,
+            "entries": list(self.entries.items()),
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,66 @@
+import os
+import json
+import uuid
+import hashlib
+
+CHUNK_NAMESPACE = uuid.UUID("5b0f3c8e-2d4a-4b7e-9a61-7c3e1f0d8a52")
+
+class IngestManifest:
+    """Tracks which source files are in a collection, their content hashes and their chunk UUIDs."""
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.files = self.load()
+
+    def load(self):
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r") as f:
+                    return json.load(f).get("files", {})
+            except json.JSONDecodeError:
+                print(f"Manifest '{self.manifest_path}' is corrupted. Starting a fresh one.")
+        return {}
+
+    def save(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def clear(self):
+        self.files = {}
+
+    @staticmethod
+    def file_hash(file_path):
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def assign_chunk_ids(chunks):
+        """Gives each chunk a UUID derived from its source, text and repeat count, so unchanged chunks keep their IDs."""
+        seen = {}
+        for chunk in chunks:
+            key = (chunk["source"], chunk["text"])
+            occurrence = seen.get(key, 0)
+            seen[key] = occurrence + 1
+            chunk["uuid"] = str(uuid.uuid5(CHUNK_NAMESPACE, f"{chunk['source']}\0{occurrence}\0{chunk['text']}"))
+        return chunks
+
+    def diff(self, current_hashes):
+        """Compares current {filename: sha256} against the manifest and returns (added, changed, removed)."""
+        added = sorted(name for name in current_hashes if name not in self.files)
+        changed = sorted(name for name, digest in current_hashes.items()
+                         if name in self.files and self.files[name]["sha256"] != digest)
+        removed = sorted(name for name in self.files if name not in current_hashes)
+        return added, changed, removed
+
+    def chunk_ids(self, filename):
+        return self.files.get(filename, {}).get("chunk_ids", [])
+
+    def update(self, filename, digest, chunk_ids):
+        self.files[filename] = {"sha256": digest, "chunk_ids": list(chunk_ids)}
+
+    def remove(self, filename):
+        self.files.pop(filename, None)
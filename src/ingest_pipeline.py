@@ -0,0 +1,86 @@
+import queue
+import threading
+from vector_store import batched
+
+_DONE = object()
+
+class StreamingIngestPipeline:
+    """Connects extract -> split -> embed -> upload with bounded queues so memory stays flat.
+
+    Extraction and embedding each run in their own thread; uploading runs in the
+    calling thread, so it overlaps with both earlier stages.
+    """
+    def __init__(self, embedding_model, vector_store, collection_name="DocumentChunks", batch_size=64, queue_size=4):
+        self.embedding_model = embedding_model
+        self.vector_store = vector_store
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+
+    def run(self, chunks):
+        """Consumes any chunk iterable (typically a generator) and returns the number of chunks uploaded."""
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        vector_queue = queue.Queue(maxsize=self.queue_size)
+        errors = []
+        stop = threading.Event()
+
+        def put(target, item):
+            while not stop.is_set():
+                try:
+                    target.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source):
+            while not stop.is_set():
+                try:
+                    return source.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _DONE
+
+        def produce():
+            try:
+                for chunk_batch in batched(chunks, self.batch_size):
+                    if not put(chunk_queue, chunk_batch):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(chunk_queue, _DONE)
+
+        def embed():
+            try:
+                while True:
+                    chunk_batch = get(chunk_queue)
+                    if chunk_batch is _DONE:
+                        break
+                    vectors = self.embedding_model.embed_batch([chunk["text"] for chunk in chunk_batch], batch_size=self.batch_size)
+                    if not put(vector_queue, (chunk_batch, vectors)):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(vector_queue, _DONE)
+
+        def drain():
+            while True:
+                item = vector_queue.get()
+                if item is _DONE:
+                    return
+                yield item
+
+        workers = [threading.Thread(target=produce, daemon=True), threading.Thread(target=embed, daemon=True)]
+        for worker in workers:
+            worker.start()
+        try:
+            total = self.vector_store.insert_embedded(drain(), self.collection_name)
+        finally:
+            stop.set()
+            for worker in workers:
+                worker.join()
+        if errors:
+            raise errors[0]
+        return total
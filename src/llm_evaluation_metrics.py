@@ -1,10 +1,18 @@
 import pandas as pd
-import google.generativeai as genai
-from utils import get_api_key
 import time
 import json
 import re
 import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dotenv import load_dotenv
+from rate_limiter import RateLimiter
+
+load_dotenv()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+EMPTY_SCORES = {"Faithfulness": 0, "Precision": 0, "Recall": 0, "Relevancy": 0}
 
 class CSVLoader:
     """Handles loading and preprocessing of the CSV file."""
@@ -22,13 +30,26 @@ class CSVLoader:
 
 class GeminiEvaluator:
     """Handles API calls to Gemini for evaluation."""
-    def __init__(self):
-        genai.configure(api_key=get_api_key())
-        self.model = genai.GenerativeModel(os.getenv('GENAI_MODEL'))
+    def __init__(self, model=None):
+        self.model = model or self.create_model()
+    
+    @staticmethod
+    def create_model():
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GENAI_API_KEY"))
+        return genai.GenerativeModel(os.getenv('GENAI_MODEL'))
     
     @staticmethod
-    def clean_json_response(response_text):
+    def clean_json_response(response_text, expected_count=None):
+        """Parses one score object, or with expected_count a JSON array of that many.
+        
+        A single object falls back to zero scores when it cannot be parsed. An array is
+        validated strictly (length, ids, every metric a number in [0, 1]) and None is
+        returned if anything is off, so the caller can re-ask row by row.
+        """
         response_text = re.sub(r"```json\s*|\s*```", "", response_text.strip())
+        if expected_count is not None:
+            return GeminiEvaluator.parse_score_array(response_text, expected_count)
         try:
             scores = json.loads(response_text)
             return {
@@ -39,10 +60,37 @@ class GeminiEvaluator:
             }
         except json.JSONDecodeError:
             print(f"JSON Decode Error: {response_text}")
-        return {"Faithfulness": 0, "Precision": 0, "Recall": 0, "Relevancy": 0}
+        return dict(EMPTY_SCORES)
     
-    def evaluate(self, question, generated_answer, ground_truth, contexts):
-        prompt = f"""
+    @staticmethod
+    def parse_score_array(response_text, expected_count):
+        try:
+            items = json.loads(response_text)
+        except json.JSONDecodeError:
+            print(f"JSON Decode Error: {response_text}")
+            return None
+        if not isinstance(items, list) or len(items) != expected_count:
+            print(f"Expected a JSON array of {expected_count} score objects, got: {response_text[:200]}")
+            return None
+        
+        ordered = [None] * expected_count
+        for position, item in enumerate(items):
+            if not isinstance(item, dict):
+                return None
+            index = item.get("id", position + 1)
+            if not isinstance(index, int) or not 1 <= index <= expected_count or ordered[index - 1] is not None:
+                return None
+            try:
+                scores = {name: float(item[name]) for name in EMPTY_SCORES}
+            except (KeyError, TypeError, ValueError):
+                return None
+            if not all(0 <= value <= 1 for value in scores.values()):
+                return None
+            ordered[index - 1] = scores
+        return ordered
+    
+    def build_prompt(self, question, generated_answer, ground_truth, contexts):
+        return f"""
         You are evaluating a question-answering system based on four key metrics...
         Provide scores (0-1) in **valid JSON format** as follows:
         ```json
@@ -53,12 +101,36 @@ class GeminiEvaluator:
         Ground Truth: {ground_truth}
         Contexts: {contexts}
         """
+    
+    def build_batch_prompt(self, rows):
+        """One prompt judging several rows; the model must answer with a JSON array in item order."""
+        items = "\n".join(
+            f"""
+        ### Item {i}
+        Question: {row["Question"]}
+        Generated Answer: {row["Generated Answer"]}
+        Ground Truth: {row["Ground Truth"]}
+        Contexts: {row["Contexts"]}"""
+            for i, row in enumerate(rows, start=1)
+        )
+        return f"""
+        You are evaluating a question-answering system based on four key metrics...
+        Score each of the {len(rows)} items below independently.
+        Provide scores (0-1) as a **valid JSON array** with exactly one object per item, in item order:
+        ```json
+        [{{"id": 1, "Faithfulness": 0.85, "Precision": 0.5, "Recall": 0.7, "Relevancy": 0.3}}]
+        ```
+        {items}
+        """
+    
+    def evaluate(self, question, generated_answer, ground_truth, contexts):
+        prompt = self.build_prompt(question, generated_answer, ground_truth, contexts)
         try:
             response = self.model.generate_content(prompt)
             return self.clean_json_response(response.text)
         except Exception as e:
             print(f"Error processing Gemini API: {e}")
-            return {"Faithfulness": 0, "Precision": 0, "Recall": 0, "Relevancy": 0}
+            return dict(EMPTY_SCORES)
 
 class ResultManager:
     """Manages result storage and incremental saving."""
@@ -83,49 +155,168 @@ class ResultManager:
         combined_df = pd.concat([self.existing_results, new_df], ignore_index=True)
         combined_df = combined_df.drop_duplicates(subset=["Generated Answer"])
         combined_df.to_csv(self.result_file, index=False)
+        self.existing_results = combined_df
+        self.processed_questions.update(new_df["Generated Answer"].dropna().str.strip())
         print(f"Saved {len(new_results)} new results.")
 
-# === Main Execution ===
-file_path = "ragas_testing.csv"
-result_file = "testans_results.csv"
-
-data_loader = CSVLoader(file_path)
-evaluator = GeminiEvaluator()
-result_manager = ResultManager(result_file)
+def is_retryable(error):
+    """429 and 5xx from the google-api-core exceptions (or anything else carrying an HTTP .code)."""
+    code = getattr(error, "code", None)
+    if callable(code):
+        code = None
+    return code in RETRY_STATUS_CODES
 
-results = []
+class EvaluationScheduler:
+    """Runs GeminiEvaluator over many rows within the API quota.
+    
+    A token bucket keeps requests under rpm and estimated tokens under tpm, at most
+    concurrency requests are in flight, 429/5xx responses are retried with
+    exponential backoff and jitter, and results are checkpointed through the
+    ResultManager every checkpoint_every rows so an interrupted run can resume.
+    """
+    def __init__(self, evaluator, result_manager, rpm=None, tpm=None, concurrency=None,
+                 max_retries=None, backoff=None, checkpoint_every=None, batch_size=None):
+        self.evaluator = evaluator
+        self.result_manager = result_manager
+        self.rate_limiter = RateLimiter(
+            rpm or float(os.getenv("GENAI_RPM", 15)),
+            tpm or float(os.getenv("GENAI_TPM", 1000000)),
+        )
+        self.concurrency = concurrency or int(os.getenv("GENAI_CONCURRENCY", 4))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("GENAI_MAX_RETRIES", 5))
+        self.backoff = backoff if backoff is not None else float(os.getenv("GENAI_BACKOFF", 2.0))
+        self.checkpoint_every = checkpoint_every or int(os.getenv("EVAL_CHECKPOINT_EVERY", 5))
+        self.batch_size = batch_size or int(os.getenv("GENAI_BATCH_SIZE", 1))
+        self.api_calls = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.counter_lock = threading.Lock()
+    
+    @staticmethod
+    def estimate_tokens(prompt, rows=1):
+        return len(prompt) // 4 + 50 * rows
+    
+    def generate(self, prompt, rows=1):
+        """One rate-limited API call with retries; returns the response text."""
+        estimated = self.estimate_tokens(prompt, rows)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(estimated)
+            try:
+                with self.counter_lock:
+                    self.api_calls += 1
+                response = self.evaluator.model.generate_content(prompt)
+                usage = getattr(response, "usage_metadata", None)
+                self.rate_limiter.settle(estimated, getattr(usage, "total_token_count", None))
+                return response.text
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                with self.counter_lock:
+                    self.retries += 1
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"Gemini request failed ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+    
+    def evaluate_row(self, row):
+        prompt = self.evaluator.build_prompt(row["Question"], row["Generated Answer"], row["Ground Truth"], row["Contexts"])
+        try:
+            scores = self.evaluator.clean_json_response(self.generate(prompt))
+        except Exception as e:
+            print(f"Error processing Gemini API: {e}")
+            scores = dict(EMPTY_SCORES)
+        return self.result_row(row, scores)
+    
+    def evaluate_batch(self, rows):
+        """Judges rows in one prompt; if the reply is not a valid array for them, judges each row separately."""
+        if len(rows) == 1:
+            return [self.evaluate_row(rows[0])]
+        prompt = self.evaluator.build_batch_prompt(rows)
+        try:
+            scores = self.evaluator.clean_json_response(self.generate(prompt, len(rows)), expected_count=len(rows))
+        except Exception as e:
+            print(f"Error processing Gemini API: {e}")
+            scores = None
+        if scores is None:
+            with self.counter_lock:
+                self.fallbacks += 1
+            print(f"Batched judgement failed; falling back to {len(rows)} single-row calls.")
+            return [self.evaluate_row(row) for row in rows]
+        return [self.result_row(row, row_scores) for row, row_scores in zip(rows, scores)]
+    
+    @staticmethod
+    def result_row(row, scores):
+        return {
+            "Question": row["Question"],
+            "Generated Answer": row["Generated Answer"],
+            "Ground Truth": row["Ground Truth"],
+            "Faithfulness": round(scores["Faithfulness"], 2),
+            "Precision": round(scores["Precision"], 2),
+            "Recall": round(scores["Recall"], 2),
+            "Relevancy": round(scores["Relevancy"], 2)
+        }
+    
+    def run(self, rows):
+        """Evaluates rows concurrently, checkpointing as they complete; returns the number of rows evaluated."""
+        results = []
+        completed = 0
+        start_time = time.perf_counter()
+        
+        def collect(futures):
+            nonlocal completed
+            for future in futures:
+                batch_results = future.result()
+                results.extend(batch_results)
+                completed += len(batch_results)
+                if len(results) >= self.checkpoint_every:
+                    self.result_manager.save_results(results)
+                    results.clear()
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = set()
+            for start in range(0, len(rows), self.batch_size):
+                batch = rows[start:start + self.batch_size]
+                print(f"Processing questions {', '.join(str(row['Index'] + 1) for row in batch)}...")
+                pending.add(executor.submit(self.evaluate_batch, batch))
+                if len(pending) >= self.concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            collect(wait(pending).done)
+        
+        if results:
+            self.result_manager.save_results(results)
+        elapsed = time.perf_counter() - start_time
+        print(f"Evaluated {completed} rows in {elapsed:.1f}s with {self.api_calls} API calls "
+              f"({self.retries} retries, {self.fallbacks} batch fallbacks).")
+        return completed
 
-for index, row in data_loader.df.iterrows():
-    generated_answer = str(row["Generated Answer"]).strip()
-    ground_truth = str(row["Ground Truth"]).strip()
-    question = str(row.get("Question", "")).strip()
-    
-    if not generated_answer or generated_answer in result_manager.processed_questions:
-        print(f"Skipping already processed or empty answer at index {index}")
-        continue
-    
-    references = [str(row[f"Context {i}"].strip()) for i in range(1, 5) if f"Context {i}" in row and pd.notna(row[f"Context {i}"])]
-    print(f"Processing question {index + 1}...")
-    
-    scores = evaluator.evaluate(question, generated_answer, ground_truth, references)
-    
-    results.append({
-        "Question": question,
-        "Generated Answer": generated_answer,
-        "Ground Truth": ground_truth,
-        "Faithfulness": round(scores["Faithfulness"], 2),
-        "Precision": round(scores["Precision"], 2),
-        "Recall": round(scores["Recall"], 2),
-        "Relevancy": round(scores["Relevancy"], 2)
-    })
-    
-    if len(results) % 5 == 0:
-        result_manager.save_results(results)
-        results.clear()  # Reset results list after saving
-    
-    time.sleep(5)
+def pending_rows(data_loader, result_manager):
+    """Rows not yet in the results file, as dicts ready for the scheduler."""
+    rows = []
+    for index, row in data_loader.df.iterrows():
+        generated_answer = str(row["Generated Answer"]).strip()
+        ground_truth = str(row["Ground Truth"]).strip()
+        question = str(row.get("Question", "")).strip()
+        
+        if not generated_answer or generated_answer in result_manager.processed_questions:
+            print(f"Skipping already processed or empty answer at index {index}")
+            continue
+        
+        references = [str(row[f"Context {i}"].strip()) for i in range(1, 5) if f"Context {i}" in row and pd.notna(row[f"Context {i}"])]
+        rows.append({"Index": index, "Question": question, "Generated Answer": generated_answer,
+                     "Ground Truth": ground_truth, "Contexts": references})
+    return rows
 
-if results:
-    result_manager.save_results(results)
-else:
-    print("⚠️ No new rows were processed.")
+# === Main Execution ===
+if __name__ == "__main__":
+    file_path = "ragas_testing.csv"
+    result_file = "testans_results.csv"
+    
+    data_loader = CSVLoader(file_path)
+    evaluator = GeminiEvaluator()
+    result_manager = ResultManager(result_file)
+    
+    rows = pending_rows(data_loader, result_manager)
+    if rows:
+        EvaluationScheduler(evaluator, result_manager).run(rows)
+    else:
+        print("⚠️ No new rows were processed.")
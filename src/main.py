@@ -1,56 +1,173 @@
 import os
-import fitz
+import time
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from document_processor import WeaviateManager, EmbeddingModel
-from scrapeNCERT import NCERTScraper
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from document_processor import EmbeddingModel
+from vector_store import LocalVectorStore, create_vector_store
+from embedding_cache import EmbeddingCache
+from ingest_manifest import IngestManifest
+from ingest_pipeline import StreamingIngestPipeline
+from bm25_index import BM25Index
+from chunk_metadata import parse_source, locate_chunks
  
 load_dotenv()
  
+@lru_cache(maxsize=None)
+def get_text_splitter(chunk_size, chunk_overlap):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+ 
+def read_pages(file_path, start=0, stop=None):
+    import fitz
+    with fitz.open(file_path) as doc:
+        stop = doc.page_count if stop is None else stop
+        return [doc[i].get_text("text") for i in range(start, stop)]
+ 
+def split_pages(pages, filename, chunk_size, chunk_overlap):
+    """Splits the joined pages into chunks carrying book, chapter, page range and character offsets."""
+    text_chunks = get_text_splitter(chunk_size, chunk_overlap).split_text("\n".join(pages))
+    book, chapter = parse_source(filename)
+    return [
+        dict(location, text=chunk, source=filename, book=book, chapter=chapter)
+        for chunk, location in zip(text_chunks, locate_chunks(pages, text_chunks))
+    ]
+ 
+def extract_pdf(file_path, chunk_size, chunk_overlap):
+    """Process-pool worker: reads and splits one whole PDF."""
+    return split_pages(read_pages(file_path), os.path.basename(file_path), chunk_size, chunk_overlap)
+ 
 class PDFProcessor:
-    def __init__(self, pdf_directory):
+    def __init__(self, pdf_directory, workers=None, pages_per_task=None, chunk_size=1000, chunk_overlap=200):
         self.pdf_directory = pdf_directory
-        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.text_splitter = get_text_splitter(chunk_size, chunk_overlap)
+        self.workers = workers if workers is not None else int(os.getenv("EXTRACT_WORKERS", 1))
+        self.pages_per_task = pages_per_task if pages_per_task is not None else int(os.getenv("EXTRACT_PAGES_PER_TASK", 50))
+    
+    def list_pdfs(self):
+        return sorted(filename for filename in os.listdir(self.pdf_directory) if filename.endswith(".pdf"))
+    
+    def extract_file(self, filename):
+        file_path = os.path.join(self.pdf_directory, filename)
+        print(f"Processing {file_path}...")
+        return extract_pdf(file_path, self.chunk_size, self.chunk_overlap)
+    
+    def extract_files(self, filenames):
+        """Returns [(filename, chunks)] in the order given; chunks is None for files that failed."""
+        return list(self.iter_files(filenames))
+    
+    def iter_files(self, filenames):
+        """Yields (filename, chunks) one file at a time, in the order given."""
+        if self.workers > 1 and len(filenames) > 0:
+            yield from self.iter_files_parallel(filenames)
+            return
+        
+        for filename in filenames:
+            try:
+                yield filename, self.extract_file(filename)
+            except Exception as e:
+                print(f"Error processing {os.path.join(self.pdf_directory, filename)}: {e}")
+                yield filename, None
+    
+    def iter_files_parallel(self, filenames):
+        """Fans whole small files, or page ranges of large files, out to a process pool.
+        
+        At most twice the worker count of files are in flight, so finished results
+        never pile up ahead of a slow consumer.
+        """
+        print(f"Extracting {len(filenames)} PDFs with {self.workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for filename in filenames:
+                pending.append((filename, self.submit_file(executor, filename)))
+                if len(pending) > self.workers * 2:
+                    yield self.collect_file(*pending.popleft())
+            while pending:
+                yield self.collect_file(*pending.popleft())
+    
+    def submit_file(self, executor, filename):
+        import fitz
+        file_path = os.path.join(self.pdf_directory, filename)
+        try:
+            with fitz.open(file_path) as doc:
+                page_count = doc.page_count
+        except Exception as e:
+            print(f"Error processing {file_path}: {e}")
+            return None
+        
+        if page_count > self.pages_per_task:
+            return [
+                executor.submit(read_pages, file_path, start, min(start + self.pages_per_task, page_count))
+                for start in range(0, page_count, self.pages_per_task)
+            ]
+        return executor.submit(extract_pdf, file_path, self.chunk_size, self.chunk_overlap)
     
-    def extract_text(self):
+    def collect_file(self, filename, submitted):
+        if submitted is None:
+            return filename, None
+        try:
+            if isinstance(submitted, list):
+                pages = [page for future in submitted for page in future.result()]
+                return filename, split_pages(pages, filename, self.chunk_size, self.chunk_overlap)
+            return filename, submitted.result()
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
+            return filename, None
+    
+    def extract_text(self, filenames=None):
         chunks = []
         
         if not os.path.exists(self.pdf_directory):
             print(f"Directory '{self.pdf_directory}' does not exist.")
             return chunks
         
-        for filename in os.listdir(self.pdf_directory):
-            if filename.endswith(".pdf"):
-                file_path = os.path.join(self.pdf_directory, filename)
-                print(f"Processing {file_path}...")
-                
-                try:
-                    doc = fitz.open(file_path)
-                    full_text = "\n".join(page.get_text("text") for page in doc)
-                    text_chunks = self.text_splitter.split_text(full_text)
-                    
-                    for chunk in text_chunks:
-                        chunks.append({"text": chunk, "source": filename})
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
+        filenames = filenames if filenames is not None else self.list_pdfs()
+        for _, file_chunks in self.extract_files(filenames):
+            if file_chunks:
+                chunks.extend(file_chunks)
         
         return chunks
  
 class BackendRunner:
-    def __init__(self, pdf_directory="books/extracted", collection_name="DocumentChunks"):
+    def __init__(self, pdf_directory="books/extracted", collection_name="DocumentChunks", incremental=None):
         self.pdf_directory = pdf_directory
         self.collection_name = collection_name
-        self.scraper = NCERTScraper()
-        self.weaviate_manager = WeaviateManager()
+        if incremental is None:
+            incremental = os.getenv("INCREMENTAL_INGEST", "false").lower() == "true"
+        self.incremental = incremental
+        self.manifest = IngestManifest(os.getenv("INGEST_MANIFEST", f"{collection_name}_manifest.json"))
+        self._scraper = None
+        self.vector_store = create_vector_store()
         self.embedding_model = EmbeddingModel()
+        self.embedding_model.cache = self.create_embedding_cache(self.embedding_model.cache_name)
         self.client = None
  
-    def setup_weaviate(self):
+    @property
+    def scraper(self):
+        """NCERTScraper pulls in selenium, so it is only imported when books actually need downloading."""
+        if self._scraper is None:
+            from scrapeNCERT import NCERTScraper
+            self._scraper = NCERTScraper()
+        return self._scraper
+ 
+    def create_embedding_cache(self, cache_name):
+        cache_dir = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
+        if not cache_dir:
+            return None
+        max_entries = int(os.getenv("EMBEDDING_CACHE_SIZE", 200000))
+        return EmbeddingCache(cache_name, cache_dir, max_entries)
+ 
+    def setup_vector_store(self):
         try:
-            self.client = self.weaviate_manager.client
-            if not self.client:
+            self.client = self.vector_store.client
+            if not self.client and not isinstance(self.vector_store, LocalVectorStore):
                 raise ConnectionError("Failed to connect to Weaviate.")
-            self.weaviate_manager.setup_collection(self.collection_name)
+            created = self.vector_store.setup_collection(self.collection_name, recreate=not self.incremental)
+            if created:
+                self.manifest.clear()
         except Exception as e:
             print(f"Error: {e}")
             return False
@@ -61,26 +178,115 @@ class BackendRunner:
             self.scraper.scrape_data()
             self.scraper.extract_zip()
  
-        if not self.setup_weaviate():
+        if not self.setup_vector_store():
             return None
+        full_ingest = not self.manifest.files
  
-        pdf_processor = PDFProcessor(self.pdf_directory)
-        chunks = pdf_processor.extract_text()
-        
-        if not chunks:
-            print("No text extracted from PDFs.")
+        if not os.path.exists(self.pdf_directory):
+            print(f"Directory '{self.pdf_directory}' does not exist.")
             return None
  
+        pdf_processor = PDFProcessor(self.pdf_directory)
+        current_hashes = {
+            filename: IngestManifest.file_hash(os.path.join(self.pdf_directory, filename))
+            for filename in pdf_processor.list_pdfs()
+        }
+        added, changed, removed = self.manifest.diff(current_hashes)
+        if self.incremental:
+            print(f"Incremental ingest: {len(added)} new, {len(changed)} changed, {len(removed)} removed PDFs.")
+        
+        # The chunks are only kept for the keyword index, which holds all of them anyway.
+        to_delete, new_ids = [], {}
+        new_chunks = [] if self.keyword_index_dir() else None
+        for filename in removed:
+            to_delete.extend(self.manifest.chunk_ids(filename))
+        chunks = self.iter_file_chunks(pdf_processor, added + changed, new_ids, to_delete, new_chunks)
+        
+        pipeline = StreamingIngestPipeline(
+            self.embedding_model, self.vector_store, self.collection_name,
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", 64)),
+            queue_size=int(os.getenv("INGEST_QUEUE_SIZE", 4)),
+        )
         try:
-            self.weaviate_manager.insert_documents(chunks, self.embedding_model, self.collection_name)
+            inserted = pipeline.run(chunks)
+            self.vector_store.delete_documents(to_delete, self.collection_name)
         except Exception as e:
-            print(f"Error inserting documents into Weaviate: {e}")
+            print(f"Error inserting documents into the vector store: {e}")
             return None
+        finally:
+            self.save_embedding_cache()
         
+        if not new_ids and not self.manifest.files:
+            print("No text extracted from PDFs.")
+            return None
+        
+        for filename in removed:
+            self.manifest.remove(filename)
+        for filename, chunk_ids in new_ids.items():
+            self.manifest.update(filename, current_hashes[filename], chunk_ids)
+        self.manifest.save()
+        print(f"Ingest done: {inserted} chunks inserted or updated, {len(to_delete)} deleted.")
+        self.update_keyword_index(new_chunks, to_delete, full_ingest)
+        if isinstance(self.vector_store, LocalVectorStore) and self.vector_store.index_type == "ivf":
+            self.vector_store.build_index(self.collection_name)
         return self.client
  
+    def keyword_index_dir(self):
+        """Where this collection's BM25 index is saved, or None when BM25_INDEX_DIR= disables it."""
+        index_dir = os.getenv("BM25_INDEX_DIR", "bm25_index")
+        return os.path.join(index_dir, self.collection_name) if index_dir else None
+ 
+    def update_keyword_index(self, new_chunks, to_delete, full_ingest):
+        """Builds or incrementally updates the BM25 index over the same chunks."""
+        directory = self.keyword_index_dir()
+        if not directory:
+            return None
+        start_time = time.perf_counter()
+        if full_ingest:
+            index = BM25Index().build(new_chunks)
+        else:
+            index = BM25Index.load(directory)
+            if not len(index) and isinstance(self.vector_store, LocalVectorStore):
+                index.build(self.vector_store.load(self.collection_name)[1])
+            elif not len(index):
+                # An index over only the new chunks would never be seeded with the older ones,
+                # so leave it absent (vector-only search) until a full ingest builds it.
+                print("No BM25 index yet for the already ingested chunks; run once with INCREMENTAL_INGEST=false to build it.")
+                return None
+            else:
+                index.update(new_chunks, to_delete)
+        index.save(directory)
+        print(f"BM25 index: {len(index)} chunks, {len(index.vocabulary)} terms in {time.perf_counter() - start_time:.2f}s")
+        return index
+ 
+    def iter_file_chunks(self, pdf_processor, filenames, new_ids, to_delete, new_chunks=None):
+        """Streams every chunk of the given files, recording their chunk IDs and the stale ones as it goes.
+        
+        Chunks whose text did not change keep their ID, but their page range and offsets
+        move with any edit before them, so all of a changed file's chunks are upserted.
+        """
+        for filename, chunks in pdf_processor.iter_files(filenames):
+            if not chunks:
+                continue
+            chunks = IngestManifest.assign_chunk_ids(chunks)
+            old_ids = set(self.manifest.chunk_ids(filename))
+            new_ids[filename] = [chunk["uuid"] for chunk in chunks]
+            to_delete.extend(old_ids - set(new_ids[filename]))
+            for chunk in chunks:
+                if new_chunks is not None:
+                    new_chunks.append(chunk)
+                yield chunk
+ 
+    def save_embedding_cache(self):
+        cache = self.embedding_model.cache
+        if cache is not None:
+            cache.save()
+            stats = cache.stats()
+            print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries stored.")
+ 
 if __name__ == "__main__":
     backend = BackendRunner()
     backend.run()
+    backend.vector_store.close_connection()
  
  
\ No newline at end of file
@@ -0,0 +1,172 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+class QueryTiming:
+    """Per-query stage timings in seconds plus prompt/response token counts."""
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.stages = {}
+        self.total = None
+        self.time_to_first_token = None
+        self.prompt_tokens = None
+        self.response_tokens = None
+        self.llm_skipped = None
+
+    @contextmanager
+    def stage(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start_time
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark_first_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.start_time
+
+    def finish(self):
+        if self.total is None:
+            self.total = time.perf_counter() - self.start_time
+        return self
+
+    def to_dict(self):
+        return {
+            "stages": dict(self.stages),
+            "total": self.total,
+            "time_to_first_token": self.time_to_first_token,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "llm_skipped": self.llm_skipped,
+        }
+
+class LatencyHistogram:
+    """Keeps the most recent samples of one measurement and reports percentiles over them."""
+    def __init__(self, max_samples=10000):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def percentiles(self, quantiles=(50, 95, 99)):
+        if not self.samples:
+            return {q: None for q in quantiles}
+        values = np.percentile(np.fromiter(self.samples, dtype=np.float64), quantiles)
+        return dict(zip(quantiles, values.tolist()))
+
+class QueryMetrics:
+    """Aggregates QueryTiming objects into per-stage latency histograms, token and LLM call counters."""
+    def __init__(self, max_samples=10000):
+        self.lock = threading.Lock()
+        self.max_samples = max_samples
+        self.histograms = {}
+        self.tokens = {"prompt": 0, "response": 0}
+        self.llm_calls = 0
+        self.llm_calls_avoided = {}
+
+    def _histogram(self, name):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram(self.max_samples)
+        return self.histograms[name]
+
+    def record(self, timing):
+        with self.lock:
+            for name, seconds in timing.stages.items():
+                self._histogram(name).observe(seconds)
+            if timing.total is not None:
+                self._histogram("total").observe(timing.total)
+            if timing.time_to_first_token is not None:
+                self._histogram("time_to_first_token").observe(timing.time_to_first_token)
+            self.tokens["prompt"] += timing.prompt_tokens or 0
+            self.tokens["response"] += timing.response_tokens or 0
+            if timing.llm_skipped:
+                self.llm_calls_avoided[timing.llm_skipped] = self.llm_calls_avoided.get(timing.llm_skipped, 0) + 1
+            elif "generate" in timing.stages:
+                self.llm_calls += 1
+
+    def llm_call_counts(self):
+        """LLM generations made, and those avoided keyed by reason (cache, no_results, low_confidence)."""
+        with self.lock:
+            return {"made": self.llm_calls, "avoided": dict(self.llm_calls_avoided)}
+
+    def summary(self):
+        with self.lock:
+            return {
+                name: dict(histogram.percentiles(), count=histogram.count)
+                for name, histogram in self.histograms.items()
+            }
+
+    def summary_lines(self):
+        lines = []
+        for name, stats in self.summary().items():
+            if stats[50] is None:
+                continue
+            lines.append(f"{name}: p50={stats[50] * 1000:.0f}ms p95={stats[95] * 1000:.0f}ms "
+                         f"p99={stats[99] * 1000:.0f}ms n={stats['count']}")
+        calls = self.llm_call_counts()
+        if calls["avoided"]:
+            reasons = " ".join(f"{reason}={count}" for reason, count in calls["avoided"].items())
+            lines.append(f"llm calls: made={calls['made']} avoided={sum(calls['avoided'].values())} ({reasons})")
+        return lines
+
+    def to_prometheus(self):
+        """Renders the histograms as Prometheus summaries in the text exposition format."""
+        lines = [
+            "# HELP rag_query_stage_seconds Latency of each query pipeline stage.",
+            "# TYPE rag_query_stage_seconds summary",
+        ]
+        with self.lock:
+            for name, histogram in self.histograms.items():
+                for quantile, value in histogram.percentiles().items():
+                    if value is not None:
+                        lines.append(f'rag_query_stage_seconds{{stage="{name}",quantile="{quantile / 100}"}} {value:.6f}')
+                lines.append(f'rag_query_stage_seconds_sum{{stage="{name}"}} {histogram.sum:.6f}')
+                lines.append(f'rag_query_stage_seconds_count{{stage="{name}"}} {histogram.count}')
+            lines.append("# HELP rag_tokens_total Tokens sent to and generated by the LLM.")
+            lines.append("# TYPE rag_tokens_total counter")
+            for kind, count in self.tokens.items():
+                lines.append(f'rag_tokens_total{{kind="{kind}"}} {count}')
+            lines.append("# HELP rag_llm_calls_total LLM generations made.")
+            lines.append("# TYPE rag_llm_calls_total counter")
+            lines.append(f"rag_llm_calls_total {self.llm_calls}")
+            lines.append("# HELP rag_llm_calls_avoided_total Queries answered without an LLM generation, by reason.")
+            lines.append("# TYPE rag_llm_calls_avoided_total counter")
+            for reason, count in self.llm_calls_avoided.items():
+                lines.append(f'rag_llm_calls_avoided_total{{reason="{reason}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+QUERY_METRICS = QueryMetrics()
+
+def start_metrics_server(port, metrics=QUERY_METRICS, host="127.0.0.1"):
+    """Serves metrics.to_prometheus() at /metrics from a daemon thread and returns the server.
+
+    Binds to localhost by default; pass host="0.0.0.0" to let a remote Prometheus scrape it.
+    """
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
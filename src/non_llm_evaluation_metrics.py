@@ -1,54 +1,321 @@
+import os
+import math
+import hashlib
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
-from rouge_score import rouge_scorer
-from bert_score import score
+from nltk.stem import porter
+from rouge_score import tokenize
 
-class Scorer:
-    @staticmethod
-    def compute_bleu(references, candidate):
-        reference_tokens = [ref.split() for ref in references]
-        candidate_tokens = candidate.split()
-        chencherry = SmoothingFunction()
-        return sentence_bleu(reference_tokens, candidate_tokens,
-                             weights=(0.5, 0.5, 0, 0),
-                             smoothing_function=chencherry.method1) * 100
+BLEU_WEIGHTS = (0.5, 0.5, 0, 0)
+BLEU_EPSILON = 0.1
+
+def ngram_counts(tokens, n):
+    return Counter(tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+
+def fmeasure(precision, recall):
+    if precision + recall > 0:
+        return 2 * precision * recall / (precision + recall)
+    return 0.0
+
+def token_bitmasks(tokens):
+    """Maps each token to an int with bit j set where tokens[j] is that token."""
+    masks = {}
+    for j, token in enumerate(tokens):
+        masks[token] = masks.get(token, 0) | (1 << j)
+    return masks
+
+def lcs_length(reference, candidate_masks, candidate_length):
+    """Bit-parallel LCS length (Hyyro 2004): one big-int update per reference token instead of a full DP row."""
+    full = (1 << candidate_length) - 1
+    row = full
+    for token in reference:
+        matches = row & candidate_masks.get(token, 0)
+        row = ((row + matches) | (row - matches)) & full
+    return candidate_length - bin(row).count("1")
+
+class CachedStemmer:
+    """Porter stemmer that remembers each word it has stemmed; answers and contexts reuse most of their vocabulary."""
+    def __init__(self):
+        self.stemmer = porter.PorterStemmer()
+        self.stems = {}
     
-    @staticmethod
-    def compute_rouge(references, candidate):
-        scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
-        rouge_1_scores, rouge_2_scores, rouge_l_scores = [], [], []
+    def stem(self, word):
+        stem = self.stems.get(word)
+        if stem is None:
+            stem = self.stems[word] = self.stemmer.stem(word)
+        return stem
+
+class BatchScorer:
+    """BLEU and ROUGE for many rows with one stemmer, and each distinct text tokenized once.
+    
+    Scores are identical to nltk's sentence_bleu (weights 0.5/0.5, Chen-Cherry method1)
+    and rouge_score's RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True):
+    the n-gram matching, clipping, brevity penalty and F-measure follow those
+    implementations step for step.
+    """
+    def __init__(self):
+        self.stemmer = CachedStemmer()
+        self.rouge_tokens = {}
+        self.bleu_ngrams = {}
+    
+    def tokens_for_rouge(self, text):
+        tokens = self.rouge_tokens.get(text)
+        if tokens is None:
+            tokens = tokenize.tokenize(text, self.stemmer)
+            self.rouge_tokens[text] = tokens = (tokens, ngram_counts(tokens, 1), ngram_counts(tokens, 2), token_bitmasks(tokens))
+        return tokens
+    
+    def tokens_for_bleu(self, text):
+        entry = self.bleu_ngrams.get(text)
+        if entry is None:
+            tokens = text.split()
+            orders = [n for n, weight in enumerate(BLEU_WEIGHTS, start=1) if weight]
+            self.bleu_ngrams[text] = entry = (len(tokens), {n: ngram_counts(tokens, n) for n in orders})
+        return entry
+    
+    def bleu(self, references, candidate):
+        hyp_len, hyp_ngrams = self.tokens_for_bleu(candidate)
+        refs = [self.tokens_for_bleu(ref) for ref in references]
         
-        for ref in references:
-            scores = scorer.score(ref, candidate)
-            rouge_1_scores.append(scores['rouge1'].fmeasure * 100)
-            rouge_2_scores.append(scores['rouge2'].fmeasure * 100)
-            rouge_l_scores.append(scores['rougeL'].fmeasure * 100)
+        log_precision = []
+        for n, weight in enumerate(BLEU_WEIGHTS, start=1):
+            if not weight:
+                continue
+            counts = hyp_ngrams[n]
+            max_counts = Counter()
+            for _, ref_ngrams in refs:
+                for ngram, count in (counts & ref_ngrams[n]).items():
+                    if count > max_counts[ngram]:
+                        max_counts[ngram] = count
+            numerator = sum(max_counts.values())
+            denominator = max(1, sum(counts.values()))
+            if n == 1 and numerator == 0:
+                return 0.0
+            precision = (numerator + BLEU_EPSILON) / denominator if numerator == 0 else numerator / denominator
+            log_precision.append(weight * math.log(precision))
         
+        closest_ref_len = min((ref_len for ref_len, _ in refs), key=lambda ref_len: (abs(ref_len - hyp_len), ref_len))
+        if hyp_len > closest_ref_len:
+            brevity_penalty = 1
+        else:
+            brevity_penalty = math.exp(1 - closest_ref_len / hyp_len)
+        return brevity_penalty * math.exp(math.fsum(log_precision)) * 100
+    
+    def rouge(self, references, candidate):
+        candidate_tokens, candidate_unigrams, candidate_bigrams, candidate_masks = self.tokens_for_rouge(candidate)
+        rouge_1_scores, rouge_2_scores, rouge_l_scores = [], [], []
+        for ref in references:
+            ref_tokens, ref_unigrams, ref_bigrams, _ = self.tokens_for_rouge(ref)
+            rouge_1_scores.append(self.ngram_fmeasure(ref_unigrams, candidate_unigrams) * 100)
+            rouge_2_scores.append(self.ngram_fmeasure(ref_bigrams, candidate_bigrams) * 100)
+            if not ref_tokens or not candidate_tokens:
+                rouge_l_scores.append(0)
+                continue
+            lcs = lcs_length(ref_tokens, candidate_masks, len(candidate_tokens))
+            rouge_l_scores.append(fmeasure(lcs / len(candidate_tokens), lcs / len(ref_tokens)) * 100)
         return {
             "ROUGE-1": max(rouge_1_scores),
             "ROUGE-2": max(rouge_2_scores),
             "ROUGE-L": max(rouge_l_scores)
         }
     
+    @staticmethod
+    def ngram_fmeasure(ref_ngrams, candidate_ngrams):
+        overlap = sum((ref_ngrams & candidate_ngrams).values())
+        precision = overlap / max(sum(candidate_ngrams.values()), 1)
+        recall = overlap / max(sum(ref_ngrams.values()), 1)
+        return fmeasure(precision, recall)
+    
+    def score_rows(self, samples):
+        """samples: [(references, candidate)]. Returns [(bleu, rouge dict)] in the same order."""
+        return [(self.bleu(references, candidate), self.rouge(references, candidate)) for references, candidate in samples]
+
+def score_chunk(samples):
+    """Process-pool worker: scores one slice of rows with its own BatchScorer."""
+    return BatchScorer().score_rows(samples)
+
+def score_samples(samples, workers=None):
+    """BLEU and ROUGE for every (references, candidate) row, spread over EVAL_WORKERS processes."""
+    workers = workers or int(os.getenv("EVAL_WORKERS", os.cpu_count() or 1))
+    if workers <= 1 or len(samples) < 2 * workers:
+        return BatchScorer().score_rows(samples)
+    chunk_size = math.ceil(len(samples) / workers)
+    chunks = [samples[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [result for chunk_results in executor.map(score_chunk, chunks) for result in chunk_results]
+
+class BertScoreStage:
+    """BERTScore F1 for many rows with one model load and large flattened batches.
+    
+    Every (candidate, reference) pair of every row is scored in one pass and each row
+    keeps its best F1, like calling bert_score.score per pair and taking the max. With
+    cache_path set, reference token embeddings are kept in a torch file keyed by model
+    and text, so re-evaluating the same ground truths and contexts skips their forward passes.
+    """
+    def __init__(self, lang="en", model_type=None, num_layers=None, batch_size=None, cache_path=None):
+        self.lang = lang
+        self.model_type = model_type
+        self.num_layers = num_layers
+        self.batch_size = batch_size or int(os.getenv("BERTSCORE_BATCH_SIZE", 64))
+        self.cache_path = cache_path if cache_path is not None else os.getenv("BERTSCORE_CACHE", "")
+        self._scorer = None
+        self._encoder = None
+        self.cache = None
+    
+    @property
+    def scorer(self):
+        if self._scorer is None:
+            from bert_score import BERTScorer
+            print("Loading BERTScore model...")
+            self._scorer = BERTScorer(lang=self.lang, model_type=self.model_type, num_layers=self.num_layers,
+                                      batch_size=self.batch_size)
+        return self._scorer
+    
+    @property
+    def encoder(self):
+        """Model, tokenizer, idf weights, device and hash for the cached path, built with bert_score.utils as BERTScorer builds them."""
+        if self._encoder is None:
+            import torch
+            from bert_score.utils import get_hash, get_model, get_tokenizer, lang2model, model2layers
+            print("Loading BERTScore model...")
+            model_type = self.model_type or lang2model[self.lang.lower()]
+            num_layers = self.num_layers or model2layers[model_type]
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            tokenizer = get_tokenizer(model_type, use_fast=False)
+            model = get_model(model_type, num_layers)
+            model.to(device)
+            # Without idf, BERTScorer.score weighs every token 1 except [SEP] and [CLS].
+            idf_dict = defaultdict(lambda: 1.0)
+            idf_dict[tokenizer.sep_token_id] = 0
+            idf_dict[tokenizer.cls_token_id] = 0
+            model_hash = get_hash(model_type, num_layers, False, False, False, False)
+            self._encoder = (model, tokenizer, idf_dict, device, model_hash)
+        return self._encoder
+    
+    def score_rows(self, samples):
+        """samples: [(references, candidate)]. Returns the max F1 * 100 per row, in order."""
+        candidates, references, rows = [], [], []
+        for row, (refs, candidate) in enumerate(samples):
+            for ref in refs:
+                candidates.append(candidate)
+                references.append(ref)
+                rows.append(row)
+        if not candidates:
+            return []
+        
+        if self.cache_path:
+            f1 = self.score_pairs_cached(candidates, references)
+        else:
+            _, _, f1 = self.scorer.score(candidates, references, batch_size=self.batch_size)
+            f1 = f1.tolist()
+        
+        best = [None] * len(samples)
+        for row, value in zip(rows, f1):
+            value *= 100
+            if best[row] is None or value > best[row]:
+                best[row] = value
+        return best
+    
+    def cache_key(self, text):
+        return hashlib.sha256(f"{self.encoder[4]}|{text}".encode("utf-8")).hexdigest()
+    
+    def load_cache(self):
+        import torch
+        if self.cache is None:
+            self.cache = torch.load(self.cache_path) if os.path.exists(self.cache_path) else {}
+        return self.cache
+    
+    def save_cache(self):
+        import torch
+        temp_path = self.cache_path + ".tmp"
+        torch.save(self.cache, temp_path)
+        os.replace(temp_path, self.cache_path)
+    
+    def embed(self, sentences):
+        """(token embeddings, idf weights) per sentence, computed the way bert_score.score does."""
+        from bert_score.utils import get_bert_embedding
+        model, tokenizer, idf_dict, device, _ = self.encoder
+        stats = {}
+        sentences = sorted(set(sentences), key=lambda x: len(x.split(" ")), reverse=True)
+        for start in range(0, len(sentences), self.batch_size):
+            batch = sentences[start:start + self.batch_size]
+            embeddings, masks, idf = get_bert_embedding(batch, model, tokenizer, idf_dict, device=device, all_layers=False)
+            for i, sentence in enumerate(batch):
+                length = int(masks[i].sum().item())
+                stats[sentence] = (embeddings[i, :length].cpu(), idf[i, :length].cpu())
+        return stats
+    
+    def score_pairs_cached(self, candidates, references):
+        import torch
+        from torch.nn.utils.rnn import pad_sequence
+        from bert_score.utils import greedy_cos_idf
+        cache = self.load_cache()
+        
+        keys = {ref: self.cache_key(ref) for ref in set(references)}
+        missing = [ref for ref, key in keys.items() if key not in cache]
+        if missing:
+            for ref, value in self.embed(missing).items():
+                cache[keys[ref]] = value
+            self.save_cache()
+        print(f"BERTScore reference cache: {len(keys) - len(missing)} hits, {len(missing)} misses")
+        candidate_stats = self.embed(candidates)
+        
+        def padded(stats):
+            embeddings, idf = zip(*stats)
+            lengths = torch.tensor([e.size(0) for e in embeddings], dtype=torch.long)
+            mask = torch.arange(int(lengths.max())).expand(len(lengths), -1) < lengths.unsqueeze(1)
+            device = self.encoder[3]
+            return (pad_sequence([e.to(device) for e in embeddings], batch_first=True, padding_value=2.0),
+                    mask.to(device), pad_sequence([i.to(device) for i in idf], batch_first=True))
+        
+        f1 = []
+        with torch.no_grad():
+            for start in range(0, len(candidates), self.batch_size):
+                ref_stats = padded([cache[keys[ref]] for ref in references[start:start + self.batch_size]])
+                candidate_batch = padded([candidate_stats[c] for c in candidates[start:start + self.batch_size]])
+                _, _, batch_f1 = greedy_cos_idf(*ref_stats, *candidate_batch)
+                f1.extend(batch_f1.cpu().tolist())
+        return f1
+
+class Scorer:
+    _batch_scorer = None
+    _bertscore_stage = None
+    
+    @classmethod
+    def batch_scorer(cls):
+        if cls._batch_scorer is None:
+            cls._batch_scorer = BatchScorer()
+        return cls._batch_scorer
+    
+    @staticmethod
+    def compute_bleu(references, candidate):
+        return Scorer.batch_scorer().bleu(references, candidate)
+    
+    @staticmethod
+    def compute_rouge(references, candidate):
+        return Scorer.batch_scorer().rouge(references, candidate)
+    
+    @classmethod
+    def bertscore_stage(cls):
+        if cls._bertscore_stage is None:
+            cls._bertscore_stage = BertScoreStage()
+        return cls._bertscore_stage
+    
     @staticmethod
     def compute_bertscore(references, candidate):
-        scores = []
-        for ref in references:
-            _, _, F1 = score([candidate], [ref], lang="en", verbose=False)
-            scores.append(F1.item() * 100)
-        return max(scores)
+        return Scorer.bertscore_stage().score_rows([(references, candidate)])[0]
 
 class DataProcessor:
     def __init__(self, file_path):
         self.df = pd.read_csv(file_path)
     
     def get_samples(self):
-        for index, row in self.df.iterrows():
-            generated_answer = row["Generated Answer"]
-            ground_truth = row["Ground Truth"]
-            references = [ground_truth] + [row["Context1"], row["Context2"], row["Context3"]]
-            references = [ref for ref in references if pd.notna(ref)]
-            yield index, generated_answer, references, row
+        columns = ["Generated Answer", "Ground Truth", "Context1", "Context2", "Context3"]
+        for index, values in zip(self.df.index, zip(*(self.df[column].tolist() for column in columns))):
+            row = dict(zip(columns, values))
+            references = [ref for ref in values[1:] if pd.notna(ref)]
+            yield index, row["Generated Answer"], references, row
 
 class Evaluator:
     def __init__(self, file_path):
@@ -58,13 +325,14 @@ class Evaluator:
         self.num_samples = len(self.processor.df)
     
     def evaluate(self):
-        for index, generated_answer, references, row in self.processor.get_samples():
-            print(f"Processing: {index}")
-            
-            bleu = Scorer.compute_bleu(references, generated_answer)
-            rouge_scores = Scorer.compute_rouge(references, generated_answer)
-            bertscore = Scorer.compute_bertscore(references, generated_answer)
-            
+        samples = list(self.processor.get_samples())
+        print(f"Scoring BLEU/ROUGE for {len(samples)} rows...")
+        pairs = [(references, generated_answer) for _, generated_answer, references, _ in samples]
+        lexical_scores = score_samples(pairs)
+        print(f"Scoring BERTScore for {len(samples)} rows...")
+        bertscores = Scorer.bertscore_stage().score_rows(pairs)
+        
+        for (index, generated_answer, references, row), (bleu, rouge_scores), bertscore in zip(samples, lexical_scores, bertscores):
             self.evaluation_results.append({
                 "Generated Answer": generated_answer,
                 "Ground Truth": row["Ground Truth"],
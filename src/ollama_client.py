@@ -0,0 +1,68 @@
+import os
+import time
+import json
+import random
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+class OllamaClient:
+    """Ollama /api/generate client with a pooled keep-alive session, timeouts and bounded retries.
+
+    Retries cover connection errors, timeouts and 5xx responses, with exponential
+    backoff and jitter. The latency of each call is kept in self.latencies.
+    """
+    def __init__(self, url=None, model=None, connect_timeout=None, read_timeout=None,
+                 max_retries=None, backoff=None, pool_size=None):
+        self.url = url or os.getenv("OLLAMA_URL")
+        self.model = model or os.getenv("OLLAMA_MODEL")
+        self.timeout = (
+            connect_timeout or float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5)),
+            read_timeout or float(os.getenv("OLLAMA_READ_TIMEOUT", 120)),
+        )
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OLLAMA_MAX_RETRIES", 2))
+        self.backoff = backoff if backoff is not None else float(os.getenv("OLLAMA_BACKOFF", 0.5))
+        pool_size = pool_size or int(os.getenv("OLLAMA_POOL_SIZE", 10))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.latencies = deque(maxlen=1000)
+
+    def post(self, payload, stream=False):
+        """POSTs payload, retrying transient failures, and returns the response."""
+        start_time = time.perf_counter()
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+                    response.raise_for_status()
+                    return response
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError) as e:
+                    status = e.response.status_code if e.response is not None else None
+                    if attempt >= self.max_retries or (status is not None and status not in RETRY_STATUS_CODES):
+                        raise
+                    delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                    print(f"Ollama request failed ({e}); retrying in {delay:.2f}s")
+                    time.sleep(delay)
+        finally:
+            self.latencies.append(time.perf_counter() - start_time)
+
+    def generate(self, prompt, model=None):
+        """Returns the full Ollama JSON response for a non-streaming generation."""
+        response = self.post({"model": model or self.model, "prompt": prompt, "stream": False})
+        return response.json()
+
+    def generate_stream(self, prompt, model=None):
+        """Yields the JSON objects Ollama streams back; each carries the next "response" fragment and the last has "done"."""
+        response = self.post({"model": model or self.model, "prompt": prompt, "stream": True}, stream=True)
+        with response:
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def close(self):
+        self.session.close()
@@ -1,52 +1,62 @@
 import os
 import csv
-import weaviate
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from query_processor import QueryProcessor
+from vector_store import create_vector_store
+
+OUTPUT_HEADER = ["Question", "Answer", "Index"]
 
-class WeaviateManager:
-    def __init__(self):
-        load_dotenv()
-        self.client = self.connect_to_weaviate()
- 
-    def connect_to_weaviate(self):
-        try:
-            print("Connecting to Weaviate...")
-            client = weaviate.connect_to_weaviate_cloud(
-                cluster_url=os.getenv('WEAVIATE_RESTURL'),
-                auth_credentials=weaviate.auth.AuthApiKey(os.getenv('WEAVIATE_ADMIN'))
-            )
-            return client
-        except Exception as e:
-            print(f"Error connecting to Weaviate: {e}")
-            return None
- 
-    def close_connection(self):
-        if self.client:
-            self.client.close()
-            print("Weaviate connection closed.")
- 
 class AnswerGenerator:
     def __init__(self, question_file, output_csv, query_processor):
         self.question_file = question_file
         self.output_csv = output_csv
         self.query_processor = query_processor
+        self.column_count = len(OUTPUT_HEADER)
         self.existing_questions = self.load_existing_questions()
     
     def load_existing_questions(self):
+        """Reads answered questions and keeps the file's layout: a "Question" header is optional and
+        files written without the Index column (question, answer) keep getting two columns."""
         existing_questions = set()
         if os.path.exists(self.output_csv):
             with open(self.output_csv, "r", encoding="utf-8") as csv_file:
-                reader = csv.reader(csv_file)
-                next(reader, None)  
-                existing_questions = {row[0] for row in reader}
+                rows = [row for row in csv.reader(csv_file) if row]
+            if rows:
+                self.column_count = len(rows[0])
+                if rows[0][0].strip().lower() == "question":
+                    rows = rows[1:]
+            existing_questions = {row[0] for row in rows}
         return existing_questions
  
-    def generate_answers(self):
+    def open_output(self):
+        """Opens the CSV for appending, writing a header row only if the file is new."""
+        is_new = not os.path.exists(self.output_csv) or os.path.getsize(self.output_csv) == 0
+        csv_file = open(self.output_csv, "a", newline="", encoding="utf-8")
+        if is_new:
+            self.column_count = len(OUTPUT_HEADER)
+            csv.writer(csv_file).writerow(OUTPUT_HEADER)
+        return csv_file
+    
+    def output_row(self, question, answer, index):
+        return [question, answer, index][:self.column_count]
+ 
+    def load_questions(self):
         with open(self.question_file, "r", encoding="utf-8") as q_file:
-            questions = [line.strip() for line in q_file.readlines() if line.strip()]
+            return [line.strip() for line in q_file.readlines() if line.strip()]
+ 
+    def generate_answers(self, concurrency=1, queue_size=None, batch_size=1):
+        if batch_size > 1:
+            self.generate_answers_batched(batch_size, concurrency)
+            return
+        if concurrency > 1:
+            asyncio.run(self.generate_answers_async(concurrency, queue_size or concurrency * 2))
+            return
+ 
+        questions = self.load_questions()
         
-        with open(self.output_csv, "a", newline="", encoding="utf-8") as csv_file:
+        with self.open_output() as csv_file:
             writer = csv.writer(csv_file)
             for i, question in enumerate(questions, 1):
                 if question in self.existing_questions:
@@ -55,24 +65,116 @@ class AnswerGenerator:
                 print(f"Processing question {i}/{len(questions)}")
                 result = self.query_processor.process_query(question)
                 answer = result.get("response", "No answer generated")
-                writer.writerow([question, answer])
+                writer.writerow(self.output_row(question, answer, i))
+                csv_file.flush()
                 self.existing_questions.add(question)  
         
         print(f"All questions processed. Appended to {self.output_csv}")
  
+    def pending_questions(self, questions):
+        """Returns [(index, question)] for questions not yet in the CSV, skipping repeats."""
+        pending, seen = [], set(self.existing_questions)
+        for i, question in enumerate(questions, 1):
+            if question not in seen:
+                pending.append((i, question))
+                seen.add(question)
+        return pending
+ 
+    def generate_answers_batched(self, batch_size, concurrency):
+        """Answers questions in batches through QueryProcessor.process_queries (one encode and one retrieval per batch)."""
+        questions = self.load_questions()
+        pending = self.pending_questions(questions)
+        print(f"Answering {len(pending)} of {len(questions)} questions in batches of {batch_size}")
+ 
+        with self.open_output() as csv_file:
+            writer = csv.writer(csv_file)
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                results = self.query_processor.process_queries([question for _, question in batch], concurrency=concurrency)
+                for (i, question), result in zip(batch, results):
+                    writer.writerow(self.output_row(question, result.get("response", "No answer generated"), i))
+                    self.existing_questions.add(question)
+                csv_file.flush()
+                print(f"Processed questions up to {batch[-1][0]}/{len(questions)}")
+ 
+        print(f"All questions processed. Appended to {self.output_csv}")
+ 
+    async def generate_answers_async(self, concurrency, queue_size):
+        """Answers up to `concurrency` questions at once and appends rows in completion order.
+        
+        Finished answers wait in a bounded queue for the CSV writer, and a question's
+        concurrency slot is only freed once its answer is queued, so a slow disk
+        throttles new requests instead of buffering answers in memory. If the writer
+        fails, the error is raised and the remaining requests are cancelled.
+        """
+        questions = self.load_questions()
+        pending = self.pending_questions(questions)
+        print(f"Answering {len(pending)} of {len(questions)} questions with concurrency {concurrency}")
+ 
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        completed = asyncio.Queue(maxsize=queue_size)
+ 
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            async def answer(i, question):
+                try:
+                    result = await loop.run_in_executor(executor, self.query_processor.process_query, question)
+                except Exception as e:
+                    print(f"Error answering question {i}: {e}")
+                    result = {}
+                try:
+                    await completed.put((i, question, result.get("response", "No answer generated")))
+                finally:
+                    semaphore.release()
+ 
+            async def write_rows():
+                with self.open_output() as csv_file:
+                    writer = csv.writer(csv_file)
+                    for done in range(1, len(pending) + 1):
+                        i, question, answer = await completed.get()
+                        writer.writerow(self.output_row(question, answer, i))
+                        csv_file.flush()
+                        self.existing_questions.add(question)
+                        print(f"Answered question {i}/{len(questions)} ({done}/{len(pending)} done)")
+ 
+            async def dispatch():
+                tasks = []
+                try:
+                    for i, question in pending:
+                        await semaphore.acquire()
+                        tasks.append(asyncio.create_task(answer(i, question)))
+                    await asyncio.gather(*tasks)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+ 
+            writer_task = asyncio.create_task(write_rows())
+            dispatch_task = asyncio.create_task(dispatch())
+            try:
+                await asyncio.gather(writer_task, dispatch_task)
+            finally:
+                writer_task.cancel()
+                dispatch_task.cancel()
+ 
+        print(f"All questions processed. Appended to {self.output_csv}")
+ 
 class MainApp:
     def __init__(self):
-        self.weaviate_manager = WeaviateManager()
-        self.query_processor = QueryProcessor(self.weaviate_manager.client)
+        load_dotenv()
+        self.vector_store = create_vector_store()
+        self.query_processor = QueryProcessor(vector_store=self.vector_store)
         self.answer_generator = AnswerGenerator("queries.txt", "ques_ans.csv", self.query_processor)
     
     def run(self):
         try:
-            self.answer_generator.generate_answers()
+            self.answer_generator.generate_answers(
+                concurrency=int(os.getenv("ANSWER_CONCURRENCY", 1)),
+                batch_size=int(os.getenv("ANSWER_BATCH_SIZE", 1)),
+            )
         except Exception as e:
             print(f"An error occurred: {e}")
         finally:
-            self.weaviate_manager.close_connection()
+            self.vector_store.close_connection()
  
 if __name__ == "__main__":
     app = MainApp()
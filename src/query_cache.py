@@ -0,0 +1,109 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class QueryCache:
+    """Two-level answer cache: exact match on the normalized query, then optional semantic match.
+
+    The semantic level returns a cached answer when a new query's embedding has
+    cosine similarity of at least semantic_threshold with a cached query's.
+    Entries expire after ttl seconds and the least recently used one is evicted
+    beyond max_size. scope (e.g. a search filter) keeps answers for differently
+    scoped searches apart at both levels.
+    """
+    def __init__(self, max_size=1000, ttl=3600, semantic_threshold=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self._matrix = None
+        self._matrix_keys = []
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query):
+        query = re.sub(r"\s+", " ", query.strip().lower())
+        return query.rstrip("?!. ")
+
+    def _key(self, query, limit, scope=""):
+        return f"{limit}|{scope}|{self.normalize(query)}" if scope else f"{limit}|{self.normalize(query)}"
+
+    def _expired(self, entry):
+        return self.ttl is not None and self.clock() - entry["time"] > self.ttl
+
+    def _remove(self, key):
+        self.entries.pop(key, None)
+        self._matrix = None
+
+    def get_exact(self, query, limit, scope=""):
+        key = self._key(query, limit, scope)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry):
+                self._remove(key)
+                entry = None
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["result"]
+
+    def get_semantic(self, embedding, limit, scope=""):
+        """Returns the cached result of the most similar query above the threshold, or None. Counts a miss otherwise."""
+        with self.lock:
+            if self.semantic_threshold is None or not self.entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix_keys = [key for key, entry in self.entries.items() if entry["embedding"] is not None]
+                self._matrix = np.array([self.entries[key]["embedding"] for key in self._matrix_keys], dtype=np.float32)
+            if not self._matrix_keys:
+                self.misses += 1
+                return None
+
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            scores = self._matrix @ query_vector
+            for i in np.argsort(-scores):
+                if scores[i] < self.semantic_threshold:
+                    break
+                key = self._matrix_keys[i]
+                entry = self.entries.get(key)
+                if entry is None or entry["limit"] != limit or entry["scope"] != scope:
+                    continue
+                if self._expired(entry):
+                    self._remove(key)
+                    break
+                self.entries.move_to_end(key)
+                self.semantic_hits += 1
+                return entry["result"]
+            self.misses += 1
+            return None
+
+    def put(self, query, limit, result, embedding=None, scope=""):
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            embedding = embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+        key = self._key(query, limit, scope)
+        with self.lock:
+            self.entries[key] = {"time": self.clock(), "limit": limit, "scope": scope, "result": result, "embedding": embedding}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self):
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "entries": len(self.entries),
+            "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
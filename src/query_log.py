@@ -0,0 +1,122 @@
+import os
+import json
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+BINARY = getattr(os, "O_BINARY", 0)
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+@contextmanager
+def locked(fd):
+    """Holds an exclusive lock on an open file: flock on POSIX, a lock on its first byte on Windows, none elsewhere."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        position = os.lseek(fd, 0, os.SEEK_CUR)
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue
+        os.lseek(fd, position, os.SEEK_SET)
+        try:
+            yield
+        finally:
+            os.lseek(fd, 0, os.SEEK_SET)
+            msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        yield
+
+class QueryLog:
+    """Append-only JSONL query log that is safe to share between Streamlit sessions.
+
+    Each record is written with a single O_APPEND write under an exclusive file
+    lock, and tail() reads backwards from the end of the file so loading recent
+    history does not parse the whole log. If a crash left the last record without
+    its newline, the next record starts on a fresh line so only the torn one is lost.
+    """
+    def __init__(self, log_file="query_log.jsonl", legacy_file="query_log.json"):
+        self.log_file = log_file
+        self.legacy_file = legacy_file
+
+    def append(self, entry):
+        line = (json.dumps(entry) + "\n").encode("utf-8")
+        fd = os.open(self.log_file, os.O_RDWR | os.O_APPEND | os.O_CREAT | BINARY, 0o644)
+        try:
+            with locked(fd):
+                if os.fstat(fd).st_size > 0:
+                    os.lseek(fd, -1, os.SEEK_END)
+                    if os.read(fd, 1) != b"\n":
+                        line = b"\n" + line
+                write_all(fd, line)
+        finally:
+            os.close(fd)
+
+    def tail(self, n=5, block_size=8192):
+        """Returns the last n records, oldest first, skipping lines that are not valid JSON."""
+        if n <= 0 or not os.path.exists(self.log_file):
+            return []
+        with open(self.log_file, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            data = b""
+            while position > 0 and data.count(b"\n") <= n:
+                read_size = min(block_size, position)
+                position -= read_size
+                f.seek(position)
+                data = f.read(read_size) + data
+
+        records = []
+        for line in reversed(data.splitlines()):
+            if len(records) == n:
+                break
+            try:
+                records.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue
+        records.reverse()
+        return records
+
+    def migrate_legacy(self):
+        """Moves records from the old JSON-array log into the JSONL log once, then renames the old file."""
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return 0
+        try:
+            with open(self.legacy_file, "r") as f:
+                entries = json.load(f)
+        except json.JSONDecodeError:
+            print(f"Legacy log '{self.legacy_file}' is corrupted; leaving it in place.")
+            return 0
+
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        fd = os.open(self.log_file, os.O_RDWR | os.O_CREAT | BINARY, 0o644)
+        try:
+            with locked(fd):
+                if not os.path.exists(self.legacy_file):
+                    return 0
+                existing = os.read(fd, os.fstat(fd).st_size)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                write_all(fd, data + existing)
+                os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        finally:
+            os.close(fd)
+        return len(entries)
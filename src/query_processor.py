@@ -1,50 +1,87 @@
 import requests
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from document_processor import WeaviateManager
 from document_processor import EmbeddingModel
+from vector_store import create_vector_store
+from query_cache import QueryCache
+from ollama_client import OllamaClient
+from metrics import QueryTiming, QUERY_METRICS
+from bm25_index import BM25Index, reciprocal_rank_fusion
+from context_assembly import ContextAssembler
+from chunk_metadata import normalize_filters, filter_key, parse_filter_env
  
 load_dotenv()
+
+NO_CONTEXT = "No relevant documents found."
+NO_DATA_RESPONSE = "No data available."
+NOT_IN_CORPUS_RESPONSE = "The documents do not contain information about this question."
+ 
+def create_query_cache():
+    """Builds the query cache from QUERY_CACHE_* settings; QUERY_CACHE_SIZE=0 disables it."""
+    max_size = int(os.getenv("QUERY_CACHE_SIZE", 1000))
+    if max_size <= 0:
+        return None
+    threshold = os.getenv("SEMANTIC_CACHE_THRESHOLD")
+    return QueryCache(
+        max_size=max_size,
+        ttl=float(os.getenv("QUERY_CACHE_TTL", 3600)),
+        semantic_threshold=float(threshold) if threshold else None,
+    )
+ 
+def create_keyword_index(collection_name):
+    """Loads the BM25 index written at ingest time when HYBRID_SEARCH is on; None otherwise."""
+    if os.getenv("HYBRID_SEARCH", "false").lower() != "true":
+        return None
+    index = BM25Index.load(os.path.join(os.getenv("BM25_INDEX_DIR", "bm25_index"), collection_name))
+    if not len(index):
+        print(f"No BM25 index found for '{collection_name}'; using vector search only.")
+        return None
+    return index
  
 class QueryProcessor:
-    def __init__(self, weaviate_client=None):
-        if weaviate_client:
-            self.client = weaviate_client
-            self.embedding_model = EmbeddingModel()
+    def __init__(self, weaviate_client=None, vector_store=None, query_cache=None, ollama_client=None, embedding_model=None,
+                 keyword_index=None, context_assembler=None):
+        if vector_store is not None:
+            self.vector_store = vector_store
+        elif weaviate_client:
+            self.vector_store = WeaviateManager(client=weaviate_client)
         else:
-            self.weaviate_manager = WeaviateManager()
-            self.client = self.weaviate_manager.client
-            self.embedding_model = EmbeddingModel()
+            self.weaviate_manager = create_vector_store()
+            self.vector_store = self.weaviate_manager
+        self.client = self.vector_store.client
+        self.embedding_model = embedding_model or EmbeddingModel()
+        self.query_cache = query_cache if query_cache is not None else create_query_cache()
+        self.ollama_client = ollama_client or OllamaClient()
             
         self.collection_name = os.getenv("WEAVIATE_COLLECTION", "DocumentChunks")
+        self.keyword_index = keyword_index if keyword_index is not None else create_keyword_index(self.collection_name)
+        self.hybrid_candidates = int(os.getenv("HYBRID_CANDIDATES", 20))
+        self.rrf_k = int(os.getenv("RRF_K", 60))
+        self.context_assembler = context_assembler or ContextAssembler()
+        max_distance = os.getenv("RELEVANCE_MAX_DISTANCE")
+        self.max_distance = float(max_distance) if max_distance else None
+        min_bm25 = os.getenv("RELEVANCE_MIN_BM25")
+        self.min_bm25 = float(min_bm25) if min_bm25 else None
+        self.default_filters = parse_filter_env(os.getenv("SEARCH_FILTER"))
     
  
     
-    def query_ollama(self, prompt, model=os.getenv("OLLAMA_MODEL")):
-        url = os.getenv("OLLAMA_URL")
-        payload = {"model": model, "prompt": prompt, "stream": False}
+    def query_ollama(self, prompt, model=None):
+        return self.call_ollama(prompt, model)[0]
+    
+    def call_ollama(self, prompt, model=None):
+        """Returns (response text, full Ollama JSON) so callers can read token counts; errors come back as text."""
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", f"Error: Unexpected API response format - {result}")
+            result = self.ollama_client.generate(prompt, model)
+            return result.get("response", f"Error: Unexpected API response format - {result}"), result
         except requests.exceptions.RequestException as e:
-            return f"Error: {str(e)}"
+            return f"Error: {str(e)}", {}
     
-    def process_query(self, query, limit=int(os.getenv("LIMIT", 3))):
-        try:
-            query_embedding = self.embedding_model.get_embedding(query)
-            
-            documents_collection = self.client.collections.get(self.collection_name)
-            response = documents_collection.query.near_vector(
-                near_vector=query_embedding, limit=limit
-            )
-            
-            if not response.objects:
-                return {"query": query, "context": "No relevant documents found.", "response": "No data available."}
-            
-            context = "\n\n".join([obj.properties["text"] for obj in response.objects])
-            ollama_prompt = f"""
+    def build_prompt(self, query, context):
+        return f"""
             Answer this question: {query}
             
             Using this context from the document:
@@ -58,8 +95,263 @@ class QueryProcessor:
             Only answer the question given in the prompt. Do not answer question that may be present in the contexts.
             Do not give much lengthy answer, make it more precise.
             """
-            ollama_response = self.query_ollama(ollama_prompt)
-            return {"query": query, "context": context, "response": ollama_response}
+    
+    def candidate_limit(self, limit):
+        """How many vector results to fetch: more than limit when they will be fused with BM25."""
+        return max(limit, self.hybrid_candidates) if self.keyword_index is not None else limit
+    
+    def resolve_filters(self, filters):
+        """Normalized search filters: the ones given, or SEARCH_FILTER when None is passed ({} searches everything)."""
+        return normalize_filters(filters) if filters is not None else self.default_filters
+    
+    def fuse(self, query, vector_results, limit, timing, filters=None):
+        """Reciprocal rank fusion of vector and BM25 results; vector results pass through when hybrid search is off."""
+        if self.keyword_index is None:
+            return vector_results
+        with timing.stage("keyword"):
+            keyword_results = self.keyword_index.search(query, self.candidate_limit(limit), filters)
+            return reciprocal_rank_fusion([vector_results, keyword_results], limit, self.rrf_k)
+    
+    def skip_reason(self, results):
+        """Why generation should be skipped for these results ("no_results", "low_confidence"), or None.
+        
+        With RELEVANCE_MAX_DISTANCE set, at least one result must be that close to the query. Results
+        found only by BM25 carry no distance and count when RELEVANCE_MIN_BM25 is set and reached.
+        """
+        if not results:
+            return "no_results"
+        if self.max_distance is None:
+            return None
+        for result in results:
+            if result.get("distance") is not None and result["distance"] <= self.max_distance:
+                return None
+            if self.min_bm25 is not None and result.get("bm25_score", 0.0) >= self.min_bm25:
+                return None
+        return "low_confidence"
+    
+    def skipped_result(self, query, results, reason, timing):
+        """The fast answer used instead of an LLM generation when retrieval found nothing relevant."""
+        timing.llm_skipped = reason
+        response = NO_DATA_RESPONSE if reason == "no_results" else NOT_IN_CORPUS_RESPONSE
+        return {"query": query, "context": NO_CONTEXT, "response": response, "retrieved": self.retrieval_scores(results)}
+    
+    def retrieval_scores(self, results):
+        """Source and scores of each retrieved chunk, best first."""
+        return [{key: result[key] for key in ("source", "book", "chapter", "page_start", "page_end", "distance", "bm25_score", "rrf_score")
+                 if key in result}
+                for result in results]
+    
+    def should_cache(self, response):
+        """Only real answers are cached: not empty responses and not "Error: ..." texts."""
+        return self.query_cache is not None and bool(response.strip()) and not response.startswith("Error:")
+    
+    def cached_result(self, cached, query, cache_level, timing):
+        timing.llm_skipped = "cache"
+        return self.finish_timing(dict(cached, query=query, cache=cache_level), timing)
+    
+    def finish_timing(self, result, timing):
+        """Stamps the timing onto the result and records it in the process-wide histograms."""
+        timing.finish()
+        QUERY_METRICS.record(timing)
+        return dict(result, timings=timing.to_dict())
+    
+    def process_query(self, query, limit=int(os.getenv("LIMIT", 3)), filters=None):
+        """Answers one query; filters (e.g. {"book": "hess2"}) restrict retrieval to matching chunks."""
+        timing = QueryTiming()
+        try:
+            filters = self.resolve_filters(filters)
+            scope = filter_key(filters)
+            if self.query_cache is not None:
+                cached = self.query_cache.get_exact(query, limit, scope)
+                if cached is not None:
+                    return self.cached_result(cached, query, "exact", timing)
+            
+            with timing.stage("embed"):
+                query_embedding = self.embedding_model.get_embedding(query)
+            
+            if self.query_cache is not None:
+                cached = self.query_cache.get_semantic(query_embedding, limit, scope)
+                if cached is not None:
+                    return self.cached_result(cached, query, "semantic", timing)
+            
+            with timing.stage("search"):
+                results = self.vector_store.query(query_embedding, self.candidate_limit(limit), self.collection_name, filters=filters)
+            results = self.fuse(query, results, limit, timing, filters)
+            return self.finish_timing(self.generate_answer(query, results, limit, query_embedding, timing, filters), timing)
         except Exception as e:
             return {"error": str(e)}
- 
\ No newline at end of file
+    
+    def generate_answer(self, query, results, limit, query_embedding=None, timing=None, filters=None):
+        """Builds the prompt from retrieved results, asks Ollama and caches successful answers.
+        
+        Skips Ollama when skip_reason() finds nothing relevant to answer from.
+        """
+        timing = timing or QueryTiming()
+        reason = self.skip_reason(results)
+        if reason:
+            return self.skipped_result(query, results, reason, timing)
+        
+        with timing.stage("prompt"):
+            context = self.context_assembler.build_context(results)
+            prompt = self.build_prompt(query, context)
+        with timing.stage("generate"):
+            ollama_response, stats = self.call_ollama(prompt)
+        timing.prompt_tokens = stats.get("prompt_eval_count")
+        timing.response_tokens = stats.get("eval_count")
+        result = {"query": query, "context": context, "response": ollama_response, "retrieved": self.retrieval_scores(results)}
+        if self.should_cache(ollama_response):
+            self.query_cache.put(query, limit, result, query_embedding, filter_key(filters))
+        return result
+    
+    def process_queries(self, queries, limit=int(os.getenv("LIMIT", 3)), concurrency=None, filters=None):
+        """Answers a batch of queries: one encode call, one batched retrieval, then concurrent generation.
+        
+        Returns one result dict per query, in input order, shaped like process_query's. The batch
+        embed and search times are split evenly across the queries that took part in them. A query
+        repeated within the batch (after the query cache's normalization) is answered once and its
+        repeats get a copy of that result.
+        """
+        concurrency = concurrency or int(os.getenv("ANSWER_CONCURRENCY", 1))
+        filters = self.resolve_filters(filters)
+        scope = filter_key(filters)
+        results = [None] * len(queries)
+        timings = [QueryTiming() for _ in queries]
+        
+        firsts, repeat_of = {}, {}
+        for i, query in enumerate(queries):
+            first = firsts.setdefault(QueryCache.normalize(query), i)
+            if first != i:
+                repeat_of[i] = first
+        
+        def with_repeats(results):
+            for i, first in repeat_of.items():
+                if "error" in results[first]:
+                    results[i] = dict(results[first])
+                else:
+                    timings[i].llm_skipped = "duplicate"
+                    results[i] = self.finish_timing(dict(results[first], query=queries[i]), timings[i])
+            return results
+        
+        to_embed = []
+        for i, query in enumerate(queries):
+            if i in repeat_of:
+                continue
+            cached = self.query_cache.get_exact(query, limit, scope) if self.query_cache is not None else None
+            if cached is not None:
+                results[i] = self.cached_result(cached, query, "exact", timings[i])
+            else:
+                to_embed.append(i)
+        if not to_embed:
+            return with_repeats(results)
+        
+        try:
+            start_time = time.perf_counter()
+            embeddings = self.embedding_model.embed_batch([queries[i] for i in to_embed])
+            for i in to_embed:
+                timings[i].add("embed", (time.perf_counter() - start_time) / len(to_embed))
+            
+            to_search, search_embeddings = [], []
+            for i, embedding in zip(to_embed, embeddings):
+                cached = self.query_cache.get_semantic(embedding, limit, scope) if self.query_cache is not None else None
+                if cached is not None:
+                    results[i] = self.cached_result(cached, queries[i], "semantic", timings[i])
+                else:
+                    to_search.append(i)
+                    search_embeddings.append(embedding)
+            
+            start_time = time.perf_counter()
+            retrieved = self.vector_store.query_batch(search_embeddings, self.candidate_limit(limit), self.collection_name,
+                                                      filters=filters)
+            for i in to_search:
+                timings[i].add("search", (time.perf_counter() - start_time) / len(to_search))
+            retrieved = [self.fuse(queries[i], docs, limit, timings[i], filters) for i, docs in zip(to_search, retrieved)]
+        except Exception as e:
+            for i in to_embed:
+                if results[i] is None:
+                    results[i] = {"error": str(e)}
+            return with_repeats(results)
+        
+        def answer(item):
+            i, embedding, docs = item
+            try:
+                result = self.generate_answer(queries[i], docs, limit, embedding, timings[i], filters)
+                return i, self.finish_timing(result, timings[i])
+            except Exception as e:
+                return i, {"error": str(e)}
+        
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            for i, result in executor.map(answer, zip(to_search, search_embeddings, retrieved)):
+                results[i] = result
+        return with_repeats(results)
+    
+    def process_query_stream(self, query, limit=int(os.getenv("LIMIT", 3)), filters=None):
+        """Yields {"type": "context"}, then {"type": "token"} events as Ollama generates, then one {"type": "done"}.
+        
+        The done event carries the full response, its stage timings, and time_to_first_token and
+        duration in seconds. Failures are reported as a single {"type": "error"} event.
+        """
+        timing = QueryTiming()
+        try:
+            filters = self.resolve_filters(filters)
+            scope = filter_key(filters)
+            cached, cache_level = None, None
+            if self.query_cache is not None:
+                cached, cache_level = self.query_cache.get_exact(query, limit, scope), "exact"
+            query_embedding = None
+            if cached is None:
+                with timing.stage("embed"):
+                    query_embedding = self.embedding_model.get_embedding(query)
+                if self.query_cache is not None:
+                    cached, cache_level = self.query_cache.get_semantic(query_embedding, limit, scope), "semantic"
+            if cached is not None:
+                yield {"type": "context", "context": cached["context"]}
+                timing.mark_first_token()
+                yield {"type": "token", "token": cached["response"]}
+                timing.llm_skipped = "cache"
+                yield self.stream_done(dict(cached, query=query, cache=cache_level), timing)
+                return
+            
+            with timing.stage("search"):
+                results = self.vector_store.query(query_embedding, self.candidate_limit(limit), self.collection_name, filters=filters)
+            results = self.fuse(query, results, limit, timing, filters)
+            reason = self.skip_reason(results)
+            if reason:
+                result = self.skipped_result(query, results, reason, timing)
+                yield {"type": "context", "context": result["context"]}
+                timing.mark_first_token()
+                yield {"type": "token", "token": result["response"]}
+                yield self.stream_done(result, timing)
+                return
+            
+            with timing.stage("prompt"):
+                context = self.context_assembler.build_context(results)
+                prompt = self.build_prompt(query, context)
+            yield {"type": "context", "context": context}
+            
+            tokens = []
+            generate_start = time.perf_counter()
+            for chunk in self.ollama_client.generate_stream(prompt):
+                if chunk.get("error"):
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                token = chunk.get("response", "")
+                if token:
+                    timing.mark_first_token()
+                    tokens.append(token)
+                    yield {"type": "token", "token": token}
+                if chunk.get("done"):
+                    timing.prompt_tokens = chunk.get("prompt_eval_count")
+                    timing.response_tokens = chunk.get("eval_count")
+                    break
+            timing.add("generate", time.perf_counter() - generate_start)
+            
+            result = {"query": query, "context": context, "response": "".join(tokens), "retrieved": self.retrieval_scores(results)}
+            if self.should_cache(result["response"]):
+                self.query_cache.put(query, limit, result, query_embedding, scope)
+            yield self.stream_done(result, timing)
+        except Exception as e:
+            yield {"type": "error", "error": str(e)}
+    
+    def stream_done(self, result, timing):
+        timing.mark_first_token()
+        result = self.finish_timing(result, timing)
+        return dict(result, type="done", time_to_first_token=timing.time_to_first_token, duration=timing.total)
@@ -0,0 +1,60 @@
+import time
+import threading
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    acquire() blocks until the bucket holds enough tokens. A request larger than
+    the bucket's capacity is let through once the bucket is full and leaves it in
+    debt, so oversized requests are slowed down rather than blocked forever.
+    """
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Takes amount tokens, sleeping until they are available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            self.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Charges (or refunds, if negative) tokens after the fact, e.g. once actual usage is known."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits applied together."""
+    def __init__(self, rpm, tpm=None, clock=time.monotonic, sleep=time.sleep):
+        self.requests = TokenBucket(rpm, clock=clock, sleep=sleep)
+        self.tokens = TokenBucket(tpm, clock=clock, sleep=sleep) if tpm else None
+
+    def acquire(self, tokens=0):
+        waited = self.requests.acquire(1)
+        if self.tokens is not None and tokens:
+            waited += self.tokens.acquire(tokens)
+        return waited
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """Corrects the token bucket once the API reports how many tokens a request really used."""
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.adjust(actual_tokens - estimated_tokens)
@@ -0,0 +1,76 @@
+import os
+import time
+import atexit
+import threading
+from document_processor import EmbeddingModel
+from ollama_client import OllamaClient
+from query_processor import QueryProcessor
+from vector_store import create_vector_store
+from metrics import start_metrics_server
+
+_lock = threading.RLock()
+_resources = {}
+_last_health_check = {"time": 0.0}
+
+def _get_or_create(name, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = factory()
+                _resources[name] = resource
+    return resource
+
+def get_embedding_model():
+    """Process-wide SentenceTransformer wrapper, loaded once."""
+    return _get_or_create("embedding_model", EmbeddingModel)
+
+def get_ollama_client():
+    """Process-wide Ollama client, so its keep-alive connection pool is reused."""
+    return _get_or_create("ollama_client", OllamaClient)
+
+def get_vector_store():
+    """Process-wide vector store, health-checked at most every HEALTH_CHECK_INTERVAL seconds and reconnected if down."""
+    vector_store = _get_or_create("vector_store", create_vector_store)
+    interval = float(os.getenv("HEALTH_CHECK_INTERVAL", 30))
+    now = time.monotonic()
+    if now - _last_health_check["time"] >= interval:
+        with _lock:
+            if now - _last_health_check["time"] >= interval:
+                if not vector_store.is_healthy():
+                    print("Vector store is not healthy, reconnecting...")
+                    vector_store.reconnect()
+                _last_health_check["time"] = now
+    return vector_store
+
+def get_query_processor():
+    """Process-wide QueryProcessor built on the shared resources; its query cache is shared too."""
+    vector_store = get_vector_store()
+    return _get_or_create("query_processor", lambda: QueryProcessor(
+        vector_store=vector_store,
+        embedding_model=get_embedding_model(),
+        ollama_client=get_ollama_client(),
+    ))
+
+def get_metrics_server():
+    """Starts the Prometheus /metrics endpoint on METRICS_HOST once per process when METRICS_PORT is set; returns None otherwise."""
+    port = os.getenv("METRICS_PORT")
+    if not port:
+        return None
+    host = os.getenv("METRICS_HOST", "127.0.0.1")
+    return _get_or_create("metrics_server", lambda: start_metrics_server(int(port), host=host))
+
+@atexit.register
+def close_resources():
+    with _lock:
+        vector_store = _resources.pop("vector_store", None)
+        ollama_client = _resources.pop("ollama_client", None)
+        metrics_server = _resources.pop("metrics_server", None)
+        _resources.clear()
+    if vector_store is not None:
+        vector_store.close_connection()
+    if ollama_client is not None:
+        ollama_client.close()
+    if metrics_server is not None:
+        metrics_server.shutdown()
@@ -0,0 +1,10 @@
+class FakeClock:
+    """Manual clock for code that takes clock= (and sleep=) callables; sleeping just advances it."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
@@ -0,0 +1,44 @@
+import unittest
+from query_cache import QueryCache
+from helpers import FakeClock
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = QueryCache(max_size=2, ttl=60, semantic_threshold=0.9, clock=self.clock)
+        self.result = {"query": "q", "context": "c", "response": "r"}
+
+    def test_exact_hit_ignores_case_whitespace_and_punctuation(self):
+        """Test that normalized variants of a query share one cache entry."""
+        self.cache.put("Who discovered the sea route to India?", 3, self.result)
+        self.assertEqual(self.cache.get_exact("  who discovered  the sea route to india ", 3), self.result)
+        self.assertIsNone(self.cache.get_exact("Who discovered the sea route to India?", 5))
+
+    def test_semantic_hit_above_threshold(self):
+        """Test that a close embedding returns the cached answer and a distant one does not."""
+        self.cache.put("first question", 3, self.result, embedding=[1.0, 0.0])
+        self.assertEqual(self.cache.get_semantic([0.99, 0.05], 3), self.result)
+        self.assertIsNone(self.cache.get_semantic([0.0, 1.0], 3))
+        stats = self.cache.stats()
+        self.assertEqual((stats["semantic_hits"], stats["misses"]), (1, 1))
+
+    def test_ttl_expiry(self):
+        """Test that entries older than the TTL are not returned."""
+        self.cache.put("question", 3, self.result, embedding=[1.0, 0.0])
+        self.clock.now = 61
+        self.assertIsNone(self.cache.get_exact("question", 3))
+        self.assertIsNone(self.cache.get_semantic([1.0, 0.0], 3))
+
+    def test_max_size_evicts_least_recently_used(self):
+        """Test that the oldest unused entry is evicted when the cache is full."""
+        self.cache.put("a", 3, {"response": "a"})
+        self.cache.put("b", 3, {"response": "b"})
+        self.cache.get_exact("a", 3)
+        self.cache.put("c", 3, {"response": "c"})
+        self.assertIsNone(self.cache.get_exact("b", 3))
+        self.assertIsNotNone(self.cache.get_exact("a", 3))
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
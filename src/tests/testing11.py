@@ -0,0 +1,72 @@
+import json
+import threading
+import unittest
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from ollama_client import OllamaClient
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Answers with the queued status codes, then 200 with a fixed response."""
+    statuses = []
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status = self.statuses.pop(0) if self.statuses else 200
+        if status != 200:
+            body = b""
+        elif payload["stream"]:
+            parts = [{"response": "Vasco", "done": False}, {"response": " da Gama", "done": False}, {"response": "", "done": True}]
+            body = "\n".join(json.dumps(part) for part in parts).encode()
+        else:
+            body = json.dumps({"response": "Vasco da Gama"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestOllamaClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/api/generate"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def make_client(self, max_retries=2):
+        return OllamaClient(url=self.url, model="llama3", max_retries=max_retries, backoff=0.001)
+
+    def test_retries_server_errors(self):
+        """Test that 5xx responses are retried until the request succeeds."""
+        FakeOllamaHandler.statuses = [503, 500]
+        client = self.make_client()
+        self.assertEqual(client.generate("Who reached India in 1498?")["response"], "Vasco da Gama")
+        self.assertEqual(len(client.latencies), 1)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the last server error is raised once retries are exhausted."""
+        FakeOllamaHandler.statuses = [503, 503]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.make_client(max_retries=1).generate("prompt")
+
+    def test_generate_stream_yields_fragments(self):
+        """Test that streamed generations arrive as separate JSON fragments ending with done."""
+        chunks = list(self.make_client().generate_stream("Who reached India in 1498?"))
+        self.assertEqual("".join(chunk["response"] for chunk in chunks), "Vasco da Gama")
+        self.assertTrue(chunks[-1]["done"])
+
+    def test_client_errors_are_not_retried(self):
+        """Test that a 4xx response fails immediately."""
+        FakeOllamaHandler.statuses = [404, 200]
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.make_client().generate("prompt")
+        FakeOllamaHandler.statuses = []
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from query_log import QueryLog
+
+class TestQueryLog(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.directory, "query_log.jsonl")
+        self.legacy_file = os.path.join(self.directory, "query_log.json")
+        self.query_log = QueryLog(self.log_file, self.legacy_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_tail_returns_last_records_in_order(self):
+        """Test that tail returns only the newest records, oldest first, across read blocks."""
+        for i in range(50):
+            self.query_log.append({"query": f"question {i}", "result": "x" * 300})
+        records = self.query_log.tail(3, block_size=256)
+        self.assertEqual([r["query"] for r in records], ["question 47", "question 48", "question 49"])
+
+    def test_tail_skips_torn_lines(self):
+        """Test that a partially written trailing line does not break loading history."""
+        self.query_log.append({"query": "complete"})
+        with open(self.log_file, "a") as f:
+            f.write('{"query": "torn')
+        self.assertEqual([r["query"] for r in self.query_log.tail(5)], ["complete"])
+
+    def test_append_after_torn_line_starts_a_new_line(self):
+        """Test that a record appended after a crash-torn line is not glued onto it."""
+        self.query_log.append({"query": "complete"})
+        with open(self.log_file, "a") as f:
+            f.write('{"query": "torn')
+        self.query_log.append({"query": "after crash"})
+        self.assertEqual([r["query"] for r in self.query_log.tail(5)], ["complete", "after crash"])
+
+    def test_append_without_fcntl(self):
+        """Test that appending works on platforms without fcntl or msvcrt."""
+        with mock.patch("query_log.fcntl", None), mock.patch("query_log.msvcrt", None):
+            self.query_log.append({"query": "portable"})
+        self.assertEqual(self.query_log.tail(1), [{"query": "portable"}])
+
+    def test_concurrent_appends_are_not_interleaved(self):
+        """Test that parallel writers each produce one intact line."""
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: self.query_log.append({"query": str(i), "result": "y" * 5000}), range(200)))
+        with open(self.log_file) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(sorted(int(r["query"]) for r in lines), list(range(200)))
+
+    def test_migrate_legacy_json(self):
+        """Test that the old JSON-array log is moved ahead of newer JSONL records exactly once."""
+        with open(self.legacy_file, "w") as f:
+            json.dump([{"query": "old 1"}, {"query": "old 2"}], f)
+        self.query_log.append({"query": "new"})
+
+        self.assertEqual(self.query_log.migrate_legacy(), 2)
+        self.assertEqual(self.query_log.migrate_legacy(), 0)
+        self.assertEqual([r["query"] for r in self.query_log.tail(10)], ["old 1", "old 2", "new"])
+        self.assertFalse(os.path.exists(self.legacy_file))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import urllib.request
+from metrics import QueryTiming, QueryMetrics, start_metrics_server
+
+class TestQueryMetrics(unittest.TestCase):
+
+    def make_timing(self, embed, generate, prompt_tokens=10, response_tokens=5):
+        timing = QueryTiming()
+        timing.add("embed", embed)
+        timing.add("generate", generate)
+        timing.prompt_tokens = prompt_tokens
+        timing.response_tokens = response_tokens
+        return timing.finish()
+
+    def test_stage_accumulates_time(self):
+        """Test that repeated stage blocks with the same name add up."""
+        timing = QueryTiming()
+        with timing.stage("search"):
+            pass
+        first = timing.stages["search"]
+        with timing.stage("search"):
+            pass
+        self.assertGreaterEqual(timing.stages["search"], first)
+        self.assertEqual(set(timing.finish().to_dict()["stages"]), {"search"})
+
+    def test_percentiles_and_token_totals(self):
+        """Test that recorded timings produce per-stage percentiles and summed token counts."""
+        metrics = QueryMetrics()
+        for i in range(1, 101):
+            metrics.record(self.make_timing(i / 1000, i / 100))
+        summary = metrics.summary()
+        self.assertEqual(summary["embed"]["count"], 100)
+        self.assertAlmostEqual(summary["embed"][50], 0.0505, places=4)
+        self.assertAlmostEqual(summary["generate"][99], 0.9901, places=4)
+        self.assertEqual(metrics.tokens, {"prompt": 1000, "response": 500})
+
+    def test_prometheus_endpoint(self):
+        """Test that the metrics server exposes the stage summaries in Prometheus text format."""
+        metrics = QueryMetrics()
+        metrics.record(self.make_timing(0.01, 0.5))
+        server = start_metrics_server(0, metrics)
+        self.assertEqual(server.server_address[0], "127.0.0.1")
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            body = urllib.request.urlopen(url, timeout=5).read().decode("utf-8")
+        finally:
+            server.shutdown()
+        self.assertIn('rag_query_stage_seconds_count{stage="generate"} 1', body)
+        self.assertIn('rag_tokens_total{kind="prompt"} 10', body)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import random
+import tempfile
+import unittest
+import importlib.util
+from nltk.translate.bleu_score import sentence_bleu, SmoothingFunction
+from rouge_score import rouge_scorer
+from non_llm_evaluation_metrics import BatchScorer, BertScoreStage, score_samples
+
+WORDS = ["the", "king", "kings", "ruled", "ruling", "empire", "Mughal", "trade", "traders", "river",
+         "Indus", "cities", "was", "were", "built", "and", "of", "in", "1857", "revolt", "peasants"]
+
+def reference_scores(references, candidate):
+    bleu = sentence_bleu([ref.split() for ref in references], candidate.split(), weights=(0.5, 0.5, 0, 0),
+                         smoothing_function=SmoothingFunction().method1) * 100
+    scorer = rouge_scorer.RougeScorer(['rouge1', 'rouge2', 'rougeL'], use_stemmer=True)
+    scores = [scorer.score(ref, candidate) for ref in references]
+    rouge = {
+        "ROUGE-1": max(s['rouge1'].fmeasure * 100 for s in scores),
+        "ROUGE-2": max(s['rouge2'].fmeasure * 100 for s in scores),
+        "ROUGE-L": max(s['rougeL'].fmeasure * 100 for s in scores),
+    }
+    return bleu, rouge
+
+class TestBatchScorer(unittest.TestCase):
+
+    def setUp(self):
+        rng = random.Random(7)
+        sentence = lambda low, high: " ".join(rng.choice(WORDS) + rng.choice(["", ",", "."]) for _ in range(rng.randint(low, high)))
+        self.samples = [([sentence(3, 40) for _ in range(rng.randint(1, 4))], sentence(1, 30)) for _ in range(200)]
+        self.samples += [
+            (["the king ruled"], ""),
+            (["the king ruled"], "peasants"),
+            (["a b c d e f g"], "a"),
+            (["", "the king"], "the king ruled the empire"),
+            (["Mughal traders, river!"], "Mughal traders river"),
+        ]
+
+    def test_matches_nltk_and_rouge_score(self):
+        """Test that batch BLEU and ROUGE equal nltk's sentence_bleu and rouge_score's RougeScorer exactly."""
+        scorer = BatchScorer()
+        for references, candidate in self.samples:
+            bleu, rouge = reference_scores(references, candidate)
+            self.assertEqual(scorer.bleu(references, candidate), bleu, (references, candidate))
+            self.assertEqual(scorer.rouge(references, candidate), rouge, (references, candidate))
+
+    def test_process_pool_preserves_order(self):
+        """Test that scoring across worker processes returns the same rows in the same order as in-process scoring."""
+        self.assertEqual(score_samples(self.samples, workers=3), BatchScorer().score_rows(self.samples))
+
+class FakeBERTScorer:
+    """Scores a pair by word overlap so the flattening logic can be tested without loading a model."""
+    def __init__(self):
+        self.calls = []
+
+    def score(self, cands, refs, batch_size=64):
+        self.calls.append(len(cands))
+        f1 = [len(set(c.split()) & set(r.split())) / 10 for c, r in zip(cands, refs)]
+        return f1, f1, FakeTensor(f1)
+
+class FakeTensor(list):
+    def tolist(self):
+        return list(self)
+
+class TestBertScoreStage(unittest.TestCase):
+
+    def test_one_flattened_call_with_max_per_row(self):
+        """Test that all rows are scored in a single call and each row keeps its best reference."""
+        stage = BertScoreStage(cache_path="")
+        stage._scorer = FakeBERTScorer()
+        samples = [(["a b", "a b c d"], "a b c"), (["x"], "y"), (["p q", "p"], "p q")]
+        scores = stage.score_rows(samples)
+        self.assertEqual(stage._scorer.calls, [5])
+        self.assertEqual(scores, [30.0, 0.0, 20.0])
+
+def tiny_bert(path):
+    """Saves a randomly initialised two-layer BERT and its tokenizer to path, so bert_score runs offline."""
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizer
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + sorted({word.lower() for word in WORDS})
+    vocab_file = os.path.join(path, "vocab.txt")
+    with open(vocab_file, "w") as f:
+        f.write("\n".join(vocab) + "\n")
+    BertTokenizer(vocab_file, model_max_length=512).save_pretrained(path)
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=len(vocab), hidden_size=16, num_hidden_layers=2, num_attention_heads=2, intermediate_size=32)
+    BertModel(config).save_pretrained(path)
+
+@unittest.skipUnless(importlib.util.find_spec("bert_score"), "bert_score is not installed")
+class TestBertScoreCache(unittest.TestCase):
+
+    def test_cached_path_matches_bert_scorer(self):
+        """Test that the cached path gives BERTScorer.score's F1, on both a cold and a warm cache."""
+        from bert_score import BERTScorer
+        candidates = ["the king ruled", "the river", "Mughal trade and cities of the empire", "peasants"]
+        references = ["the king ruled the empire", "cities were built in the river", "the revolt of peasants", "peasants"]
+        with tempfile.TemporaryDirectory() as path:
+            tiny_bert(path)
+            _, _, expected = BERTScorer(model_type=path, num_layers=2).score(candidates, references)
+            cache_path = os.path.join(path, "bertscore.pt")
+            for _ in range(2):
+                stage = BertScoreStage(model_type=path, num_layers=2, cache_path=cache_path)
+                for value, reference in zip(stage.score_pairs_cached(candidates, references), expected.tolist()):
+                    self.assertAlmostEqual(value, reference, places=5)
+            self.assertEqual(len(stage.cache), len(set(references)))
+
+if __name__ == "__main__":
+    unittest.main()
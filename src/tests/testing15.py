@@ -0,0 +1,150 @@
+import os
+import re
+import json
+import time
+import random
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from rate_limiter import TokenBucket, RateLimiter
+from llm_evaluation_metrics import EvaluationScheduler, GeminiEvaluator, ResultManager, EMPTY_SCORES
+from helpers import FakeClock
+
+class StubResponse:
+    def __init__(self, text, total_token_count):
+        self.text = text
+        self.usage_metadata = type("UsageMetadata", (), {"total_token_count": total_token_count})()
+
+class StubAPIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"{code} stub API error")
+        self.code = code
+
+class StubGeminiModel:
+    """Offline stand-in for genai.GenerativeModel.
+
+    Returns well-formed random scores after latency seconds (a JSON array for batched
+    prompts), fails with a 429 with probability failure_rate, and answers a batched
+    prompt with a truncated array with probability malformed_rate, so the scheduler
+    can be exercised without an API key.
+    """
+    def __init__(self, latency=0.05, failure_rate=0.0, malformed_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.random.random() < self.failure_rate:
+            raise StubAPIError(429)
+        items = len(re.findall(r"^\s*### Item \d+", prompt, flags=re.MULTILINE))
+        random_scores = lambda: {name: round(self.random.random(), 2) for name in EMPTY_SCORES}
+        if items:
+            scores = [dict(random_scores(), id=i) for i in range(1, items + 1)]
+            if self.random.random() < self.malformed_rate:
+                scores = scores[:-1]
+        else:
+            scores = random_scores()
+        return StubResponse(f"```json\n{json.dumps(scores)}\n```", len(prompt) // 4 + 30 * max(items, 1))
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_requests_are_paced_at_the_configured_rate(self):
+        """Test that after the initial burst, acquisitions are spaced at 60 / rpm seconds."""
+        clock = FakeClock()
+        bucket = TokenBucket(60, capacity=5, clock=clock, sleep=clock.sleep)
+        for _ in range(5):
+            bucket.acquire()
+        self.assertEqual(clock.now, 0.0)
+        for _ in range(10):
+            bucket.acquire()
+        self.assertAlmostEqual(clock.now, 10.0)
+
+    def test_oversized_request_goes_into_debt(self):
+        """Test that a request larger than the capacity is allowed once and delays the next one."""
+        clock = FakeClock()
+        limiter = RateLimiter(rpm=600, tpm=6000, clock=clock, sleep=clock.sleep)
+        limiter.acquire(tokens=3000)
+        self.assertEqual(clock.now, 0.0)
+        limiter.acquire(tokens=100)
+        self.assertGreaterEqual(clock.now, 20.0)
+
+class TestEvaluationScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.result_file = os.path.join(self.directory, "results.csv")
+        self.rows = [{"Index": i, "Question": f"q{i}", "Generated Answer": f"answer {i}",
+                      "Ground Truth": f"truth {i}", "Contexts": ["context"]} for i in range(23)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_scheduler(self, model, batch_size=1):
+        return EvaluationScheduler(GeminiEvaluator(model), ResultManager(self.result_file), rpm=60000, tpm=10 ** 9,
+                                   concurrency=4, max_retries=8, backoff=0.001, checkpoint_every=5, batch_size=batch_size)
+
+    def test_all_rows_checkpointed_despite_rate_limit_errors(self):
+        """Test that 429s are retried and every row ends up in the results file exactly once."""
+        model = StubGeminiModel(latency=0.001, failure_rate=0.3, seed=3)
+        scheduler = self.make_scheduler(model)
+        self.assertEqual(scheduler.run(self.rows), 23)
+        self.assertGreater(scheduler.retries, 0)
+        saved = pd.read_csv(self.result_file)
+        self.assertEqual(sorted(saved["Generated Answer"]), sorted(row["Generated Answer"] for row in self.rows))
+        self.assertEqual(ResultManager(self.result_file).processed_questions, {row["Generated Answer"] for row in self.rows})
+
+    def test_non_retryable_error_is_not_retried(self):
+        """Test that a 400-style error scores the row as zeros without retrying."""
+        class BadRequestModel:
+            def generate_content(self, prompt):
+                raise StubAPIError(400)
+        scheduler = self.make_scheduler(BadRequestModel())
+        scheduler.run(self.rows[:2])
+        self.assertEqual(scheduler.api_calls, 2)
+        self.assertEqual(scheduler.retries, 0)
+        self.assertTrue((pd.read_csv(self.result_file)["Faithfulness"] == 0).all())
+
+    def test_batched_judging_cuts_api_calls(self):
+        """Test that K rows share one prompt."""
+        scheduler = self.make_scheduler(StubGeminiModel(latency=0.001, seed=5), batch_size=8)
+        self.assertEqual(scheduler.run(self.rows), 23)
+        self.assertEqual(scheduler.api_calls, 3)
+        self.assertEqual(len(pd.read_csv(self.result_file)), 23)
+
+    def test_malformed_batches_fall_back_to_single_rows(self):
+        """Test that a batch whose reply is not a valid array is re-judged one row at a time."""
+        scheduler = self.make_scheduler(StubGeminiModel(latency=0.001, malformed_rate=1.0, seed=5), batch_size=8)
+        self.assertEqual(scheduler.run(self.rows), 23)
+        self.assertEqual(scheduler.fallbacks, 3)
+        self.assertEqual(scheduler.api_calls, 3 + 23)
+        self.assertEqual(len(pd.read_csv(self.result_file)), 23)
+
+class TestCleanJsonResponse(unittest.TestCase):
+
+    def test_array_is_reordered_by_id(self):
+        """Test that a fenced JSON array is parsed and placed in item order by id."""
+        text = '```json\n[{"id": 2, "Faithfulness": 1, "Precision": 0.5, "Recall": 0, "Relevancy": 0.2},' \
+               ' {"id": 1, "Faithfulness": 0.1, "Precision": 0.2, "Recall": 0.3, "Relevancy": 0.4}]\n```'
+        scores = GeminiEvaluator.clean_json_response(text, expected_count=2)
+        self.assertEqual(scores[0]["Relevancy"], 0.4)
+        self.assertEqual(scores[1]["Faithfulness"], 1.0)
+
+    def test_invalid_arrays_are_rejected(self):
+        """Test that wrong lengths, missing metrics, out-of-range scores and duplicate ids return None."""
+        row = {"Faithfulness": 0.1, "Precision": 0.2, "Recall": 0.3, "Relevancy": 0.4}
+        for text in ["not json", '{"Faithfulness": 1}', json.dumps([row]),
+                     json.dumps([row, {"Faithfulness": 0.5}]), json.dumps([row, dict(row, Recall=3)]),
+                     json.dumps([dict(row, id=1), dict(row, id=1)])]:
+            self.assertIsNone(GeminiEvaluator.clean_json_response(text, expected_count=2), text)
+
+    def test_single_object_behaviour_is_unchanged(self):
+        """Test that without expected_count a bad reply still scores zeros."""
+        self.assertEqual(GeminiEvaluator.clean_json_response("oops")["Recall"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
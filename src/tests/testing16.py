@@ -0,0 +1,117 @@
+import os
+import math
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+from ingest_manifest import IngestManifest
+from main import BackendRunner
+from vector_store import LocalVectorStore
+
+DOCS = [
+    {"uuid": "a", "text": "Vasco da Gama reached Calicut in 1498 after sailing around Africa.", "source": "book1.pdf"},
+    {"uuid": "b", "text": "Portuguese traders came by sea to the Malabar coast for spices.", "source": "book1.pdf"},
+    {"uuid": "c", "text": "Akbar ruled the Mughal empire and introduced the mansabdari system.", "source": "book2.pdf"},
+    {"uuid": "d", "text": "Gama returned to Portugal. Gama was honoured by the king.", "source": "book2.pdf"},
+    {"uuid": "e", "text": "The revolt of 1857 began at Meerut.", "source": "book3.pdf"},
+]
+
+def brute_force_bm25(docs, query, k1=1.5, b=0.75):
+    tokens = [tokenize(doc["text"]) for doc in docs]
+    average_length = sum(map(len, tokens)) / len(tokens)
+    scores = []
+    for doc_tokens in tokens:
+        score = 0.0
+        for term in set(tokenize(query)):
+            df = sum(term in t for t in tokens)
+            tf = doc_tokens.count(term)
+            if df and tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc_tokens) / average_length))
+        scores.append(score)
+    return scores
+
+class TestBM25Index(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_scores_match_reference_formula(self):
+        """Test that CSR-array scoring equals a straightforward Okapi BM25 implementation."""
+        index = BM25Index().build(DOCS)
+        for query in ["When did Vasco da Gama reach Calicut?", "1498", "Mughal empire of Akbar", "spices sea"]:
+            expected = brute_force_bm25(DOCS, query)
+            for result in index.search(query, limit=len(DOCS)):
+                position = next(i for i, doc in enumerate(DOCS) if doc["uuid"] == result["uuid"])
+                self.assertAlmostEqual(result["bm25_score"], expected[position], places=4)
+
+    def test_exact_year_match_ranks_first(self):
+        """Test that a year in the query finds the chunk containing it."""
+        self.assertEqual(BM25Index().build(DOCS).search("What happened in 1857?", 1)[0]["uuid"], "e")
+
+    def test_update_and_reload(self):
+        """Test that updates replace and remove docs and the saved index reloads identically."""
+        index = BM25Index().build(DOCS)
+        index.update([{"uuid": "b", "text": "Calicut pepper", "source": "book1.pdf"}], removed_uuids=["e"])
+        index.save(self.directory)
+        loaded = BM25Index.load(self.directory)
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(loaded.search("1857", 3), [])
+        self.assertEqual([r["uuid"] for r in loaded.search("pepper", 3)], ["b"])
+        self.assertEqual(loaded.search("Gama Calicut", 3), index.search("Gama Calicut", 3))
+
+    def test_incremental_run_without_index_leaves_it_absent(self):
+        """Test that an incremental ingest into a remote store does not save an index over only the new chunks."""
+        runner = BackendRunner.__new__(BackendRunner)
+        runner.collection_name, runner.vector_store = "Docs", object()
+        with mock.patch.dict(os.environ, {"BM25_INDEX_DIR": self.directory}):
+            self.assertIsNone(runner.update_keyword_index(DOCS[:2], [], full_ingest=False))
+            self.assertEqual(len(BM25Index.load(os.path.join(self.directory, "Docs"))), 0)
+            self.assertEqual(len(runner.update_keyword_index(DOCS, [], full_ingest=True)), 5)
+            self.assertEqual(len(runner.update_keyword_index(DOCS[:1], ["e"], full_ingest=False)), 4)
+
+    def ingest(self, index_dir):
+        """Runs a full ingest of two chunks and returns the new_chunks list it handed to iter_file_chunks."""
+        pdf_dir = os.path.join(self.directory, "pdfs")
+        os.makedirs(pdf_dir, exist_ok=True)
+        with open(os.path.join(pdf_dir, "book1.pdf"), "wb") as f:
+            f.write(b"%PDF")
+        pdf_processor = mock.Mock()
+        pdf_processor.list_pdfs.return_value = ["book1.pdf"]
+        pdf_processor.iter_files.return_value = iter([("book1.pdf", [dict(doc) for doc in DOCS[:2]])])
+        pipeline = mock.Mock()
+        pipeline.run.side_effect = lambda chunks: sum(1 for _ in chunks)
+
+        runner = BackendRunner.__new__(BackendRunner)
+        runner.pdf_directory, runner.collection_name, runner.incremental = pdf_dir, "Docs", False
+        runner.manifest = IngestManifest(os.path.join(self.directory, "manifest.json"))
+        runner.vector_store = LocalVectorStore(os.path.join(self.directory, "store"))
+        runner.embedding_model = mock.Mock(cache=None)
+        with mock.patch.dict(os.environ, {"BM25_INDEX_DIR": index_dir}), \
+             mock.patch("main.PDFProcessor", return_value=pdf_processor), \
+             mock.patch("main.StreamingIngestPipeline", return_value=pipeline), \
+             mock.patch.object(runner, "iter_file_chunks", wraps=runner.iter_file_chunks) as iter_file_chunks:
+            runner.run()
+        return iter_file_chunks.call_args.args[4]
+
+    def test_chunks_are_only_kept_for_an_enabled_index(self):
+        """Test that a full ingest keeps chunk dicts for the BM25 build only when BM25_INDEX_DIR is set."""
+        self.assertIsNone(self.ingest(""))
+        index_dir = os.path.join(self.directory, "bm25")
+        self.assertEqual(len(self.ingest(index_dir)), 2)
+        self.assertEqual(len(BM25Index.load(os.path.join(index_dir, "Docs"))), 2)
+
+    def test_reciprocal_rank_fusion(self):
+        """Test that documents found by both retrievers outrank those found by one."""
+        vector = [{"uuid": "x", "distance": 0.2}, {"uuid": "y", "distance": 0.3}, {"uuid": "z", "distance": 0.4}]
+        keyword = [{"uuid": "z"}, {"uuid": "w"}]
+        fused = reciprocal_rank_fusion([vector, keyword], limit=3)
+        self.assertEqual([r["uuid"] for r in fused], ["z", "x", "y"])
+        self.assertEqual(fused[0]["distance"], 0.4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from context_assembly import ContextAssembler, estimate_tokens, overlap_length
+
+PAGE = ("The Portuguese reached the Malabar coast in 1498. Vasco da Gama landed at Calicut and met the Zamorin. "
+        "Spices such as pepper and cinnamon were the main attraction for European traders. "
+        "Within a few decades the Portuguese had set up forts at Goa, Daman and Diu.")
+
+def chunk(text, source="hess2.pdf"):
+    return {"text": text, "source": source}
+
+class TestContextAssembler(unittest.TestCase):
+
+    def test_overlap_length_finds_shared_boundary(self):
+        """Test that the longest suffix/prefix overlap is found and short overlaps are ignored."""
+        self.assertEqual(overlap_length("abc the shared part", "the shared part and more", 5, 400), len("the shared part"))
+        self.assertEqual(overlap_length("abc xyz", "xyz def", 5, 400), 0)
+
+    def test_adjacent_chunks_are_stitched(self):
+        """Test that splitter neighbours sharing an overlap become one passage without the repeat."""
+        first, second = PAGE[:160], PAGE[110:]
+        assembler = ContextAssembler(token_budget=0)
+        self.assertEqual(assembler.build_context([chunk(second), chunk(first)]), PAGE)
+
+    def test_contained_and_cross_source_chunks(self):
+        """Test that a chunk inside another is dropped but overlapping text from another source is kept."""
+        assembler = ContextAssembler(token_budget=0)
+        passages = assembler.merge_overlapping([chunk(PAGE), chunk(PAGE[20:90]), chunk(PAGE[110:], "other.pdf")])
+        self.assertEqual([passage["text"] for passage in passages], [PAGE, PAGE[110:]])
+
+    def test_near_duplicates_are_dropped(self):
+        """Test that a passage nearly identical to a better-ranked one is removed and distinct ones are kept."""
+        duplicate = PAGE.replace("1498", "1498 CE")
+        other = "Akbar introduced the mansabdari system to rank his nobles and officers."
+        assembler = ContextAssembler(token_budget=0)
+        context = assembler.build_context([chunk(PAGE, "a.pdf"), chunk(duplicate, "b.pdf"), chunk(other, "c.pdf")])
+        self.assertEqual(context, PAGE + "\n\n" + other)
+
+    def test_mmr_promotes_novel_passages(self):
+        """Test that with a low lambda a similar passage is ordered after a novel one."""
+        similar = PAGE[:150] + " Goa later became the capital of Portuguese India."
+        other = "Akbar introduced the mansabdari system to rank his nobles and officers."
+        texts = [chunk(PAGE, "a.pdf"), chunk(similar, "b.pdf"), chunk(other, "c.pdf")]
+        self.assertEqual(ContextAssembler(token_budget=0, mmr_lambda=1.0).build_context(texts).split("\n\n")[2], other)
+        self.assertEqual(ContextAssembler(token_budget=0, mmr_lambda=0.3).build_context(texts).split("\n\n")[1], other)
+
+    def test_budget_packs_and_truncates(self):
+        """Test that packing stays within the token budget and an oversized top passage is cut at a sentence."""
+        texts = [chunk(f"Passage {i}. " + "word " * 40, f"{i}.pdf") for i in range(10)]
+        context = ContextAssembler(token_budget=200, dedup_threshold=1.1).build_context(texts)
+        self.assertLessEqual(sum(estimate_tokens(part) for part in context.split("\n\n")), 200)
+        self.assertTrue(context.startswith("Passage 0."))
+        truncated = ContextAssembler(token_budget=30).build_context([chunk(PAGE)])
+        self.assertLessEqual(estimate_tokens(truncated), 30)
+        self.assertTrue(truncated.endswith("Zamorin."))
+
+if __name__ == "__main__":
+    unittest.main()
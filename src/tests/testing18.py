@@ -0,0 +1,130 @@
+import os
+import unittest
+from unittest import mock
+from metrics import QueryMetrics
+from query_cache import QueryCache
+from query_processor import QueryProcessor, NOT_IN_CORPUS_RESPONSE
+
+class FakeEmbeddingModel:
+    def __init__(self):
+        self.batches = []
+
+    def get_embedding(self, text):
+        return [1.0, 0.0]
+
+    def embed_batch(self, texts, batch_size=64):
+        self.batches.append(list(texts))
+        return [self.get_embedding(text) for text in texts]
+
+class FakeVectorStore:
+    client = None
+
+    def __init__(self, results):
+        self.results = results
+
+    def query(self, vector, limit, collection_name, filters=None):
+        return self.results[:limit]
+
+    def query_batch(self, vectors, limit, collection_name, filters=None):
+        if self.results is None:
+            raise ConnectionError("store is down")
+        return [self.query(vector, limit, collection_name, filters) for vector in vectors]
+
+class FakeOllama:
+    def __init__(self):
+        self.calls = 0
+        self.response = "Calicut."
+
+    def generate(self, prompt, model=None):
+        self.calls += 1
+        return {"response": self.response, "prompt_eval_count": 40, "eval_count": 3}
+
+    def generate_stream(self, prompt, model=None):
+        self.calls += 1
+        yield {"response": self.response, "done": True}
+
+def make_processor(results, max_distance="0.5", min_bm25=""):
+    ollama = FakeOllama()
+    with mock.patch.dict(os.environ, {"RELEVANCE_MAX_DISTANCE": max_distance, "RELEVANCE_MIN_BM25": min_bm25}):
+        processor = QueryProcessor(vector_store=FakeVectorStore(results), query_cache=QueryCache(max_size=10),
+                                   ollama_client=ollama, embedding_model=FakeEmbeddingModel())
+    return processor, ollama
+
+class TestRelevanceGating(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = QueryMetrics()
+        patcher = mock.patch("query_processor.QUERY_METRICS", self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_close_results_reach_the_llm(self):
+        """Test that a result within the distance threshold is answered by the LLM with its scores attached."""
+        processor, ollama = make_processor([{"uuid": "a", "text": "Gama reached Calicut.", "source": "hess2.pdf", "distance": 0.3}])
+        result = processor.process_query("Where did Gama land?", limit=3)
+        self.assertEqual(result["response"], "Calicut.")
+        self.assertEqual(result["retrieved"], [{"source": "hess2.pdf", "distance": 0.3}])
+        self.assertEqual(ollama.calls, 1)
+        self.assertEqual(self.metrics.llm_call_counts(), {"made": 1, "avoided": {}})
+
+    def test_distant_results_skip_the_llm(self):
+        """Test that results beyond the threshold return the not-in-corpus answer without calling Ollama or caching."""
+        processor, ollama = make_processor([{"uuid": "a", "text": "Akbar.", "source": "hess2.pdf", "distance": 0.8}])
+        for _ in range(2):
+            result = processor.process_query("Who won the 2010 World Cup?", limit=3)
+        self.assertEqual(result["response"], NOT_IN_CORPUS_RESPONSE)
+        self.assertEqual(result["timings"]["llm_skipped"], "low_confidence")
+        self.assertEqual(ollama.calls, 0)
+        self.assertEqual(self.metrics.llm_call_counts(), {"made": 0, "avoided": {"low_confidence": 2}})
+        self.assertIn('rag_llm_calls_avoided_total{reason="low_confidence"} 2', self.metrics.to_prometheus())
+
+    def test_stream_and_cache_hits_are_counted(self):
+        """Test that the streaming path is gated too and repeated queries count as cache-avoided calls."""
+        processor, ollama = make_processor([{"uuid": "a", "text": "Akbar.", "source": "hess2.pdf", "distance": 0.8}])
+        events = list(processor.process_query_stream("Who won the 2010 World Cup?", limit=3))
+        self.assertEqual(events[1]["token"], NOT_IN_CORPUS_RESPONSE)
+        processor.vector_store.results[0]["distance"] = 0.2
+        processor.process_query("Who was Akbar?", limit=3)
+        processor.process_query("Who was Akbar?", limit=3)
+        self.assertEqual(ollama.calls, 1)
+        self.assertEqual(self.metrics.llm_call_counts(), {"made": 1, "avoided": {"low_confidence": 1, "cache": 1}})
+
+    def test_batch_answers_repeated_questions_once(self):
+        """Test that process_queries keeps input order and generates one answer per distinct question in a batch."""
+        processor, ollama = make_processor([{"uuid": "a", "text": "Gama reached Calicut.", "source": "hess2.pdf", "distance": 0.3}])
+        queries = ["Where did Gama land?", "Who was Akbar?", "  where did gama land ", "Where did Gama land?"]
+        results = processor.process_queries(queries, limit=3, concurrency=2)
+        self.assertEqual([result["query"] for result in results], queries)
+        self.assertEqual({result["response"] for result in results}, {"Calicut."})
+        self.assertEqual(processor.embedding_model.batches, [["Where did Gama land?", "Who was Akbar?"]])
+        self.assertEqual(ollama.calls, 2)
+        self.assertEqual([result["timings"]["llm_skipped"] for result in results], [None, None, "duplicate", "duplicate"])
+        self.assertEqual(self.metrics.llm_call_counts(), {"made": 2, "avoided": {"duplicate": 2}})
+
+    def test_batch_retrieval_failure_reports_every_query(self):
+        """Test that a failed batched search gives each query, repeats included, an error result."""
+        processor, ollama = make_processor(None)
+        results = processor.process_queries(["Who was Akbar?", "who was akbar"], limit=3)
+        self.assertEqual(results, [{"error": "store is down"}] * 2)
+        self.assertEqual(ollama.calls, 0)
+
+    def test_empty_answers_are_not_cached(self):
+        """Test that an empty generation is not cached on the streaming or the blocking path."""
+        processor, ollama = make_processor([{"uuid": "a", "text": "Akbar.", "source": "hess2.pdf", "distance": 0.2}])
+        ollama.response = ""
+        for _ in range(2):
+            list(processor.process_query_stream("Who was Akbar?", limit=3))
+            processor.process_query("Who was Akbar?", limit=3)
+        self.assertEqual(ollama.calls, 4)
+
+    def test_keyword_hits_and_disabled_threshold(self):
+        """Test that a strong BM25-only hit passes the gate and that no threshold means no gating."""
+        results = [{"uuid": "a", "text": "Akbar.", "source": "a.pdf", "distance": 0.9},
+                   {"uuid": "b", "text": "Mansabdari.", "source": "b.pdf", "bm25_score": 7.5}]
+        self.assertEqual(make_processor(results)[0].skip_reason(results), "low_confidence")
+        self.assertIsNone(make_processor(results, min_bm25="5")[0].skip_reason(results))
+        self.assertIsNone(make_processor(results, max_distance="")[0].skip_reason(results))
+        self.assertEqual(make_processor([])[0].skip_reason([]), "no_results")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from bm25_index import BM25Index
+from chunk_metadata import locate_chunks, normalize_filters, parse_filter_env, parse_source
+from ingest_manifest import IngestManifest
+from main import BackendRunner, split_pages
+from query_cache import QueryCache
+from vector_store import LocalVectorStore
+
+CHUNKS = [
+    {"uuid": "a", "text": "Akbar and the Mughal nobility", "source": "hess201.pdf", "book": "hess2", "chapter": 1},
+    {"uuid": "b", "text": "Mughal painting and architecture", "source": "hess202.pdf", "book": "hess2", "chapter": 2},
+    {"uuid": "c", "text": "Mughal trade with Europe", "source": "iess301.pdf", "book": "iess3", "chapter": 1},
+    {"uuid": "d", "text": "Mughal revenue in Bengal", "source": "fees101.pdf"},
+]
+VECTORS = np.array([[1.0, 0.0], [0.9, 0.1], [0.8, 0.2], [0.99, 0.01]], dtype=np.float32)
+
+class FakeSplitter:
+    """Overlapping fixed-size windows, stripped like the recursive splitter's chunks."""
+    def split_text(self, text):
+        return [text[start:start + 300].strip() for start in range(0, len(text), 240)]
+
+class FakeEmbeddingModel:
+    def embed_batch(self, texts, batch_size=64):
+        return VECTORS[[next(i for i, chunk in enumerate(CHUNKS) if chunk["text"] == text) for text in texts]]
+
+class TestChunkMetadata(unittest.TestCase):
+
+    def test_parse_source_and_filters(self):
+        """Test that NCERT file names give book and chapter and filter settings are validated."""
+        self.assertEqual(parse_source("books/hess203.pdf"), ("hess2", 3))
+        self.assertEqual(parse_source("fees1ps.pdf"), ("fees1", 0))
+        self.assertEqual(parse_filter_env("book=hess2,iess3;chapter=3"), {"book": ("hess2", "iess3"), "chapter": (3,)})
+        self.assertIsNone(normalize_filters({}))
+        with self.assertRaises(ValueError):
+            normalize_filters({"text": "Akbar"})
+
+    def test_offsets_and_pages_point_at_the_chunk(self):
+        """Test that split chunks carry offsets into the joined text and the pages they span."""
+        pages = ["Akbar ruled from Agra. " * 30, "He moved to Fatehpur Sikri. " * 30, "Later to Lahore. " * 30]
+        text = "\n".join(pages)
+        with mock.patch("main.get_text_splitter", return_value=FakeSplitter()):
+            chunks = split_pages(pages, "hess203.pdf", 300, 60)
+        self.assertGreater(len(chunks), 3)
+        for chunk in chunks:
+            self.assertEqual(text[chunk["char_start"]:chunk["char_end"]], chunk["text"])
+            self.assertEqual((chunk["book"], chunk["chapter"]), ("hess2", 3))
+        self.assertEqual((chunks[0]["page_start"], chunks[-1]["page_end"]), (1, 3))
+        spanning = locate_chunks(["ab", "cd"], ["b\nc"])[0]
+        self.assertEqual((spanning["page_start"], spanning["page_end"], spanning["char_start"]), (1, 2, 1))
+
+class FakePDFProcessor:
+    def __init__(self, files):
+        self.files = files
+
+    def iter_files(self, filenames):
+        for filename in filenames:
+            yield filename, [dict(chunk) for chunk in self.files[filename]]
+
+class TestChangedFiles(unittest.TestCase):
+
+    def test_unchanged_chunks_of_a_changed_file_get_new_locations(self):
+        """Test that every chunk of a changed file is upserted, so moved chunks carry their new offsets."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        runner = BackendRunner.__new__(BackendRunner)
+        runner.manifest = IngestManifest(f"{directory}/manifest.json")
+        old = IngestManifest.assign_chunk_ids([{"text": "Akbar", "source": "hess201.pdf", "char_start": 0},
+                                               {"text": "Babur", "source": "hess201.pdf", "char_start": 6}])
+        runner.manifest.update("hess201.pdf", "old-hash", [chunk["uuid"] for chunk in old])
+        pdf_processor = FakePDFProcessor({"hess201.pdf": [{"text": "Preface", "source": "hess201.pdf", "char_start": 0},
+                                                          {"text": "Akbar", "source": "hess201.pdf", "char_start": 8}]})
+        new_ids, to_delete = {}, []
+        chunks = list(runner.iter_file_chunks(pdf_processor, ["hess201.pdf"], new_ids, to_delete))
+        self.assertEqual([(chunk["text"], chunk["char_start"]) for chunk in chunks], [("Preface", 0), ("Akbar", 8)])
+        self.assertEqual(chunks[1]["uuid"], old[0]["uuid"])
+        self.assertEqual(to_delete, [old[1]["uuid"]])
+        self.assertEqual(new_ids["hess201.pdf"], [chunk["uuid"] for chunk in chunks])
+
+class TestFilteredSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = LocalVectorStore(self.directory)
+        self.store.setup_collection("TestCollection")
+        self.store.insert_documents(CHUNKS, FakeEmbeddingModel(), "TestCollection")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_local_store_filters_by_book_and_chapter(self):
+        """Test that filtered local search scans only the book partitions and still ranks by distance."""
+        query = [1.0, 0.0]
+        self.assertEqual([r["uuid"] for r in self.store.query(query, 3, "TestCollection")], ["a", "d", "b"])
+        results = self.store.query(query, 3, "TestCollection", filters={"book": ["iess3", "hess2"]})
+        self.assertEqual([r["uuid"] for r in results], ["a", "b", "c"])
+        self.assertEqual(results[0]["chapter"], 1)
+        self.assertEqual([r["uuid"] for r in self.store.query(query, 3, "TestCollection", filters={"book": "hess2", "chapter": 2})], ["b"])
+        self.assertEqual([r["uuid"] for r in self.store.query(query, 3, "TestCollection", filters={"book": "fees1"})], ["d"])
+        self.assertEqual(self.store.query(query, 3, "TestCollection", filters={"book": "gess1"}), [])
+        batch = self.store.query_batch([query, [0.0, 1.0]], 2, "TestCollection", filters={"book": "hess2"})
+        self.assertEqual([[r["uuid"] for r in results] for results in batch], [["a", "b"], ["b", "a"]])
+
+    def test_bm25_and_cache_respect_scope(self):
+        """Test that BM25 hits are filtered and cached answers are kept apart per scope."""
+        index = BM25Index().build(CHUNKS)
+        self.assertEqual({r["uuid"] for r in index.search("Mughal", 5, {"book": "hess2"})}, {"a", "b"})
+        self.assertEqual(index.search("Akbar", 5, {"book": "iess3"}), [])
+        cache = QueryCache(max_size=10)
+        cache.put("Who was Akbar?", 3, {"response": "all books"})
+        cache.put("Who was Akbar?", 3, {"response": "hess2"}, scope='{"book": ["hess2"]}')
+        self.assertEqual(cache.get_exact("who was akbar", 3)["response"], "all books")
+        self.assertEqual(cache.get_exact("who was akbar", 3, '{"book": ["hess2"]}')["response"], "hess2")
+        self.assertIsNone(cache.get_exact("who was akbar", 3, '{"book": ["iess3"]}'))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import csv
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+from query_1000 import AnswerGenerator
+
+class FakeQueryProcessor:
+    def __init__(self):
+        self.asked = []
+        self.lock = threading.Lock()
+
+    def process_query(self, question):
+        with self.lock:
+            self.asked.append(question)
+        return {"response": f"answer to {question}"}
+
+class TestAnswerGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.question_file = os.path.join(self.directory, "queries.txt")
+        self.output_csv = os.path.join(self.directory, "ques_ans.csv")
+        with open(self.question_file, "w", encoding="utf-8") as f:
+            f.write("\n".join(f"question {i}" for i in range(1, 9)) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read_rows(self):
+        with open(self.output_csv, "r", encoding="utf-8") as f:
+            return list(csv.reader(f))
+
+    def test_async_answers_every_question_once(self):
+        """Test that the concurrent path writes a header and one row per question with its index."""
+        processor = FakeQueryProcessor()
+        AnswerGenerator(self.question_file, self.output_csv, processor).generate_answers(concurrency=3, queue_size=1)
+        rows = self.read_rows()
+        self.assertEqual(rows[0], ["Question", "Answer", "Index"])
+        self.assertEqual(sorted(rows[1:], key=lambda row: int(row[2])),
+                         [[f"question {i}", f"answer to question {i}", str(i)] for i in range(1, 9)])
+        self.assertEqual(sorted(processor.asked), sorted(f"question {i}" for i in range(1, 9)))
+
+    def test_headerless_two_column_file_keeps_its_layout(self):
+        """Test that an existing (question, answer) file without a header keeps two columns and its first row counts."""
+        with open(self.output_csv, "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows([["question 1", "old answer"], ["question 2", "old answer"]])
+        processor = FakeQueryProcessor()
+        AnswerGenerator(self.question_file, self.output_csv, processor).generate_answers(concurrency=2)
+        rows = self.read_rows()
+        self.assertNotIn("question 1", processor.asked)
+        self.assertEqual(len(rows), 8)
+        self.assertTrue(all(len(row) == 2 for row in rows))
+
+    def test_writer_failure_is_raised(self):
+        """Test that an error in the CSV writer propagates instead of leaving producers blocked on the queue."""
+        generator = AnswerGenerator(self.question_file, self.output_csv, FakeQueryProcessor())
+        def fail(question, answer, index):
+            raise OSError("disk full")
+        generator.output_row = fail
+        async def run():
+            await asyncio.wait_for(generator.generate_answers_async(concurrency=2, queue_size=1), timeout=5)
+        with self.assertRaises(OSError):
+            asyncio.run(run())
+
+if __name__ == "__main__":
+    unittest.main()
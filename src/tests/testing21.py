@@ -0,0 +1,44 @@
+import sys
+import time
+import types
+import threading
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from document_processor import EmbeddingModel
+
+class SlowSentenceTransformer:
+    """Counts constructions and takes long enough that racing first calls would overlap."""
+    created = 0
+    lock = threading.Lock()
+
+    def __init__(self, name, **kwargs):
+        time.sleep(0.05)
+        with SlowSentenceTransformer.lock:
+            SlowSentenceTransformer.created += 1
+
+class TestEmbeddingModelLoading(unittest.TestCase):
+
+    def setUp(self):
+        SlowSentenceTransformer.created = 0
+        module = types.ModuleType("sentence_transformers")
+        module.SentenceTransformer = SlowSentenceTransformer
+        patcher = mock.patch.dict(sys.modules, {"sentence_transformers": module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_model_is_not_loaded_at_construction(self):
+        """Test that constructing EmbeddingModel does not load the model."""
+        EmbeddingModel("test-model", backend="torch")
+        self.assertEqual(SlowSentenceTransformer.created, 0)
+
+    def test_concurrent_first_use_loads_once(self):
+        """Test that threads hitting the lazy model at the same time share a single load."""
+        model = EmbeddingModel("test-model", backend="onnx")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            loaded = list(executor.map(lambda _: model.model, range(8)))
+        self.assertEqual(SlowSentenceTransformer.created, 1)
+        self.assertTrue(all(instance is loaded[0] for instance in loaded))
+
+if __name__ == "__main__":
+    unittest.main()
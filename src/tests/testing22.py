@@ -0,0 +1,91 @@
+import threading
+import unittest
+import numpy as np
+from ingest_pipeline import StreamingIngestPipeline
+
+class FakeEmbeddingModel:
+    def __init__(self, fail_on_call=None):
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def embed_batch(self, texts, batch_size=64):
+        self.calls += 1
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding failed")
+        return np.ones((len(texts), 2), dtype=np.float32)
+
+class FakeVectorStore:
+    """Consumes the (chunks, vectors) batches like insert_embedded, recording how far extraction had run ahead."""
+    def __init__(self, produced, fail_after=None):
+        self.produced = produced
+        self.fail_after = fail_after
+        self.uploaded = []
+        self.batch_sizes = []
+        self.max_ahead = 0
+
+    def insert_embedded(self, embedded_batches, collection_name="DocumentChunks"):
+        for chunk_batch, vectors in embedded_batches:
+            self.batch_sizes.append((len(chunk_batch), len(vectors)))
+            self.uploaded.extend(chunk["text"] for chunk in chunk_batch)
+            self.max_ahead = max(self.max_ahead, self.produced[0] - len(self.uploaded))
+            if self.fail_after is not None and len(self.uploaded) >= self.fail_after:
+                raise ConnectionError("upload failed")
+        return len(self.uploaded)
+
+def chunk_stream(count, produced, fail_at=None):
+    for i in range(count):
+        if i == fail_at:
+            raise ValueError("extraction failed")
+        produced[0] += 1
+        yield {"text": f"chunk {i}", "source": "book.pdf"}
+
+class TestStreamingIngestPipeline(unittest.TestCase):
+
+    def run_pipeline(self, chunks, embedding_model, vector_store):
+        """Runs the pipeline in a thread and fails the test instead of hanging if it does not finish."""
+        outcome = {}
+        def target():
+            try:
+                outcome["total"] = StreamingIngestPipeline(embedding_model, vector_store, "Test", batch_size=4, queue_size=2).run(chunks)
+            except Exception as e:
+                outcome["error"] = e
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive(), "pipeline did not finish")
+        return outcome
+
+    def test_uploads_every_chunk_in_order_with_bounded_queues(self):
+        """Test that all chunks are uploaded in order and extraction never runs far ahead of the upload."""
+        produced = [0]
+        store = FakeVectorStore(produced)
+        outcome = self.run_pipeline(chunk_stream(103, produced), FakeEmbeddingModel(), store)
+        self.assertEqual(outcome, {"total": 103})
+        self.assertEqual(store.uploaded, [f"chunk {i}" for i in range(103)])
+        self.assertEqual(store.batch_sizes, [(4, 4)] * 25 + [(3, 3)])
+        # Two queues of two batches, one batch in each of the three stages, and the one being read.
+        self.assertLessEqual(store.max_ahead, (2 + 2 + 3 + 1) * 4)
+
+    def test_extraction_error_is_raised(self):
+        """Test that an exception from the chunk generator stops the run and is raised to the caller."""
+        produced = [0]
+        outcome = self.run_pipeline(chunk_stream(100, produced, fail_at=10), FakeEmbeddingModel(), FakeVectorStore(produced))
+        self.assertIsInstance(outcome.get("error"), ValueError)
+
+    def test_embedding_error_is_raised(self):
+        """Test that an embedding failure ends the upload and is raised to the caller."""
+        produced = [0]
+        store = FakeVectorStore(produced)
+        outcome = self.run_pipeline(chunk_stream(100, produced), FakeEmbeddingModel(fail_on_call=3), store)
+        self.assertIsInstance(outcome.get("error"), RuntimeError)
+        self.assertEqual(len(store.uploaded), 8)
+
+    def test_upload_error_is_raised_and_stops_extraction(self):
+        """Test that an upload failure is raised and the extract and embed threads stop instead of blocking."""
+        produced = [0]
+        outcome = self.run_pipeline(chunk_stream(10000, produced), FakeEmbeddingModel(), FakeVectorStore(produced, fail_after=8))
+        self.assertIsInstance(outcome.get("error"), ConnectionError)
+        self.assertLess(produced[0], 100)
+
+if __name__ == "__main__":
+    unittest.main()
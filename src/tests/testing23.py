@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+from main import PDFProcessor
+
+class FakeSplitter:
+    """Splits on blank lines, so each paragraph of a generated page is one chunk."""
+    def split_text(self, text):
+        return [part.strip() for part in text.split("\n\n") if part.strip()]
+
+def write_pdf(path, pages):
+    import fitz
+    with fitz.open() as doc:
+        for text in pages:
+            doc.new_page().insert_text((72, 72), text)
+        doc.save(path)
+
+@unittest.skipUnless(importlib.util.find_spec("fitz"), "PyMuPDF is not installed")
+class TestPDFProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = {
+            "hess201.pdf": [f"Akbar page {i}" for i in range(1, 6)],
+            "hess202.pdf": ["Babur page 1"],
+            "iess301.pdf": [f"Trade page {i}" for i in range(1, 4)],
+        }
+        for filename, pages in self.files.items():
+            write_pdf(os.path.join(self.directory, filename), pages)
+        with open(os.path.join(self.directory, "broken.pdf"), "wb") as f:
+            f.write(b"not a pdf")
+        patcher = mock.patch("main.get_text_splitter", return_value=FakeSplitter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def extract(self, filenames, **kwargs):
+        return list(PDFProcessor(self.directory, **kwargs).iter_files(filenames))
+
+    def test_parallel_output_matches_sequential_in_input_order(self):
+        """Test that files split into page ranges across worker processes come back whole and in the order given."""
+        filenames = ["iess301.pdf", "hess201.pdf", "hess202.pdf"]
+        sequential = self.extract(filenames, workers=1)
+        parallel = self.extract(filenames, workers=2, pages_per_task=2)
+        self.assertEqual([filename for filename, _ in parallel], filenames)
+        self.assertEqual(parallel, sequential)
+
+    def test_page_ranges_keep_page_numbers_and_offsets(self):
+        """Test that chunks of a file read in page ranges carry the page they came from and offsets into the whole text."""
+        [(_, chunks)] = self.extract(["hess201.pdf"], workers=2, pages_per_task=2)
+        self.assertEqual([chunk["text"] for chunk in chunks], self.files["hess201.pdf"])
+        self.assertEqual([chunk["page_start"] for chunk in chunks], [1, 2, 3, 4, 5])
+        self.assertEqual([chunk["page_end"] for chunk in chunks], [1, 2, 3, 4, 5])
+        self.assertEqual(chunks[0]["char_start"], 0)
+        self.assertTrue(all(first["char_end"] < second["char_start"] for first, second in zip(chunks, chunks[1:])))
+
+    def test_bad_file_does_not_break_the_others(self):
+        """Test that an unreadable PDF yields None in its place while the other files are still extracted."""
+        filenames = ["hess202.pdf", "broken.pdf", "hess201.pdf"]
+        for kwargs in ({"workers": 1}, {"workers": 2, "pages_per_task": 2}):
+            results = self.extract(filenames, **kwargs)
+            self.assertEqual([filename for filename, _ in results], filenames)
+            self.assertIsNone(results[1][1])
+            self.assertEqual(len(results[0][1]), 1)
+            self.assertEqual(len(results[2][1]), 5)
+
+if __name__ == "__main__":
+    unittest.main()
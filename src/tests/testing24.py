@@ -0,0 +1,86 @@
+import os
+import time
+import threading
+import unittest
+from unittest import mock
+import resources
+from helpers import FakeClock
+
+class FakeVectorStore:
+    def __init__(self):
+        self.healthy = True
+        self.health_checks = 0
+        self.reconnects = 0
+        self.closed = False
+
+    def is_healthy(self):
+        self.health_checks += 1
+        return self.healthy
+
+    def reconnect(self):
+        self.reconnects += 1
+        self.healthy = True
+
+    def close_connection(self):
+        self.closed = True
+
+class TestSharedResources(unittest.TestCase):
+
+    def setUp(self):
+        resources._resources.clear()
+        resources._last_health_check["time"] = 0.0
+        self.clock = FakeClock()
+        self.clock.now = 1000.0
+        self.store = FakeVectorStore()
+        for patcher in (mock.patch("resources.time", mock.Mock(monotonic=self.clock)),
+                        mock.patch("resources.create_vector_store", return_value=self.store),
+                        mock.patch.dict(os.environ, {"HEALTH_CHECK_INTERVAL": "30"})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(resources._resources.clear)
+
+    def test_resources_are_created_once_across_threads(self):
+        """Test that concurrent first calls share one instance built by a single factory call."""
+        created = []
+        def slow_model():
+            time.sleep(0.05)
+            created.append(object())
+            return created[-1]
+        with mock.patch("resources.EmbeddingModel", slow_model):
+            models = []
+            threads = [threading.Thread(target=lambda: models.append(resources.get_embedding_model())) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+        self.assertTrue(all(model is created[0] for model in models))
+
+    def test_unhealthy_store_is_reconnected_once_per_interval(self):
+        """Test that a failed health check reconnects the shared store and checks are spaced by the interval."""
+        self.store.healthy = False
+        self.assertIs(resources.get_vector_store(), self.store)
+        self.assertEqual((self.store.health_checks, self.store.reconnects), (1, 1))
+
+        self.store.healthy = False
+        self.clock.now += 10
+        resources.get_vector_store()
+        self.assertEqual((self.store.health_checks, self.store.reconnects), (1, 1))
+
+        self.clock.now += 30
+        self.assertIs(resources.get_vector_store(), self.store)
+        self.assertEqual((self.store.health_checks, self.store.reconnects), (2, 2))
+
+    def test_close_resources_closes_and_forgets_everything(self):
+        """Test that closing shuts the shared store and Ollama session and drops every shared resource."""
+        ollama = mock.Mock()
+        with mock.patch("resources.OllamaClient", return_value=ollama):
+            resources.get_vector_store()
+            resources.get_ollama_client()
+            resources.close_resources()
+        self.assertTrue(self.store.closed)
+        ollama.close.assert_called_once()
+        self.assertEqual(resources._resources, {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_lookup_miss_then_hit(self):
+        """Test that stored vectors are returned on the next lookup and counted as hits."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=10)
+        rows, missing = cache.lookup(["alpha", "beta"])
+        self.assertEqual(missing, [0, 1])
+
+        vectors = np.arange(8, dtype=np.float32).reshape(2, 4)
+        cache.store(["alpha", "beta"], vectors)
+        rows, missing = cache.lookup(["beta", "gamma"])
+        self.assertEqual(missing, [1])
+        np.testing.assert_array_equal(rows[0], vectors[1])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 3)
+
+    def test_persists_across_instances(self):
+        """Test that saved entries are reloaded from disk."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=10)
+        cache.store(["alpha"], np.ones((1, 4), dtype=np.float32))
+        cache.save()
+
+        reloaded = EmbeddingCache("test-model", self.cache_dir, max_entries=10)
+        rows, missing = reloaded.lookup(["alpha"])
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(rows[0], np.ones(4, dtype=np.float32))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted once the cache is full."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=2)
+        cache.store(["a", "b"], np.eye(2, dtype=np.float32))
+        cache.lookup(["a"])
+        cache.store(["c"], np.full((1, 2), 5, dtype=np.float32))
+
+        _, missing = cache.lookup(["a", "b", "c"])
+        self.assertEqual(missing, [1])
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_stale_index_after_crash_is_not_trusted(self):
+        """Test that rows overwritten by an eviction after the last save miss instead of returning wrong vectors."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=2)
+        cache.store(["a", "b"], np.eye(2, dtype=np.float32))
+        cache.save()
+        cache.store(["c"], np.full((1, 2), 5, dtype=np.float32))
+        cache.matrix.flush()
+        cache.slot_keys.flush()
+
+        reloaded = EmbeddingCache("test-model", self.cache_dir, max_entries=2)
+        rows, missing = reloaded.lookup(["a", "b", "c"])
+        self.assertEqual(missing, [0, 2])
+        np.testing.assert_array_equal(rows[1], np.array([0, 1], dtype=np.float32))
+        self.assertEqual(reloaded.stats()["entries"], 1)
+
+    def test_digest_ending_in_nul_still_hits(self):
+        """Test that a key whose digest ends in a NUL byte hits and its slot is not reused for a live key."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=10)
+        text = next(f"t{i}" for i in range(10000) if cache.slot_digest(cache.key(f"t{i}")).endswith(b"\0"))
+        cache.store([text, "x", "y"], np.eye(3, dtype=np.float32))
+        _, missing = cache.lookup([text])
+        self.assertEqual(missing, [])
+        cache.store(["z"], np.full((1, 3), 5, dtype=np.float32))
+        rows, missing = cache.lookup([text, "x", "y", "z"])
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(rows[2], np.array([0, 0, 1], dtype=np.float32))
+
+    def test_stale_slot_is_reused_without_overwriting_live_rows(self):
+        """Test that a slot freed by a stale entry is handed out instead of a live key's row."""
+        cache = EmbeddingCache("test-model", self.cache_dir, max_entries=2)
+        cache.store(["a", "b"], np.eye(2, dtype=np.float32))
+        cache.save()
+        cache.store(["c"], np.full((1, 2), 5, dtype=np.float32))
+        cache.matrix.flush()
+        cache.slot_keys.flush()
+
+        reloaded = EmbeddingCache("test-model", self.cache_dir, max_entries=2)
+        self.assertEqual(reloaded.lookup(["a"])[1], [0])
+        reloaded.store(["e"], np.full((1, 2), 9, dtype=np.float32))
+        rows, missing = reloaded.lookup(["b", "e"])
+        self.assertEqual(missing, [])
+        np.testing.assert_array_equal(rows[0], np.array([0, 1], dtype=np.float32))
+        np.testing.assert_array_equal(rows[1], np.array([9, 9], dtype=np.float32))
+
+    def test_model_name_is_part_of_key(self):
+        """Test that the same text under different models maps to different keys."""
+        first = EmbeddingCache("model-a", self.cache_dir)
+        second = EmbeddingCache("model-b", self.cache_dir)
+        self.assertNotEqual(first.key("text"), second.key("text"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+import unittest
+from ingest_manifest import IngestManifest
+
+class TestIngestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_chunk_ids_are_deterministic(self):
+        """Test that identical chunks get identical UUIDs and repeated text gets distinct ones."""
+        first = IngestManifest.assign_chunk_ids([{"text": "a", "source": "x.pdf"}, {"text": "a", "source": "x.pdf"}])
+        second = IngestManifest.assign_chunk_ids([{"text": "a", "source": "x.pdf"}, {"text": "a", "source": "x.pdf"}])
+        self.assertEqual([c["uuid"] for c in first], [c["uuid"] for c in second])
+        self.assertNotEqual(first[0]["uuid"], first[1]["uuid"])
+
+    def test_diff_detects_added_changed_removed(self):
+        """Test that diff classifies files against the saved manifest."""
+        manifest = IngestManifest(self.manifest_path)
+        manifest.update("same.pdf", "h1", ["id1"])
+        manifest.update("edited.pdf", "h2", ["id2"])
+        manifest.update("gone.pdf", "h3", ["id3"])
+        manifest.save()
+
+        reloaded = IngestManifest(self.manifest_path)
+        added, changed, removed = reloaded.diff({"same.pdf": "h1", "edited.pdf": "h2-new", "new.pdf": "h4"})
+        self.assertEqual(added, ["new.pdf"])
+        self.assertEqual(changed, ["edited.pdf"])
+        self.assertEqual(removed, ["gone.pdf"])
+        self.assertEqual(reloaded.chunk_ids("gone.pdf"), ["id3"])
+
+    def test_file_hash_changes_with_content(self):
+        """Test that the file hash reflects file contents."""
+        path = os.path.join(self.directory, "book.pdf")
+        with open(path, "wb") as f:
+            f.write(b"first")
+        first = IngestManifest.file_hash(path)
+        with open(path, "wb") as f:
+            f.write(b"second")
+        self.assertNotEqual(first, IngestManifest.file_hash(path))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from vector_store import LocalVectorStore
+
+class FakeEmbeddingModel:
+    """Maps each text to a fixed vector so searches are predictable."""
+    vectors = {
+        "mughal empire": [1.0, 0.0, 0.0],
+        "vasco da gama": [0.0, 1.0, 0.0],
+        "french revolution": [0.0, 0.0, 1.0],
+    }
+
+    def embed_batch(self, texts, batch_size=64):
+        return np.array([self.vectors[text] for text in texts], dtype=np.float32)
+
+class TestLocalVectorStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = LocalVectorStore(self.directory)
+        self.store.setup_collection("TestCollection")
+        chunks = [{"text": text, "source": "book.pdf", "uuid": f"id-{i}"}
+                  for i, text in enumerate(FakeEmbeddingModel.vectors)]
+        self.store.insert_documents(chunks, FakeEmbeddingModel(), "TestCollection")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_query_returns_nearest_first(self):
+        """Test that exact search ranks by cosine similarity and reports cosine distance."""
+        results = self.store.query([0.1, 0.9, 0.0], limit=2, collection_name="TestCollection")
+        self.assertEqual([r["text"] for r in results], ["vasco da gama", "mughal empire"])
+        self.assertLess(results[0]["distance"], results[1]["distance"])
+
+    def test_limit_larger_than_collection(self):
+        """Test that asking for more results than stored returns everything."""
+        results = self.store.query([1.0, 0.0, 0.0], limit=10, collection_name="TestCollection")
+        self.assertEqual(len(results), 3)
+        self.assertAlmostEqual(results[0]["distance"], 0.0, places=5)
+
+    def test_query_batch_matches_single_queries(self):
+        """Test that the matrix-matrix batch search returns the same results as one query at a time."""
+        queries = np.array([[0.1, 0.9, 0.0], [0.0, 0.2, 0.8]], dtype=np.float32)
+        batch = self.store.query_batch(queries, limit=2, collection_name="TestCollection")
+        single = [self.store.query(q, limit=2, collection_name="TestCollection") for q in queries]
+        self.assertEqual([[r["uuid"] for r in rs] for rs in batch], [[r["uuid"] for r in rs] for rs in single])
+
+    def test_delete_documents(self):
+        """Test that deleted chunks no longer appear in results."""
+        self.store.delete_documents(["id-1"], "TestCollection")
+        results = self.store.query([0.0, 1.0, 0.0], limit=3, collection_name="TestCollection")
+        self.assertNotIn("vasco da gama", [r["text"] for r in results])
+        self.assertEqual(len(results), 2)
+
+    def test_reinsert_replaces_same_uuid(self):
+        """Test that inserting chunks whose uuids are already stored replaces them instead of duplicating rows."""
+        chunks = [{"text": "mughal empire", "source": "other.pdf", "uuid": "id-0"},
+                  {"text": "french revolution", "source": "book.pdf", "uuid": "id-2"}]
+        self.store.insert_documents(chunks, FakeEmbeddingModel(), "TestCollection")
+        _, metadata = self.store.load("TestCollection")
+        self.assertEqual([meta["uuid"] for meta in metadata], ["id-1", "id-0", "id-2"])
+        results = self.store.query([1.0, 0.0, 0.0], limit=3, collection_name="TestCollection")
+        self.assertEqual([(r["uuid"], r["source"]) for r in results][0], ("id-0", "other.pdf"))
+        self.assertEqual(len(results), 3)
+
+    def test_interrupted_insert_does_not_misalign_rows(self):
+        """Test that rows left behind by a failed insert are dropped before the next append."""
+        broken = [{"text": "vasco da gama", "source": "broken.pdf", "uuid": "id-3"}, {"source": "broken.pdf", "uuid": "id-4"}]
+        vectors = np.array([[0.0, 1.0, 0.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+        with self.assertRaises(KeyError):
+            self.store.insert_embedded([(broken, vectors)], "TestCollection")
+        self.assertEqual(len(self.store.load("TestCollection")[1]), 3)
+        chunks = [{"text": "mughal empire", "source": "other.pdf", "uuid": "id-5"}]
+        self.store.insert_documents(chunks, FakeEmbeddingModel(), "TestCollection")
+        results = self.store.query([0.0, 1.0, 0.0], limit=4, collection_name="TestCollection")
+        self.assertEqual([(r["uuid"], round(r["distance"], 6)) for r in results][:1], [("id-1", 0.0)])
+        self.assertEqual(len(results), 4)
+        top = self.store.query([1.0, 0.0, 0.0], limit=2, collection_name="TestCollection")
+        self.assertEqual(sorted(r["uuid"] for r in top), ["id-0", "id-5"])
+
+    def test_persists_and_keeps_existing_collection(self):
+        """Test that a new store instance reads the saved collection and setup without recreate keeps it."""
+        reopened = LocalVectorStore(self.directory)
+        self.assertFalse(reopened.setup_collection("TestCollection", recreate=False))
+        results = reopened.query([0.0, 0.0, 1.0], limit=1, collection_name="TestCollection")
+        self.assertEqual(results[0]["text"], "french revolution")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from ann_index import IVFIndex
+
+class TestIVFIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(2000, 16)).astype(np.float32)
+        cls.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        cls.index = IVFIndex(n_lists=20, nprobe=4).build(cls.vectors)
+
+    def exact(self, query, k):
+        return list(np.argsort(-(self.vectors @ query))[:k])
+
+    def test_every_row_is_in_one_list(self):
+        """Test that the inverted lists partition all rows."""
+        self.assertEqual(sorted(self.index.order.tolist()), list(range(len(self.vectors))))
+        self.assertEqual(self.index.offsets[-1], len(self.vectors))
+
+    def test_probing_all_lists_is_exact(self):
+        """Test that nprobe equal to the list count matches brute-force search."""
+        query = self.vectors[7]
+        ids, scores = self.index.search(self.vectors, query, 5, nprobe=20)
+        self.assertEqual(list(ids), self.exact(query, 5))
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_finds_stored_vector(self):
+        """Test that a stored vector is its own nearest neighbour with a small nprobe."""
+        ids, _ = self.index.search(self.vectors, self.vectors[42], 1, nprobe=1)
+        self.assertEqual(ids[0], 42)
+
+    def test_save_and_load(self):
+        """Test that a saved index answers queries identically after loading."""
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "ivf.npz")
+            self.index.save(path)
+            loaded = IVFIndex.load(path, nprobe=4)
+            query = self.vectors[99]
+            np.testing.assert_array_equal(loaded.search(self.vectors, query, 3)[0],
+                                          self.index.search(self.vectors, query, 3)[0])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,333 @@
+import os
+import json
+import time
+import uuid
+import shutil
+from abc import ABC, abstractmethod
+from itertools import islice
+import numpy as np
+from ann_index import IVFIndex
+from chunk_metadata import METADATA_FIELDS, normalize_filters, matches, field_value
+
+def batched(iterable, batch_size):
+    """Yields lists of up to batch_size items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+class VectorStore(ABC):
+    """Operations shared by every vector-store backend.
+
+    query() returns a list of dicts with "uuid", "text", "source", the chunk metadata
+    fields that were ingested and "distance" (cosine distance, lower is closer), best
+    match first. filters ({field: value or list of values}, see chunk_metadata) restrict
+    the search to matching chunks. insert_embedded() returns the number of chunks
+    inserted and replaces stored chunks that have the same uuid.
+    """
+    @abstractmethod
+    def setup_collection(self, collection_name="DocumentChunks", recreate=True):
+        pass
+
+    @abstractmethod
+    def insert_embedded(self, embedded_batches, collection_name="DocumentChunks"):
+        pass
+
+    @abstractmethod
+    def delete_documents(self, uuids, collection_name="DocumentChunks"):
+        pass
+
+    @abstractmethod
+    def query(self, vector, limit=3, collection_name="DocumentChunks", filters=None):
+        pass
+
+    def query_batch(self, vectors, limit=3, collection_name="DocumentChunks", filters=None):
+        """Runs one query per row of vectors and returns the result lists in the same order."""
+        return [self.query(vector, limit, collection_name, filters=filters) for vector in vectors]
+
+    def insert_documents(self, chunks, embedding_model, collection_name="DocumentChunks", batch_size=64):
+        embedded_batches = (
+            (chunk_batch, embedding_model.embed_batch([chunk["text"] for chunk in chunk_batch], batch_size=batch_size))
+            for chunk_batch in batched(chunks, batch_size)
+        )
+        return self.insert_embedded(embedded_batches, collection_name)
+
+    def is_healthy(self):
+        return True
+
+    def reconnect(self):
+        pass
+
+    def close_connection(self):
+        pass
+
+class LocalVectorStore(VectorStore):
+    """In-process vector store: a memory-mapped float32 matrix of unit vectors plus a JSONL metadata file.
+
+    Search is exact cosine top-k via one matrix-vector product and argpartition,
+    or approximate via an IVF index when index_type is "ivf". Filtered searches
+    scan only the matching rows, found through per-book row partitions.
+    """
+    def __init__(self, directory=None, index_type=None, nprobe=None):
+        self.directory = directory or os.getenv("LOCAL_INDEX_DIR", "local_index")
+        self.index_type = (index_type or os.getenv("LOCAL_INDEX_TYPE", "flat")).lower()
+        self.nprobe = nprobe or int(os.getenv("ANN_NPROBE", 8))
+        self.client = None
+        self._loaded = {}
+        self._indexes = {}
+        self._partitions = {}
+
+    def _paths(self, collection_name):
+        collection_dir = os.path.join(self.directory, collection_name)
+        return (
+            collection_dir,
+            os.path.join(collection_dir, "vectors.f32"),
+            os.path.join(collection_dir, "meta.jsonl"),
+            os.path.join(collection_dir, "info.json"),
+        )
+
+    def _ivf_path(self, collection_name):
+        return os.path.join(self.directory, collection_name, "ivf.npz")
+
+    def _invalidate(self, collection_name):
+        self._loaded.pop(collection_name, None)
+        self._indexes.pop(collection_name, None)
+        self._partitions.pop(collection_name, None)
+        if os.path.exists(self._ivf_path(collection_name)):
+            os.remove(self._ivf_path(collection_name))
+
+    def build_index(self, collection_name="DocumentChunks", n_lists=None):
+        """Builds and saves the IVF index for a collection."""
+        matrix, _ = self.load(collection_name)
+        start_time = time.perf_counter()
+        index = IVFIndex(n_lists=n_lists, nprobe=self.nprobe).build(matrix)
+        index.save(self._ivf_path(collection_name))
+        self._indexes[collection_name] = index
+        print(f"IVF index with {index.n_lists} lists built for '{collection_name}' in {time.perf_counter() - start_time:.2f}s")
+        return index
+
+    def get_index(self, collection_name="DocumentChunks"):
+        """Returns the IVF index for a collection, loading it from disk or building it if stale."""
+        index = self._indexes.get(collection_name)
+        if index is None and os.path.exists(self._ivf_path(collection_name)):
+            index = IVFIndex.load(self._ivf_path(collection_name), nprobe=self.nprobe)
+        _, metadata = self.load(collection_name)
+        if index is None or index.count != len(metadata):
+            return self.build_index(collection_name)
+        self._indexes[collection_name] = index
+        return index
+
+    def exists(self, collection_name="DocumentChunks"):
+        return os.path.exists(self._paths(collection_name)[3])
+
+    def setup_collection(self, collection_name="DocumentChunks", recreate=True):
+        """Creates the collection, dropping any existing one unless recreate is False. Returns True if it was created."""
+        collection_dir, _, _, _ = self._paths(collection_name)
+        if self.exists(collection_name):
+            if not recreate:
+                print(f"Collection '{collection_name}' already exists, keeping it.")
+                return False
+            shutil.rmtree(collection_dir)
+        os.makedirs(collection_dir, exist_ok=True)
+        self._write_info(collection_name, dim=None, count=0)
+        self._invalidate(collection_name)
+        print(f"Local collection '{collection_name}' created at {collection_dir}")
+        return True
+
+    def _read_info(self, collection_name):
+        with open(self._paths(collection_name)[3], "r") as f:
+            return json.load(f)
+
+    def _write_info(self, collection_name, dim, count):
+        info_path = self._paths(collection_name)[3]
+        with open(info_path + ".tmp", "w") as f:
+            json.dump({"dim": dim, "count": count}, f)
+        os.replace(info_path + ".tmp", info_path)
+
+    def insert_embedded(self, embedded_batches, collection_name="DocumentChunks"):
+        """Appends (chunks, vectors) batches to disk and returns the number of chunks inserted.
+        
+        Rows whose uuid was already stored, or repeats within the batches, replace the
+        earlier rows once the append is done, matching Weaviate's upsert by uuid.
+        Rows past info["count"], left by an interrupted insert, are cut off first.
+        """
+        if not self.exists(collection_name):
+            self.setup_collection(collection_name)
+        _, vectors_path, meta_path, _ = self._paths(collection_name)
+        info = self._read_info(collection_name)
+        dim, count = info["dim"], info["count"]
+        self._truncate(collection_name, dim, count)
+        seen = {meta["uuid"] for meta in self.load(collection_name)[1]}
+        replaced = False
+        total = 0
+        start_time = time.perf_counter()
+        try:
+            with open(vectors_path, "ab") as vectors_file, open(meta_path, "a", encoding="utf-8") as meta_file:
+                for chunk_batch, vectors in embedded_batches:
+                    vectors = np.asarray(vectors, dtype=np.float32)
+                    if dim is None:
+                        dim = vectors.shape[1]
+                    elif vectors.shape[1] != dim:
+                        raise ValueError(f"Vector dimension {vectors.shape[1]} does not match collection dimension {dim}")
+                    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                    vectors_file.write(np.ascontiguousarray(vectors / np.maximum(norms, 1e-12), dtype=np.float32).tobytes())
+                    for chunk in chunk_batch:
+                        meta = {
+                            "uuid": chunk.get("uuid") or str(uuid.uuid4()),
+                            "text": chunk["text"],
+                            "source": chunk.get("source", "unknown"),
+                        }
+                        meta.update((field, chunk[field]) for field in METADATA_FIELDS if chunk.get(field) is not None)
+                        meta_file.write(json.dumps(meta) + "\n")
+                        replaced = replaced or meta["uuid"] in seen
+                        seen.add(meta["uuid"])
+                    total += len(chunk_batch)
+        finally:
+            self._write_info(collection_name, dim, count + total)
+            self._invalidate(collection_name)
+        if replaced:
+            _, metadata = self.load(collection_name)
+            last_row = {meta["uuid"]: i for i, meta in enumerate(metadata)}
+            self._keep_rows(collection_name, [i for i, meta in enumerate(metadata) if last_row[meta["uuid"]] == i])
+        elapsed = time.perf_counter() - start_time
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"Documents inserted successfully! {total} chunks in {elapsed:.2f}s ({rate:.1f} chunks/sec)")
+        return total
+
+    def _truncate(self, collection_name, dim, count):
+        """Cuts both files back to count rows, so appended vectors line up with their metadata lines."""
+        _, vectors_path, meta_path, _ = self._paths(collection_name)
+        for path in (vectors_path, meta_path):
+            with open(path, "ab"):
+                pass
+        with open(vectors_path, "r+b") as f:
+            f.truncate(count * (dim or 0) * 4)
+        with open(meta_path, "r+b") as f:
+            for _ in range(count):
+                f.readline()
+            f.truncate(f.tell())
+
+    def load(self, collection_name="DocumentChunks"):
+        """Returns (matrix, metadata) for a collection, memory-mapping the vectors on first use."""
+        if collection_name not in self._loaded:
+            if not self.exists(collection_name):
+                raise ValueError(f"Local collection '{collection_name}' does not exist in {self.directory}")
+            _, vectors_path, meta_path, _ = self._paths(collection_name)
+            info = self._read_info(collection_name)
+            if info["count"] == 0:
+                matrix = np.empty((0, info["dim"] or 0), dtype=np.float32)
+                metadata = []
+            else:
+                matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(info["count"], info["dim"]))
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    metadata = [json.loads(line) for line in islice(f, info["count"])]
+            self._loaded[collection_name] = (matrix, metadata)
+        return self._loaded[collection_name]
+
+    def delete_documents(self, uuids, collection_name="DocumentChunks"):
+        if not uuids or not self.exists(collection_name):
+            return
+        uuids = set(uuids)
+        _, metadata = self.load(collection_name)
+        keep = [i for i, meta in enumerate(metadata) if meta["uuid"] not in uuids]
+        if len(keep) == len(metadata):
+            return
+        self._keep_rows(collection_name, keep)
+        print(f"Deleted {len(metadata) - len(keep)} chunks from '{collection_name}'.")
+
+    def _keep_rows(self, collection_name, keep):
+        """Rewrites the collection with only the given rows, in order."""
+        matrix, metadata = self.load(collection_name)
+        kept_vectors = np.array(matrix[keep], dtype=np.float32)
+        kept_metadata = [metadata[i] for i in keep]
+        dim = matrix.shape[1]
+        self._invalidate(collection_name)
+        del matrix
+
+        _, vectors_path, meta_path, _ = self._paths(collection_name)
+        with open(vectors_path + ".tmp", "wb") as f:
+            f.write(kept_vectors.tobytes())
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            for meta in kept_metadata:
+                f.write(json.dumps(meta) + "\n")
+        os.replace(vectors_path + ".tmp", vectors_path)
+        os.replace(meta_path + ".tmp", meta_path)
+        self._write_info(collection_name, dim, len(kept_metadata))
+
+    def partitions(self, collection_name="DocumentChunks"):
+        """Row numbers of each book's chunks, so a search scoped to some books scans only their rows."""
+        if collection_name not in self._partitions:
+            _, metadata = self.load(collection_name)
+            rows = {}
+            for i, meta in enumerate(metadata):
+                rows.setdefault(field_value(meta, "book"), []).append(i)
+            self._partitions[collection_name] = {book: np.asarray(r, dtype=np.int64) for book, r in rows.items()}
+        return self._partitions[collection_name]
+
+    def filter_rows(self, collection_name, filters):
+        """Sorted row numbers of the chunks matching normalized filters."""
+        _, metadata = self.load(collection_name)
+        if "book" in filters:
+            partitions = self.partitions(collection_name)
+            rows = np.concatenate([partitions.get(book, np.empty(0, dtype=np.int64)) for book in filters["book"]])
+        else:
+            rows = np.arange(len(metadata), dtype=np.int64)
+        rest = {field: values for field, values in filters.items() if field != "book"}
+        if rest:
+            rows = np.asarray([i for i in rows if matches(metadata[i], rest)], dtype=np.int64)
+        return np.sort(rows)
+
+    def query(self, vector, limit=3, collection_name="DocumentChunks", nprobe=None, filters=None):
+        matrix, metadata = self.load(collection_name)
+        if not metadata:
+            return []
+        query_vector = np.asarray(vector, dtype=np.float32)
+        query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+        filters = normalize_filters(filters)
+        if filters:
+            return self.query_batch([query_vector], limit, collection_name, filters)[0]
+        if self.index_type == "ivf":
+            top, scores = self.get_index(collection_name).search(matrix, query_vector, limit, nprobe)
+            return [dict(metadata[i], distance=float(1.0 - score)) for i, score in zip(top, scores)]
+        scores = matrix @ query_vector
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(metadata[i], distance=float(1.0 - scores[i])) for i in top]
+
+    def query_batch(self, vectors, limit=3, collection_name="DocumentChunks", filters=None):
+        """Scores every query against the collection, or its filtered rows, with a single matrix-matrix product."""
+        filters = normalize_filters(filters)
+        if self.index_type == "ivf" and not filters:
+            return super().query_batch(vectors, limit, collection_name)
+        matrix, metadata = self.load(collection_name)
+        if not metadata or len(vectors) == 0:
+            return [[] for _ in range(len(vectors))]
+        rows = self.filter_rows(collection_name, filters) if filters else None
+        if rows is not None:
+            if not len(rows):
+                return [[] for _ in range(len(vectors))]
+            matrix = matrix[rows]
+        query_matrix = np.asarray(vectors, dtype=np.float32)
+        query_matrix = query_matrix / np.maximum(np.linalg.norm(query_matrix, axis=1, keepdims=True), 1e-12)
+        scores = query_matrix @ matrix.T
+        k = min(limit, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(scores, top):
+            candidates = candidates[np.argsort(-row[candidates])]
+            ids = rows[candidates] if rows is not None else candidates
+            results.append([dict(metadata[i], distance=float(1.0 - row[j])) for i, j in zip(ids, candidates)])
+        return results
+
+def create_vector_store(backend=None):
+    """Builds the backend named by VECTOR_STORE ("weaviate" or "local")."""
+    backend = (backend or os.getenv("VECTOR_STORE", "weaviate")).lower()
+    if backend == "local":
+        return LocalVectorStore()
+    if backend == "weaviate":
+        from document_processor import WeaviateManager
+        return WeaviateManager()
+    raise ValueError(f"Unknown vector store backend: {backend}")